@@ -1,11 +1,53 @@
-from .latex import Bibliography, Cite, LaTeX
-from .word import WdBibTeX
+from .check import CheckReport, check_document
+from .comtrace import ComTracer
+from .docx import DocxPackage
+from .latex import (
+    BibEntry,
+    BibitemCache,
+    Bibliography,
+    BuildResult,
+    Citation,
+    Cite,
+    LaTeX,
+    parse_citations,
+)
+from .texlog import (
+    BibTeXError,
+    LaTeXError,
+    MissingCitationError,
+    TeXCapacityError,
+    TeXError,
+    TeXTimeoutError,
+    TeXWarning,
+)
+from .runner import Runner
+from .text import TextBibTeX
+from .word import WdBibTeX, WordPool
 
 __all__ = [
+    'BibEntry',
+    'BibTeXError',
+    'BibitemCache',
     'Bibliography',
+    'BuildResult',
+    'CheckReport',
+    'Citation',
     'Cite',
+    'ComTracer',
+    'DocxPackage',
     'LaTeX',
+    'LaTeXError',
+    'MissingCitationError',
+    'Runner',
+    'TeXCapacityError',
+    'TeXError',
+    'TeXTimeoutError',
+    'TeXWarning',
+    'TextBibTeX',
     'WdBibTeX',
+    'WordPool',
+    'check_document',
+    'parse_citations',
 ]
 
 __copyright__ = 'Copyright (C) 2022 Haruki EJIRI'
@@ -1,5 +1,7 @@
 import argparse
+import os
 import sys
+import warnings
 
 import wdbibtex
 
@@ -12,7 +14,9 @@ def getparser():
         'file',
         type=str,
         help=(
-            'File to BibTeX format.'
+            'File to BibTeX format. '
+            '.md, .markdown, .txt and .text files are built '
+            'as text without MS Word.'
         )
     )
     parser.add_argument(
@@ -20,7 +24,8 @@ def getparser():
         type=str,
         default=None,
         help=(
-            'BibTeX style file. '
+            'BibTeX style file. Two or more styles separated by commas '
+            'write one file per style, e.g. sample_bib_unsrt.docx. '
             'Default: .bst in target file directory'
         )
     )
@@ -57,19 +62,245 @@ def getparser():
             'Default: False'
         )
     )
+    parser.add_argument(
+        '--performance-mode',
+        action='store_true',
+        help=(
+            'Run Word invisibly without screen updating, '
+            'background repagination and proofing. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--track',
+        action='store_true',
+        help=(
+            'Write rendered citations and bibliography as content controls '
+            'tagged with their LaTeX source. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help=(
+            'Rebuild the tracked copied file, rewriting only changed '
+            'citations and bibliography. Implies --track. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--rich-bibliography',
+        action='store_true',
+        help=(
+            'Insert bibliography with hanging indents, italics and '
+            'hyperlinks instead of plain text. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--precompile',
+        action='store_true',
+        help=(
+            'Dump the preamble into a format file to speed up LaTeX passes. '
+            'The format is reused with --keeptexdir. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--draftmode',
+        action='store_true',
+        help=(
+            'Run LaTeX passes without writing output files '
+            'where the LaTeX command supports it. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=None,
+        help=(
+            'Timeout of each LaTeX and BibTeX step in seconds. '
+            'Default: None(= no timeout)'
+        )
+    )
+    parser.add_argument(
+        '--save-result',
+        action='store_true',
+        help=(
+            'Save citation labels and bibliography of the build '
+            'to a .wdbib.json file next to the document. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--warm-start',
+        action='store_true',
+        help=(
+            'Format citations from the saved .wdbib.json file without LaTeX '
+            'if its preamble, citations and .bib and .bst files '
+            'are unchanged. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--bibtex-shards',
+        type=_positive_int,
+        default=None,
+        help=(
+            'Split 1000 or more cited keys into this number of shards '
+            'and run BibTeX on them in parallel. '
+            'Default: None(= one BibTeX run)'
+        )
+    )
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument(
+        '--quiet',
+        action='store_true',
+        help=(
+            'Print nothing but errors. '
+            'Default: False(= print summary of LaTeX and BibTeX steps)'
+        )
+    )
+    verbosity.add_argument(
+        '--verbose',
+        action='store_true',
+        help=(
+            'Print output of LaTeX and BibTeX to the console '
+            'in addition to the summary. '
+            'Default: False(= capture output to .out files in workdir)'
+        )
+    )
+    parser.add_argument(
+        '--trace-com',
+        action='store_true',
+        help=(
+            'Count and time COM calls to Word and print the most time '
+            'consuming calls at close. '
+            'Default: False'
+        )
+    )
+    parser.add_argument(
+        '--trace-json',
+        type=str,
+        default=None,
+        help=(
+            'Write all traced COM calls to this JSON file '
+            'instead of printing them. Implies --trace-com. '
+            'Default: None'
+        )
+    )
+    parser.add_argument(
+        '--trace-top',
+        type=int,
+        default=20,
+        help=(
+            'Number of calls printed by --trace-com. '
+            'Default: 20'
+        )
+    )
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help=(
+            'Only check cited keys against .bib files and preamble '
+            'directives without LaTeX or MS Word. '
+            'Exit with status 1 if keys are missing or duplicated. '
+            'Default: False'
+        )
+    )
     return parser
 
 
+def _positive_int(text):
+    """Argument type of an integer of one or more."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(
+            'must be one or more: %s' % text
+        )
+    return value
+
+
 def main():
+    if sys.argv[1:2] == ['serve']:
+        from wdbibtex import server
+        return server.main(sys.argv[2:])
     parser = getparser()
     args = parser.parse_args()
-    wb = wdbibtex.WdBibTeX(args.file)
-    wb.build(bib=args.bib, bst=args.bst)
-    if args.updatetoc:
-        wb.updatetoc()
-    if args.exportpdf:
-        wb.exportpdf()
-    wb.close(clear=not args.keeptexdir)
+    if os.path.splitext(args.file)[1].lower() in wdbibtex.text.TEXT_SUFFIXES:
+        return main_text(parser, args)
+    if args.check:
+        report = wdbibtex.check_document(args.file, bib=args.bib)
+        sys.stdout.write(wdbibtex.check.format_report(report))
+        return 1 if report.missing or report.duplicates else 0
+    trace = None
+    if args.trace_com or args.trace_json:
+        trace = wdbibtex.ComTracer(top=args.trace_top, file=args.trace_json)
+    wb = wdbibtex.WdBibTeX(
+        args.file,
+        performance_mode=args.performance_mode,
+        track=args.track or args.incremental,
+        trace=trace,
+    )
+    try:
+        # Warnings are reported in the summary.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', wdbibtex.TeXWarning)
+            wdbibtex.word._run_build(wb, vars(args))
+    finally:
+        if not args.quiet:
+            sys.stderr.write(
+                wdbibtex.texlog.format_summary(wb.build_summary)
+            )
+    return 0
+
+
+def main_text(parser, args):
+    # Options of MS Word documents.
+    for option in (
+        'updatetoc', 'exportpdf', 'performance_mode', 'track',
+        'incremental', 'rich_bibliography', 'trace_com', 'trace_json',
+        'check',
+    ):
+        if getattr(args, option):
+            parser.error(
+                '--%s is not supported for text files.'
+                % option.replace('_', '-')
+            )
+    tb = wdbibtex.TextBibTeX(args.file)
+    result = None
+    if args.warm_start and tb.result_file.exists():
+        try:
+            result = wdbibtex.BuildResult.load(tb.result_file)
+        except ValueError:
+            # Saved by another version. Build from scratch.
+            result = None
+    try:
+        # Warnings are reported in the summary.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', wdbibtex.TeXWarning)
+            tb.build(
+                bib=args.bib,
+                bst=args.bst,
+                precompile=args.precompile,
+                draftmode=args.draftmode,
+                runner=wdbibtex.Runner(
+                    timeout=args.timeout,
+                    output='console' if args.verbose else 'file',
+                ),
+                result=result,
+                save_result=args.save_result,
+                bibtex_shards=args.bibtex_shards,
+            )
+    finally:
+        if not args.quiet:
+            sys.stderr.write(
+                wdbibtex.texlog.format_summary(tb.build_summary)
+            )
+    if not args.keeptexdir and tb.workdir.exists():
+        tb.clear()
     return 0
 
 
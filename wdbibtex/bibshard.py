@@ -0,0 +1,320 @@
+import codecs
+import heapq
+import re
+import subprocess
+
+# Lines of .aux file read for sharding.
+_AUX_LINE = re.compile(
+    r'^\\(?P<command>citation|bibstyle|bibdata)\{(?P<arg>[^}]*)\}',
+    re.MULTILINE,
+)
+# bst commands. Comments start with % in .bst files.
+_BST_COMMENT = re.compile(r'%[^\n]*')
+_BST_SORT = re.compile(r'(?<![\w.$])SORT(?![\w.$])')
+_BST_OUTPUT = re.compile(r'ITERATE\s*\{\s*call\.type\$\s*\}')
+
+# Sort keys are written before each entry in chunks of this length,
+# so that BibTeX never breaks the lines.
+_SORT_KEY_CHUNK = 60
+_SORT_KEY_PREFIX = '%wdbibtex-sort '
+
+# Functions added to a sorted style to write sort keys.
+_SORT_KEY_FUNCTIONS = r'''
+FUNCTION {wdbibtex.write.sort.key}
+{ sort.key$
+  { duplicate$ empty$ not }
+    { duplicate$ #1 #%(chunk)d substring$
+      "%(prefix)s" swap$ * "|" * write$ newline$
+      #%(rest)d global.max$ substring$
+    }
+  while$
+  pop$
+}
+
+FUNCTION {wdbibtex.output.entry}
+{ wdbibtex.write.sort.key
+  call.type$
+}
+
+ITERATE {wdbibtex.output.entry}''' % {
+    'chunk': _SORT_KEY_CHUNK,
+    'prefix': _SORT_KEY_PREFIX,
+    'rest': _SORT_KEY_CHUNK + 1,
+}
+
+_BIBITEM = re.compile(r'^\\bibitem(?P<label>\[)?', re.MULTILINE)
+_BEGIN = re.compile(r'\\begin\{thebibliography\}\{(?P<label>[^}]*)\}')
+_END = re.compile(r'^\\end\{thebibliography\}', re.MULTILINE)
+
+
+def read_aux(aux):
+    r"""Read cited keys, style and databases from .aux file.
+
+    Parameters
+    ----------
+    aux : path object
+        .aux file written by LaTeX.
+
+    Returns
+    -------
+    tuple
+        (keys, bibstyle, bibdata). keys are unique cited keys in
+        order of first citation. keys is None if \nocite{*} is used.
+    """
+    with codecs.open(aux, 'r', 'utf-8') as f:
+        text = f.read()
+    keys = []
+    seen = set()
+    bibstyle = bibdata = None
+    for m in _AUX_LINE.finditer(text):
+        if m.group('command') == 'bibstyle':
+            bibstyle = m.group('arg')
+        elif m.group('command') == 'bibdata':
+            bibdata = m.group('arg')
+        else:
+            for key in m.group('arg').split(','):
+                if key == '*':
+                    return None, bibstyle, bibdata
+                # BibTeX does not distinguish the case of keys.
+                if key.lower() not in seen:
+                    seen.add(key.lower())
+                    keys.append(key)
+    return keys, bibstyle, bibdata
+
+
+def find_file(directory, name):
+    """Find a file in directory or by kpsewhich.
+
+    Parameters
+    ----------
+    directory : path object
+        Directory searched first, i.e. working directory of BibTeX.
+    name : str
+        File name such as unsrt.bst.
+
+    Returns
+    -------
+    path object, str or None
+        Found file, or None if not found.
+    """
+    if (directory / name).exists():
+        return directory / name
+    try:
+        proc = subprocess.run(
+            ['kpsewhich', name],
+            cwd=directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    found = proc.stdout.decode('utf-8', 'replace').strip()
+    return found or None
+
+
+def plan(bst, bibs):
+    r"""Decide how BibTeX runs on shards can be merged.
+
+    Parameters
+    ----------
+    bst : str
+        Contents of .bst file.
+    bibs : list of str
+        Contents of .bib files.
+
+    Returns
+    -------
+    str or None
+        'order' if the style lists entries in order of citation,
+        'sorted' if the style sorts entries by sort.key$,
+        or None if the citations cannot be sharded.
+        Entries with crossref cannot be sharded, because BibTeX adds
+        cross-referenced entries by counting citations of all shards.
+
+    Examples
+    --------
+    >>> from wdbibtex.bibshard import plan
+    >>> plan('ITERATE {call.type$}', ['@article{a, title={T}}'])
+    'order'
+    >>> plan('SORT\nITERATE {call.type$}', ['@article{a, title={T}}'])
+    'sorted'
+    >>> plan('SORT\nITERATE {call.type$}', ['@article{a, crossref={b}}'])
+    """
+    if any('crossref' in b.lower() for b in bibs):
+        return None
+    bst = _BST_COMMENT.sub('', bst)
+    if not _BST_OUTPUT.search(bst):
+        return None
+    if _BST_SORT.search(bst):
+        return 'sorted'
+    return 'order'
+
+
+def sort_key_bst(bst):
+    """Returns a copy of sorted style which writes sort keys.
+
+    Each entry of .bbl file is preceded by comment lines of its
+    sort.key$, which are read and removed by merge_bbl.
+
+    Parameters
+    ----------
+    bst : str
+        Contents of .bst file sorting entries.
+
+    Returns
+    -------
+    str
+        Contents of modified .bst file.
+    """
+    # Blank out comments keeping offsets, so that commented out
+    # commands are skipped as by plan.
+    code = _BST_COMMENT.sub(lambda c: ' ' * len(c.group()), bst)
+    m = None
+    for m in _BST_OUTPUT.finditer(code):
+        pass
+    return bst[:m.start()] + _SORT_KEY_FUNCTIONS.lstrip() + bst[m.end():]
+
+
+def split(keys, shards):
+    """Split keys into contiguous shards of nearly equal size.
+
+    Parameters
+    ----------
+    keys : list of str
+        Cited keys in order of citation.
+    shards : int
+        Number of shards.
+
+    Returns
+    -------
+    list of list of str
+        Non-empty shards in order.
+
+    Examples
+    --------
+    >>> from wdbibtex.bibshard import split
+    >>> split(['a', 'b', 'c', 'd', 'e'], 2)
+    [['a', 'b', 'c'], ['d', 'e']]
+    """
+    size = -(-len(keys) // shards)
+    return [keys[i:i + size] for i in range(0, len(keys), size)]
+
+
+def write_aux(aux, keys, bibstyle, bibdata):
+    """Write .aux file of a shard.
+
+    Parameters
+    ----------
+    aux : path object
+        .aux file to write.
+    keys : list of str
+        Keys of the shard.
+    bibstyle : str
+        Bibliography style.
+    bibdata : str
+        Bibliography databases.
+    """
+    with codecs.open(aux, 'w', 'utf-8') as f:
+        f.write('\\relax\n')
+        for key in keys:
+            f.write('\\citation{%s}\n' % key)
+        f.write('\\bibstyle{%s}\n' % bibstyle)
+        f.write('\\bibdata{%s}\n' % bibdata)
+
+
+def merge_bbl(bbls, sorted_style=False):
+    r"""Merge .bbl texts of shards.
+
+    Entries are concatenated in order of shards, or merged by their
+    sort keys for sorted styles. The widest label of
+    \begin{thebibliography} is updated to the number of all entries.
+    Header and footer are taken from the first and last shards.
+
+    Parameters
+    ----------
+    bbls : list of str
+        .bbl texts of shards in order.
+    sorted_style : bool, default False
+        If True, entries are preceded by sort key comments
+        written by the style of sort_key_bst.
+
+    Returns
+    -------
+    str or None
+        Merged .bbl text, or None if the entries have labels
+        which depend on other entries, e.g. alpha or author-year styles.
+    """
+    parsed = [_split_bbl(b, sorted_style) for b in bbls]
+    if any(p is None for p in parsed):
+        return None
+    labels = [_BEGIN.search(p[0]) for p in parsed]
+    if any(m is None or not m.group('label').isdigit() for m in labels):
+        return None
+    if sorted_style:
+        entries = [
+            e for *_, e in heapq.merge(*[
+                [(key, i, j, e) for j, (key, e) in enumerate(p[1])]
+                for i, p in enumerate(parsed)
+            ])
+        ]
+    else:
+        entries = [e for p in parsed for _, e in p[1]]
+    m = labels[0]
+    header = parsed[0][0]
+    header = (
+        header[:m.start('label')] + str(len(entries))
+        + header[m.end('label'):]
+    )
+    # Entries are separated by blank lines as BibTeX writes them.
+    return (
+        header.rstrip('\n') + '\n'
+        + ''.join('\n' + e for e in entries)
+        + '\n' + parsed[-1][2]
+    )
+
+
+def _split_bbl(bbl, sorted_style):
+    """Split .bbl text into header, (sort key, entry) list and footer.
+
+    Entries are stripped of blank lines around them.
+    Returns None if an entry has its own label.
+    """
+    items = list(_BIBITEM.finditer(bbl))
+    if any(m.group('label') for m in items):
+        return None
+    end = None
+    for end in _END.finditer(bbl):
+        pass
+    stop = end.start() if end is not None else len(bbl)
+    starts = []
+    for m in items:
+        start = m.start()
+        if sorted_style:
+            # Sort key lines and a blank line precede the entry.
+            start = bbl.rfind('\n', 0, start - 1) + 1
+            while True:
+                prev = bbl.rfind('\n', 0, start - 1) + 1
+                if start == 0 or not bbl.startswith(_SORT_KEY_PREFIX, prev):
+                    break
+                start = prev
+        starts.append(start)
+    if not starts:
+        return bbl[:stop], [], bbl[stop:]
+    entries = []
+    for i, start in enumerate(starts):
+        text = bbl[start:starts[i + 1] if i + 1 < len(starts) else stop]
+        key = ''
+        if sorted_style:
+            lines = text.split('\n')
+            chunks = [
+                ln[len(_SORT_KEY_PREFIX):-1] for ln in lines
+                if ln.startswith(_SORT_KEY_PREFIX)
+            ]
+            key = ''.join(chunks)
+            text = '\n'.join(
+                ln for ln in lines if not ln.startswith(_SORT_KEY_PREFIX)
+            )
+        entries.append((key, text.strip('\n') + '\n'))
+    return bbl[:starts[0]], entries, bbl[stop:]
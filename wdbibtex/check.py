@@ -0,0 +1,275 @@
+import codecs
+import collections
+import pathlib
+import re
+import xml.etree.ElementTree
+
+from .docx import DocxPackage
+from .latex import _PREAMBLE_LEXER, parse_citations
+
+# Result of checking a document.
+CheckReport = collections.namedtuple(
+    'CheckReport', ['citations', 'missing', 'duplicates', 'unused']
+)
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_MC = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+
+# Entry head of .bib file such as @article{key,
+_BIB_ENTRY = re.compile(
+    r'^[ \t]*@[ \t]*(?P<type>[A-Za-z]+)[ \t]*[{(][ \t]*(?P<key>[^,\s{}()]*)',
+    re.MULTILINE,
+)
+# Entry types which have no citation key.
+_BIB_NOKEY = ('comment', 'preamble', 'string')
+
+_PREAMBLE_BEGIN = '\\begin{preamble}'
+_PREAMBLE_END = '\\end{preamble}'
+_COMMAND = re.compile(r'\\(?:[A-Za-z@]+|.)|[{}]')
+
+
+def index_bib(files):
+    """Index entry keys of .bib files.
+
+    Keys are indexed in lower case, because BibTeX does not distinguish
+    the case of keys.
+
+    Parameters
+    ----------
+    files : list of str or path object
+        .bib files to index.
+
+    Returns
+    -------
+    dict
+        Lower case key to list of (key, file, line) where it is defined.
+    """
+    index = {}
+    for file in files:
+        with codecs.open(file, 'r', 'utf-8', errors='replace') as f:
+            text = f.read()
+        for m in _BIB_ENTRY.finditer(text):
+            if m.group('type').lower() in _BIB_NOKEY:
+                continue
+            line = text.count('\n', 0, m.start('key')) + 1
+            index.setdefault(m.group('key').lower(), []).append(
+                (m.group('key'), str(file), line)
+            )
+    return index
+
+
+def unused_directives(preamble):
+    r"""Find preamble directives not used by WdBibTeX.
+
+    WdBibTeX uses documentclass, usepackage, bibliographystyle and
+    definitions of citeleft and citeright. Other commands are not
+    written to .tex file. Only the last bibliographystyle is used.
+    Commands in arguments of other commands are not reported.
+
+    Parameters
+    ----------
+    preamble : str
+        Preamble text.
+
+    Returns
+    -------
+    list of tuple
+        Unused directives of (line, command) in order of appearance.
+
+    Examples
+    --------
+    >>> from wdbibtex.check import unused_directives
+    >>> unused_directives(
+    ...     '\\documentclass{article}\n'
+    ...     '\\bibliographystyle{plain}\n'
+    ...     '\\bibliographystyle{unsrt}\n'
+    ...     '\\setlength{\\parindent}{0pt}\n'
+    ... )
+    [(2, '\\bibliographystyle{plain}'), (4, '\\setlength')]
+    """
+    unused = []
+    styles = []
+    pos = 0
+    for m in _PREAMBLE_LEXER.finditer(preamble):
+        unused.extend(_commands(preamble, pos, m.start()))
+        pos = m.end()
+        if m.group('bst') is not None:
+            styles.append((m.start(), m.group(0)))
+        elif m.group('body') is not None:
+            name = m.group('name') or m.group('bracedname')
+            if name not in ('citeleft', 'citeright'):
+                unused.append((m.start(), '\\' + name))
+    unused.extend(_commands(preamble, pos, len(preamble)))
+    unused.extend(styles[:-1])
+    return [(_line(preamble, p), c) for p, c in sorted(unused)]
+
+
+def _commands(text, start, end):
+    """Returns top level commands of (position, command) in text[start:end].
+    """
+    commands = []
+    depth = 0
+    for m in _COMMAND.finditer(text, start, end):
+        if m.group(0) == '{':
+            depth += 1
+        elif m.group(0) == '}':
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            commands.append((m.start(), m.group(0)))
+    return commands
+
+
+def _line(text, pos):
+    """Returns line number of position in text."""
+    return text.count('\n', 0, pos) + 1
+
+
+def _part_text(pkg, name):
+    """Returns plain text of a story part.
+
+    Paragraphs are separated by newlines.
+    Deleted text and field codes are not included.
+    Text boxes in mc:AlternateContent are read from mc:Choice only,
+    since mc:Fallback repeats the same text for older applications.
+    """
+    parser = xml.etree.ElementTree.XMLPullParser(['start', 'end'])
+    text = []
+    fallback = 0
+    for chunk in pkg.iter_part(name):
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if elem.tag == _MC + 'Fallback':
+                if event == 'start':
+                    fallback += 1
+                else:
+                    fallback -= 1
+                    elem.clear()
+                continue
+            if event == 'start' or fallback:
+                continue
+            if elem.tag == _W + 't':
+                text.append(elem.text or '')
+            elif elem.tag == _W + 'tab':
+                text.append('\t')
+            elif elem.tag in (_W + 'br', _W + 'cr', _W + 'p'):
+                text.append('\n')
+            if elem.tag == _W + 'p':
+                elem.clear()
+    parser.close()
+    return ''.join(text)
+
+
+def _bib_files(directory, bib):
+    """Returns .bib files used by a build."""
+    if bib is None:
+        return sorted(directory.glob('*.bib'))
+    files = []
+    for b in bib.split(','):
+        b = b.strip()
+        if not b.endswith('.bib'):
+            b += '.bib'
+        files.append(directory / b)
+    return files
+
+
+def check_document(file, bib=None):
+    r"""Check citations of a .docx file without LaTeX or MS Word.
+
+    Citations are read from all stories of the document and
+    resolved against .bib files. The document is not modified.
+
+    Parameters
+    ----------
+    file : str or path object
+        .docx file to check.
+    bib : str or None, default None
+        Bibliography file(s) separated by commas.
+        If None, all .bib files in the directory of file are used.
+
+    Returns
+    -------
+    CheckReport
+        citations
+            Number of citation commands found.
+        missing
+            Cited keys not found in .bib files, in order of appearance.
+        duplicates
+            Lower case keys defined more than once, mapped to list of
+            (key, file, line).
+        unused
+            Preamble directives not used by WdBibTeX as (line, command).
+
+    Raises
+    ------
+    ValueError
+        If \begin{preamble} and \end{preamble} are not paired.
+    FileNotFoundError
+        If a given .bib file does not exist.
+    """
+    file = (pathlib.Path.cwd() / file).resolve()
+    pkg = DocxPackage(file)
+    texts = [_part_text(pkg, p) for p in pkg.story_parts]
+
+    preamble = None
+    begins = sum(t.count(_PREAMBLE_BEGIN) for t in texts)
+    ends = sum(t.count(_PREAMBLE_END) for t in texts)
+    if begins != ends or begins > 1:
+        raise ValueError(
+            'One \\begin{preamble} and \\end{preamble} pair is expected.'
+        )
+    for i, t in enumerate(texts):
+        start = t.find(_PREAMBLE_BEGIN)
+        end = t.find(_PREAMBLE_END)
+        if start < 0:
+            continue
+        if end < start:
+            raise ValueError('\\end{preamble} found before \\begin{preamble}.')
+        preamble = t[start + len(_PREAMBLE_BEGIN):end]
+        texts[i] = t[:start] + t[end + len(_PREAMBLE_END):]
+
+    index = index_bib(_bib_files(file.parent, bib))
+    citations = 0
+    missing = []
+    for t in texts:
+        for citation in parse_citations(t):
+            citations += 1
+            for key in citation.keys:
+                if (
+                    key != '*'
+                    and key.lower() not in index
+                    and key not in missing
+                ):
+                    missing.append(key)
+    duplicates = {k: v for k, v in index.items() if len(v) > 1}
+    unused = unused_directives(preamble) if preamble is not None else []
+    return CheckReport(citations, missing, duplicates, unused)
+
+
+def format_report(report):
+    """Format check report as text lines.
+
+    Parameters
+    ----------
+    report : CheckReport
+        Result of check_document.
+
+    Returns
+    -------
+    str
+        Human readable report.
+    """
+    lines = ['%d citation(s) checked.' % report.citations]
+    for key in report.missing:
+        lines.append('missing key: %s' % key)
+    for locations in report.duplicates.values():
+        lines.append(
+            'duplicate key: %s (%s)' % (
+                locations[0][0],
+                ', '.join('%s:%d' % (f, n) for _, f, n in locations),
+            )
+        )
+    for line, command in report.unused:
+        lines.append('unused preamble directive: line %d: %s' % (
+            line, command
+        ))
+    return '\n'.join(lines) + '\n'
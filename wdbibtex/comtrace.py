@@ -0,0 +1,307 @@
+import codecs
+import json
+import os
+import sys
+import threading
+import time
+
+# Caller of COM calls is the innermost frame in this file.
+_WORD_FILE = os.path.normcase(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'word.py')
+)
+
+
+class ComTracer:
+    """Counter and timer of COM calls made by WdBibTeX.
+
+    COM objects wrapped by ComTracer record every property get,
+    property set, method call, call of collection, iteration
+    and len() by name, e.g. Range.Text or Find.Execute().
+    Objects returned from wrapped objects are wrapped too,
+    and named after the property or method which returned them.
+    Each record is attributed to the innermost calling method of word.py,
+    such as WdBibTeX.__find_in_story.
+
+    Parameters
+    ----------
+    top : int, default 20
+        Number of rows printed by emit().
+    file : str, path object or None, default None
+        If given, emit() writes all records to this JSON file
+        instead of printing a table.
+    stream : file object or None, default None
+        Stream of the table. If None, sys.stderr.
+
+    Examples
+    --------
+    >>> from wdbibtex import ComTracer, WdBibTeX
+    >>> tracer = ComTracer(top=10)
+    >>> wd = WdBibTeX('sample.docx', trace=tracer)  # doctest: +SKIP
+    >>> wd.build()  # doctest: +SKIP
+    >>> wd.close()  # doctest: +SKIP
+    caller                     call                      count   seconds
+    WdBibTeX.__find_in_story   Find.Execute()              120     1.203
+    ...
+    """
+
+    def __init__(self, top=20, file=None, stream=None):
+        """Constructor of ComTracer.
+        """
+        self.__top = top
+        self.__file = file
+        self.__stream = stream
+        self.__records = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def top(self):
+        """[Read only] Returns number of rows printed by emit().
+        """
+        return self.__top
+
+    @property
+    def file(self):
+        """[Read only] Returns JSON file written by emit().
+        """
+        return self.__file
+
+    def wrap(self, obj, name):
+        """Wrap a COM object to trace calls on it.
+
+        Parameters
+        ----------
+        obj : COM object
+            Object to trace, e.g. Word.Application.
+        name : str
+            Name of the object in records, e.g. 'Application'.
+
+        Returns
+        -------
+        object
+            Tracing proxy of obj.
+        """
+        return _Traced(obj, name, self)
+
+    def record(self, name, seconds):
+        """Add a call to records.
+
+        Parameters
+        ----------
+        name : str
+            Name of the call, e.g. 'Range.Text'.
+        seconds : float
+            Time taken by the call.
+        """
+        caller = _caller()
+        with self.__lock:
+            r = self.__records.get((caller, name))
+            if r is None:
+                self.__records[(caller, name)] = [1, seconds]
+            else:
+                r[0] += 1
+                r[1] += seconds
+
+    def records(self):
+        """Returns all records, most time consuming first.
+
+        Returns
+        -------
+        list of dict
+            Records with keys caller, call, count and seconds.
+        """
+        with self.__lock:
+            items = list(self.__records.items())
+        return [
+            {'caller': caller, 'call': name, 'count': n, 'seconds': t}
+            for (caller, name), (n, t) in sorted(
+                items, key=lambda i: (-i[1][1], -i[1][0], i[0])
+            )
+        ]
+
+    def table(self, top=None):
+        """Returns text table of the most time consuming records.
+
+        Parameters
+        ----------
+        top : int or None, default None
+            Number of rows. If None, top given to the constructor.
+
+        Returns
+        -------
+        str
+            Table with a total row.
+        """
+        records = self.records()
+        rows = [('caller', 'call', 'count', 'seconds')]
+        rows.extend(
+            (r['caller'], r['call'], str(r['count']), '%.3f' % r['seconds'])
+            for r in records[:self.__top if top is None else top]
+        )
+        rows.append((
+            'total',
+            '',
+            str(sum(r['count'] for r in records)),
+            '%.3f' % sum(r['seconds'] for r in records),
+        ))
+        w = [max(len(row[i]) for row in rows) for i in range(4)]
+        return ''.join(
+            '%-*s  %-*s  %*s  %*s\n' % (
+                w[0], row[0], w[1], row[1], w[2], row[2], w[3], row[3]
+            )
+            for row in rows
+        )
+
+    def emit(self):
+        """Print the table, or write records to JSON file if file is given.
+
+        Called by WdBibTeX.close(). Records are accumulated over
+        all documents traced by this tracer.
+        """
+        if self.__file is not None:
+            with codecs.open(self.__file, 'w', 'utf-8') as f:
+                json.dump(self.records(), f, indent=1)
+        else:
+            (self.__stream or sys.stderr).write(self.table())
+
+    def reset(self):
+        """Forget all records.
+        """
+        with self.__lock:
+            self.__records.clear()
+
+
+class _Traced:
+    """Tracing proxy of a COM object."""
+
+    __slots__ = ('_traced_object', '_traced_name', '_traced_tracer')
+
+    def __init__(self, obj, name, tracer):
+        object.__setattr__(self, '_traced_object', obj)
+        object.__setattr__(self, '_traced_name', name)
+        object.__setattr__(self, '_traced_tracer', tracer)
+
+    def __getattr__(self, attr):
+        t = time.perf_counter()
+        value = getattr(self._traced_object, attr)
+        if not _is_com(value) and callable(value):
+            return _TracedMethod(
+                value, self._traced_name + '.' + attr, attr,
+                self._traced_tracer, time.perf_counter() - t,
+            )
+        self._traced_tracer.record(
+            self._traced_name + '.' + attr, time.perf_counter() - t
+        )
+        return _wrap(value, attr, self._traced_tracer)
+
+    def __setattr__(self, attr, value):
+        t = time.perf_counter()
+        setattr(self._traced_object, attr, unwrap(value))
+        self._traced_tracer.record(
+            self._traced_name + '.' + attr + '=', time.perf_counter() - t
+        )
+
+    def __call__(self, *args, **kwargs):
+        name = self._traced_name + '()'
+        t = time.perf_counter()
+        value = self._traced_object(*args, **kwargs)
+        self._traced_tracer.record(name, time.perf_counter() - t)
+        return _wrap(value, name, self._traced_tracer)
+
+    def __iter__(self):
+        name = self._traced_name + '[]'
+        it = iter(self._traced_object)
+        while True:
+            t = time.perf_counter()
+            try:
+                value = next(it)
+            except StopIteration:
+                return
+            self._traced_tracer.record(name, time.perf_counter() - t)
+            yield _wrap(value, name, self._traced_tracer)
+
+    def __len__(self):
+        t = time.perf_counter()
+        n = len(self._traced_object)
+        self._traced_tracer.record(
+            'len(%s)' % self._traced_name, time.perf_counter() - t
+        )
+        return n
+
+    def __str__(self):
+        t = time.perf_counter()
+        s = str(self._traced_object)
+        self._traced_tracer.record(
+            'str(%s)' % self._traced_name, time.perf_counter() - t
+        )
+        return s
+
+    def __bool__(self):
+        return bool(self._traced_object)
+
+    def __repr__(self):
+        return '<traced %s %r>' % (self._traced_name, self._traced_object)
+
+
+class _TracedMethod:
+    """Tracing proxy of a method of a COM object."""
+
+    __slots__ = ('_method', '_name', '_attr', '_tracer', '_lookup')
+
+    def __init__(self, method, name, attr, tracer, lookup):
+        self._method = method
+        self._name = name
+        self._attr = attr
+        self._tracer = tracer
+        self._lookup = lookup
+
+    def __call__(self, *args, **kwargs):
+        t = time.perf_counter()
+        value = self._method(
+            *[unwrap(a) for a in args],
+            **{k: unwrap(v) for k, v in kwargs.items()}
+        )
+        self._tracer.record(
+            self._name + '()', self._lookup + time.perf_counter() - t
+        )
+        return _wrap(value, self._attr, self._tracer)
+
+
+def unwrap(obj):
+    """Returns the COM object traced by a proxy, or obj as is.
+
+    Parameters
+    ----------
+    obj : object
+        Tracing proxy or any object.
+
+    Returns
+    -------
+    object
+        Traced object.
+    """
+    if isinstance(obj, _Traced):
+        return obj._traced_object
+    return obj
+
+
+def _is_com(value):
+    """Returns if value is a COM object of pywin32."""
+    return hasattr(value, '_oleobj_')
+
+
+def _wrap(value, name, tracer):
+    """Wrap value if it is a COM object."""
+    if _is_com(value):
+        return _Traced(value, name, tracer)
+    return value
+
+
+def _caller():
+    """Returns qualified name of the innermost caller in word.py."""
+    f = sys._getframe(2)
+    while f is not None:
+        code = f.f_code
+        if os.path.normcase(code.co_filename) == _WORD_FILE:
+            return getattr(code, 'co_qualname', code.co_name)
+        f = f.f_back
+    return '<other>'
@@ -0,0 +1,259 @@
+import os
+import pathlib
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+
+# Parts of a .docx which may contain document text.
+_STORY_PART = re.compile(
+    r'word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml'
+)
+
+
+class DocxPackage:
+    """Python-side reader and writer of .docx zip packages.
+
+    DocxPackage reads and rewrites parts of a .docx file without MS Word.
+    When the package is written back, other zip members, such as
+    embedded media, are copied as compressed bytes with their
+    attributes, without decompressing them.
+    All members are streamed chunk by chunk, so that memory usage
+    is bounded by the chunk size rather than the whole package.
+
+    Parameters
+    ----------
+    file : str or path object
+        Source .docx file.
+
+    Examples
+    --------
+    >>> from wdbibtex import DocxPackage, WdBibTeX
+    >>> wd = WdBibTeX('sample.docx')
+    >>> pkg = DocxPackage(wd.original_file)  # doctest: +SKIP
+    >>> xml = pkg.read_part('word/document.xml')  # doctest: +SKIP
+    >>> pkg.save(  # doctest: +SKIP
+    ...     wd.target_file,
+    ...     {'word/document.xml': xml.replace(b'old', b'new')},
+    ... )
+    """
+
+    def __init__(self, file):
+        """Constructor of DocxPackage.
+        """
+        self.__file = pathlib.Path(file).resolve()
+        with zipfile.ZipFile(self.__file) as zf:
+            self.__infolist = zf.infolist()
+
+    @property
+    def file(self):
+        """[Read only] Returns source .docx file.
+        """
+        return self.__file
+
+    @property
+    def parts(self):
+        """[Read only] Returns names of all parts in the package.
+
+        Returns
+        -------
+        list of str
+            Part names in zip member order.
+        """
+        return [i.filename for i in self.__infolist]
+
+    @property
+    def story_parts(self):
+        """[Read only] Returns names of parts which may contain text.
+
+        Main document, headers, footers, footnotes, endnotes and comments.
+        Text boxes are stored in the part of their anchoring story.
+
+        Returns
+        -------
+        list of str
+            Story part names in zip member order.
+        """
+        return [
+            p for p in self.parts if _STORY_PART.fullmatch(p)
+        ]
+
+    def read_part(self, name):
+        """Read whole contents of a part.
+
+        Parameters
+        ----------
+        name : str
+            Part name such as 'word/document.xml'.
+
+        Returns
+        -------
+        bytes
+            Uncompressed contents of the part.
+        """
+        with zipfile.ZipFile(self.__file) as zf:
+            return zf.read(name)
+
+    def iter_part(self, name, chunksize=1 << 16):
+        """Yield contents of a part chunk by chunk.
+
+        Parameters
+        ----------
+        name : str
+            Part name such as 'word/document.xml'.
+        chunksize : int, default 65536
+            Maximum bytes of one chunk.
+
+        Yields
+        ------
+        bytes
+            Uncompressed chunk of the part.
+        """
+        with zipfile.ZipFile(self.__file) as zf:
+            with zf.open(name) as f:
+                while True:
+                    chunk = f.read(chunksize)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def save(self, target=None, replacements=None):
+        """Write the package with replaced parts.
+
+        The package is written to a temporary file in the target directory
+        and moved to the target at once, so that the target is never left
+        half-written. It keeps the file mode of the target if it exists,
+        or else of the source. Parts not in replacements are copied
+        as compressed bytes.
+
+        Parameters
+        ----------
+        target : str, path object or None, default None
+            Output .docx file, e.g. WdBibTeX.target_file.
+            If None, the source file is overwritten.
+        replacements : dict or None, default None
+            Map of part name to new contents.
+            Contents are bytes, an iterable of bytes chunks,
+            or a callable which receives an iterator of original chunks
+            and returns an iterable of new chunks.
+
+        Raises
+        ------
+        KeyError
+            If a replaced part does not exist in the package.
+        """
+        target = pathlib.Path(target or self.__file).resolve()
+        replacements = dict(replacements or {})
+        unknown = set(replacements) - set(self.parts)
+        if unknown:
+            raise KeyError(
+                'Parts not found in package: %s' % ', '.join(sorted(unknown))
+            )
+
+        fd, tmp = tempfile.mkstemp(
+            prefix='.' + target.name, suffix='.tmp', dir=target.parent
+        )
+        try:
+            with os.fdopen(fd, 'wb') as fp, \
+                    open(self.__file, 'rb') as src, \
+                    zipfile.ZipFile(fp, 'w') as zout:
+                for info in self.__infolist:
+                    if info.filename in replacements:
+                        self.__write_part(
+                            zout, info, replacements[info.filename]
+                        )
+                    else:
+                        self.__copy_part(src, info, zout)
+            # mkstemp creates the file readable only by the owner.
+            shutil.copymode(target if target.exists() else self.__file, tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if target == self.__file:
+            with zipfile.ZipFile(self.__file) as zf:
+                self.__infolist = zf.infolist()
+
+    def __write_part(self, zout, info, contents):
+        """Compress and write one replaced part chunk by chunk.
+        """
+        if callable(contents):
+            contents = contents(self.iter_part(info.filename))
+        elif isinstance(contents, (bytes, bytearray)):
+            contents = [contents]
+        zinfo = _new_info(info)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        # The new size is unknown. A part may grow up to twice its size
+        # before zip64 is needed.
+        with zout.open(
+            zinfo, 'w', force_zip64=info.file_size * 2 > zipfile.ZIP64_LIMIT
+        ) as w:
+            for chunk in contents:
+                w.write(chunk)
+
+    def __copy_part(self, src, info, zout):
+        """Copy compressed data of one zip member chunk by chunk.
+
+        A local header is written for the data read from src,
+        and the member is added to the central directory
+        which zout writes when it is closed.
+        """
+        src.seek(info.header_offset)
+        header = struct.unpack(
+            zipfile.structFileHeader, src.read(zipfile.sizeFileHeader)
+        )
+        # Skip the file name and extra field of the local header.
+        src.seek(header[10] + header[11], os.SEEK_CUR)
+        zinfo = _new_info(info)
+        zinfo.compress_type = info.compress_type
+        zinfo.internal_attr = info.internal_attr
+        # Sizes and CRC are written in the local header,
+        # and no data descriptor follows the data.
+        zinfo.flag_bits = info.flag_bits & ~0x08
+        zinfo.CRC = info.CRC
+        zinfo.compress_size = info.compress_size
+        zinfo.file_size = info.file_size
+        zinfo.header_offset = zout.fp.tell()
+        zout.fp.write(zinfo.FileHeader(
+            max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT
+        ))
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.read(min(remaining, 1 << 20))
+            if not chunk:
+                raise zipfile.BadZipFile(
+                    'Truncated data of %s' % info.filename
+                )
+            zout.fp.write(chunk)
+            remaining -= len(chunk)
+        zout.filelist.append(zinfo)
+        zout.NameToInfo[zinfo.filename] = zinfo
+        # Next member or central directory starts here.
+        zout.start_dir = zout.fp.tell()
+
+
+def _new_info(info):
+    """Returns ZipInfo of a written member with attributes of info.
+    """
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.create_system = info.create_system
+    zinfo.external_attr = info.external_attr
+    zinfo.comment = info.comment
+    zinfo.extra = _strip_zip64_extra(info.extra)
+    return zinfo
+
+
+def _strip_zip64_extra(extra):
+    """Remove zip64 fields from zip extra data.
+
+    zipfile adds the zip64 field by itself when needed.
+    """
+    stripped = []
+    i = 0
+    while i + 4 <= len(extra):
+        tag, size = struct.unpack('<HH', extra[i:i + 4])
+        if tag != 0x0001:
+            stripped.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b''.join(stripped)
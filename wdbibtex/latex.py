@@ -1,9 +1,197 @@
 import codecs
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
 import locale
 import pathlib
 import os
 import re
 
+from . import bibshard, texlog
+from .runner import Runner
+
+
+# Citation commands of LaTeX, natbib and biblatex taking keys.
+_CITE_COMMANDS = (
+    'cite', 'citep', 'citet', 'citealp', 'citealt',
+    'citeauthor', 'citeyear', 'citeyearpar', 'citenum',
+    'nocite', 'parencite', 'textcite', 'autocite', 'footcite',
+    'supercite', 'Cite', 'Citep', 'Citet', 'Parencite', 'Textcite',
+    'Autocite',
+)
+# Textual citation commands printing author names or years,
+# which cannot be formatted as numeric labels.
+_TEXTUAL_COMMANDS = (
+    'citet', 'citealt', 'citeauthor', 'citeyear', 'citeyearpar',
+    'textcite', 'Citet', 'Textcite',
+)
+
+# Tokenizer of citation commands such as \cite*[pre][post]{key1, key2}.
+_CITE_TOKEN = re.compile(
+    r"""
+    \\(?P<command>%s)(?![A-Za-z])
+    (?P<star>\*)?
+    (?:\s*\[(?P<opt1>[^\[\]]*)\])?
+    (?:\s*\[(?P<opt2>[^\[\]]*)\])?
+    \s*\{(?P<keys>[^{}]*)\}
+    """ % '|'.join(sorted(_CITE_COMMANDS, key=len, reverse=True)),
+    re.VERBOSE,
+)
+
+
+class Citation(collections.namedtuple(
+        'Citation',
+        ['source', 'command', 'star', 'options', 'keys', 'start', 'end'])):
+    r"""One citation command found in a text.
+
+    Attributes
+    ----------
+    source : str
+        Citation command as written, e.g. \cite[p.~3]{key1, key2}.
+    command : str
+        Command name without backslash, e.g. cite or citep.
+    star : bool
+        True if the starred form is used.
+    options : tuple of str
+        Optional arguments in order, e.g. ('see', 'p.~3').
+    keys : tuple of str
+        Citation keys without surrounding whitespace.
+    start : int
+        Start position of the command in the text.
+    end : int
+        End position of the command in the text.
+    """
+
+    __slots__ = ()
+
+    @property
+    def textual(self):
+        r"""bool: True if the command prints author names or years.
+
+        Textual citations such as \citet cannot be formatted
+        as numeric labels.
+        """
+        return self.command in _TEXTUAL_COMMANDS
+
+
+def parse_citations(text):
+    r"""Find all citation commands in a text in one scan.
+
+    \cite, \nocite and natbib and biblatex variants such as
+    \citep, \citet, \parencite and \textcite are recognized,
+    with starred forms, optional arguments and whitespace in key lists.
+
+    Parameters
+    ----------
+    text : str
+        Text to scan.
+
+    Returns
+    -------
+    list of Citation
+        Citation records in order of appearance.
+
+    Examples
+    --------
+    >>> import wdbibtex
+    >>> c, = wdbibtex.parse_citations('See \\citep*[e.g.][p.~3]{a, b}.')
+    >>> c.command, c.star, c.options, c.keys
+    ('citep', True, ('e.g.', 'p.~3'), ('a', 'b'))
+    >>> c.source
+    '\\citep*[e.g.][p.~3]{a, b}'
+    """
+    citations = []
+    for m in _CITE_TOKEN.finditer(text):
+        options = tuple(
+            o for o in (m.group('opt1'), m.group('opt2')) if o is not None
+        )
+        keys = tuple(k.strip() for k in m.group('keys').split(','))
+        citations.append(Citation(
+            m.group(0),
+            m.group('command'),
+            m.group('star') is not None,
+            options,
+            tuple(k for k in keys if k),
+            m.start(),
+            m.end(),
+        ))
+    return citations
+
+
+def _context_lines(citations):
+    """Yield one citation line per distinct list of keys.
+
+    Parameters
+    ----------
+    citations : iterable of str or Citation
+        Citation commands or records.
+
+    Yields
+    ------
+    str
+        Citation line such as \\cite{key1,key2}.
+    """
+    seen = set()
+    for c in citations:
+        records = [c] if isinstance(c, Citation) else parse_citations(c)
+        for r in records:
+            command = 'nocite' if r.command == 'nocite' else 'cite'
+            if not r.keys or (command, r.keys) in seen:
+                continue
+            seen.add((command, r.keys))
+            yield '\\%s{%s}' % (command, ','.join(r.keys))
+
+
+def _bibliography_option(bib):
+    """Returns argument of \\bibliography.
+
+    If bib is None, all .bib files in cwd are used.
+    """
+    import glob
+
+    if bib is None:
+        # Use only root name (file name without extension).
+        bib = ','.join(
+            [os.path.splitext(b)[0] for b in glob.glob('*.bib')]
+        )
+    return bib
+
+
+def _source_hashes(directory, bib, bst):
+    """Returns SHA-1 digests of .bib and .bst files used by BibTeX.
+
+    Files are searched in directory and then by kpsewhich.
+
+    Parameters
+    ----------
+    directory : path object
+        Working directory of BibTeX.
+    bib : str
+        Argument of \\bibliography.
+    bst : str or None
+        Bibliography style.
+
+    Returns
+    -------
+    dict
+        File name to hex digest map. Digests of missing files are None.
+    """
+    names = [b.strip() for b in bib.split(',') if b.strip()]
+    names = [n if n.endswith('.bib') else n + '.bib' for n in names]
+    if bst:
+        names.append(bst + '.bst')
+    hashes = {}
+    for name in names:
+        path = bibshard.find_file(pathlib.Path(directory), name)
+        if path is None:
+            hashes[name] = None
+            continue
+        with open(path, 'rb') as f:
+            hashes[name] = hashlib.sha1(f.read()).hexdigest()
+    return hashes
+
 
 class Cite:
     """Citation package emurating contents and commands.
@@ -39,18 +227,27 @@ class Cite:
 
         self._targetbasename = targetbasename
 
+        self._citeleft = citeleft
+        self._citeright = citeright
+        self._use_cite_package = use_cite_package
+        Cite.reset(self)
+
+    def reset(self):
+        """Forget citations of the current document.
+
+        Citations found in context and .aux file, citation labels
+        and conversion dictionary are cleared,
+        while delimiters and cite package setting are kept.
+        """
         self._replacer = None
         self._citation = []
         self._bibstyle = None
         self._bibdata = None
         self._bibcite = {}
         self._conversion_dict = {}
-
         self._citation_labels = dict()
-        self._citeleft = citeleft
-        self._citeright = citeright
-        self._use_cite_package = use_cite_package
         self._citation_keys_in_context = []
+        self._citation_keys_seen = set()
 
     @property
     def citeleft(self):
@@ -160,6 +357,7 @@ class Cite:
 
         Find all citation keys from context written to .tex file.
         Found keys are stores to citation_keys_in_context attribute.
+        Keys already stored are not stored again.
 
         Parameters
         ----------
@@ -176,9 +374,14 @@ class Cite:
         >>> tx._citation_keys_in_context
         ['key', 'key1,key2']
         """
-        found_keys = re.findall(r'\\+cite\{(.*?)\}', c)
-        for k in found_keys:
-            self._citation_keys_in_context.append(k)
+        for citation in parse_citations(c):
+            keys = ','.join(citation.keys)
+            if citation.command == 'nocite' or not keys:
+                continue
+            if keys in self._citation_keys_seen:
+                continue
+            self._citation_keys_seen.add(keys)
+            self._citation_keys_in_context.append(keys)
 
     def read_aux(self):
         r"""Read .aux file.
@@ -197,14 +400,19 @@ class Cite:
         - \\bibcite{k}{n}
            Added to bibcite attribute
            (dictionary) as {k: n}.
+
+        Results of the previously read .aux file are replaced,
+        and the file contents are not kept after parsing.
         """
+        self._citation = []
+        self._bibcite = {}
+        self._conversion_dict = {}
         fn = self.workdir / (self._targetbasename + '.aux')
         with codecs.open(fn, 'r', 'utf-8') as f:
-            self._auxdata = f.readlines()
-        for line in self._auxdata:
-            self._parse_line(line)
+            for line in f:
+                self._parse_line(line)
         self._build_conversion_dict()
-        self._citation_labels.update(self._bibcite)
+        self._citation_labels = dict(self._bibcite)
         self._get_replacer()
 
     def _parse_line(self, line):
@@ -240,6 +448,9 @@ class Cite:
         Generate dictionary of such as {'refa,refb,refc,refe,refg': '1-3,5,7'}.
         """
         for cite in self._citation:
+            if '*' in cite.split(','):
+                # \nocite{*} cites whole database without label.
+                continue
             cite_nums = [self._bibcite[c] for c in cite.split(',')]
             self._conversion_dict.update(
                 {cite: self._compress(cite_nums)}
@@ -263,13 +474,26 @@ class Cite:
         By default, if there are three or more consecutive numbers,
         they are compressed into a range using an en-dash.
         Citation numbers are also sorted in the default condition.
+        natbib and biblatex commands such as \citep and \parencite
+        are formatted as numeric citations. Textual commands such as
+        \citet, \citeauthor and \citeyear print author names or years,
+        which numeric labels cannot express, and are rejected.
+        An optional argument is appended as a note,
+        and the first of two optional arguments is prepended.
+        \nocite is formatted as an empty string.
 
         Parameters
         ----------
-        s : str
-            Raw string to be formatted.
+        s : str or Citation
+            Raw string to be formatted or a citation record.
             For example, \\cite{key1} or \\cite{key2,key3}.
 
+        Raises
+        ------
+        ValueError
+            If no citation command is found in s,
+            or the command is a textual citation command.
+
         Examples
         --------
         >>> import wdbibtex
@@ -281,6 +505,8 @@ class Cite:
         '[2,3]'
         >>> tx.cite('\\cite{key3,key2,key1}')
         '[3,2,1]'
+        >>> tx.cite('\\citep[see][p.~3]{key1, key2}')
+        '[see 1,2, p. 3]'
 
         >>> import wdbibtex
         >>> tx = wdbibtex.LaTeX()
@@ -295,38 +521,40 @@ class Cite:
 
         Note \\u2013 is en-dash.
         """
-        p = re.compile(r'\\+cite\{(.*)\}')
-        if p.match(s):
-            keys = p.match(s).group(1).split(',')
-            if len(keys) == 1:
-                key = keys[0]
-                return (
-                    self._citeleft
-                    + str(self._citation_labels[key])
-                    + self._citeright
+        if isinstance(s, Citation):
+            citation = s
+        else:
+            found = parse_citations(s)
+            if not found:
+                raise ValueError(
+                    'no citation pattern matched.'
                 )
-            if len(keys) > 1:
-                if self._use_cite_package:
-                    nums = sorted(
-                        [self._citation_labels[key] for key in keys]
-                    )
-                    return (
-                        self._citeleft
-                        + self._compress(nums)
-                        + self._citeright
-                    )
-                else:
-                    nums = [str(self._citation_labels[key]) for key in keys]
-                    return (
-                        self._citeleft
-                        + ','.join(nums)
-                        + self._citeright
-                    )
+            citation = found[0]
+        if citation.command == 'nocite':
+            return ''
+        if citation.textual:
+            raise ValueError(
+                'Textual citation \\%s cannot be formatted as a numeric '
+                'label: %s' % (citation.command, citation.source)
+            )
+
+        keys = citation.keys
+        if len(keys) > 1 and self._use_cite_package:
+            nums = sorted(
+                [self._citation_labels[key] for key in keys]
+            )
+            text = self._compress(nums)
         else:
-            ValueError(
-                'no citation pattern matched.'
+            text = ','.join(
+                str(self._citation_labels[key]) for key in keys
             )
 
+        if len(citation.options) == 2 and citation.options[0]:
+            text = citation.options[0].replace('~', ' ') + ' ' + text
+        if citation.options and citation.options[-1]:
+            text = text + ', ' + citation.options[-1].replace('~', ' ')
+        return self._citeleft + text + self._citeright
+
     def _compress(self, nums, sep=u'\u2013'):
         r"""Compress groups of three or more consecutive numbers into a range.
 
@@ -374,6 +602,234 @@ class Cite:
         return final_str
 
 
+class BibitemCache:
+    r"""Cache of converted bibliography entries keyed by raw bbl item.
+
+    Converted plain texts of bibliography entries are cached with the
+    hash of the raw \bibitem block as a key. The cache is kept in memory
+    and evicted in least-recently-used order. If a path is given,
+    the cache is loaded from and saved to the JSON file.
+    Bibliography saves the cache once after rendering thebibliography
+    and on reset(). Entries rendered one by one, e.g. by BibEntry.text,
+    are saved by calling save().
+
+    Parameters
+    ----------
+    maxsize : int or None, default 4096
+        Maximum number of cached entries. If None, the cache is unbounded.
+    path : str, path object or None, default None
+        JSON file to persist the cache. If None, the cache is in memory only.
+
+    Examples
+    --------
+    >>> import wdbibtex
+    >>> cache = wdbibtex.BibitemCache(maxsize=2)
+    >>> cache.get('\\bibitem{key}\nRaw text.\n') is None
+    True
+    >>> cache.put('\\bibitem{key}\nRaw text.\n', 'Raw text.\n')
+    >>> cache.get('\\bibitem{key}\nRaw text.\n')
+    'Raw text.\n'
+    >>> cache.stats
+    {'hits': 1, 'misses': 1, 'size': 1}
+    """
+
+    # Bumped when the conversion rules change to invalidate saved caches.
+    _version = 1
+
+    def __init__(self, maxsize=4096, path=None):
+        """Constructor of BibitemCache.
+        """
+        self.__maxsize = maxsize
+        self.__path = None if path is None else pathlib.Path(path)
+        self.__entries = collections.OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__modified = False
+        if self.__path is not None and self.__path.exists():
+            self.__load()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    @property
+    def path(self):
+        """[Read only] Returns JSON file to persist the cache, or None.
+        """
+        return self.__path
+
+    @property
+    def stats(self):
+        """[Read only] Returns hit and miss counts and number of entries.
+
+        Returns
+        -------
+        dict
+            Dictionary with keys of hits, misses and size.
+        """
+        return {
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'size': len(self.__entries),
+        }
+
+    def get(self, raw):
+        """Returns converted text of a raw bbl item, or None if not cached.
+
+        Parameters
+        ----------
+        raw : str
+            Raw \\bibitem block of .bbl file.
+
+        Returns
+        -------
+        str or None
+            Converted text if cached, else None.
+        """
+        key = self.__key(raw)
+        if key in self.__entries:
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return self.__entries[key]
+        self.__misses += 1
+        return None
+
+    def put(self, raw, text):
+        """Store converted text of a raw bbl item.
+
+        Parameters
+        ----------
+        raw : str
+            Raw \\bibitem block of .bbl file.
+        text : str
+            Converted text.
+        """
+        key = self.__key(raw)
+        self.__entries[key] = text
+        self.__entries.move_to_end(key)
+        self.__modified = True
+        if self.__maxsize is not None:
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def save(self):
+        """Save the cache to the JSON file if path is given.
+
+        Nothing is written if no entry is stored since the last save.
+        """
+        if self.__path is None or not self.__modified:
+            return
+        self.__path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.__path.with_name(self.__path.name + '.tmp')
+        with codecs.open(tmp, 'w', 'utf-8') as f:
+            json.dump(
+                {
+                    'version': self._version,
+                    'entries': list(self.__entries.items()),
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, self.__path)
+        self.__modified = False
+
+    def __load(self):
+        try:
+            with codecs.open(self.__path, 'r', 'utf-8') as f:
+                data = json.load(f)
+        except ValueError:
+            # Broken cache file is discarded.
+            return
+        if data.get('version') != self._version:
+            return
+        for key, text in data.get('entries', []):
+            self.__entries[key] = text
+        if self.__maxsize is not None:
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def __key(self, raw):
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class BibEntry:
+    r"""One entry of LaTeX-processed bibliography.
+
+    BibEntry keeps only the position of its \bibitem block
+    in the raw .bbl text shared by all entries.
+    The plain text is rendered on first access and kept afterwards.
+
+    Attributes
+    ----------
+    key : str
+        Citation key, e.g. key of \bibitem{key}.
+    label : str
+        Citation label, e.g. 1 for the first entry.
+    """
+
+    __slots__ = (
+        'key', 'label', '_bbl', '_start', '_end', '_text', '_runs', '_owner'
+    )
+
+    def __init__(self, key, label, bbl, start, end, owner):
+        """Constructor of BibEntry.
+        """
+        self.key = key
+        self.label = label
+        self._bbl = bbl
+        self._start = start
+        self._end = end
+        self._text = None
+        self._runs = None
+        self._owner = owner
+
+    def __repr__(self):
+        return 'BibEntry(key=%r, label=%r)' % (self.key, self.label)
+
+    @property
+    def span(self):
+        """[Read only] Returns start and end position in .bbl text.
+
+        Returns
+        -------
+        tuple of int
+            Start and end position of the raw \\bibitem block.
+        """
+        return self._start, self._end
+
+    @property
+    def raw(self):
+        """[Read only] Returns raw \\bibitem block of .bbl file.
+        """
+        return self._bbl[self._start:self._end]
+
+    @property
+    def text(self):
+        """[Read only] Returns plain text of the entry without label.
+
+        The text is rendered on first access.
+        """
+        if self._text is None:
+            self._owner._render_entries([self])
+        return self._text
+
+    @property
+    def runs(self):
+        """[Read only] Returns formatted runs of the entry without label.
+
+        The runs are rendered on first access.
+
+        Returns
+        -------
+        list of tuple
+            Each run is a tuple of (text, italic, url).
+            italic is True for \\emph and {\\em } text.
+            url is the link target for \\url text, else None.
+        """
+        if self._runs is None:
+            self._owner._render_entries([self], runs=True)
+        return self._runs
+
+
 class Bibliography:
     """LaTeX bbl file related contents and commands.
 
@@ -383,6 +839,20 @@ class Bibliography:
         Base name of LaTeX related files.
     workdir : str or path object, default '.tmp'
         Temporal working directory to store LaTeX contents.
+    bibitem_cache : BibitemCache or None, default None
+        Cache of converted bibliography entries.
+        Entries found in the cache are not converted again.
+        If None, an in-memory cache owned by this object is used.
+    workers : int or None, default None
+        Number of processes to convert bibliography entries in parallel.
+        If None, the number of CPUs is used.
+    parallel_threshold : int, default 500
+        Minimum number of entries to be converted to use processes.
+        Fewer entries are converted serially in this process,
+        because starting processes costs more than the conversion.
+    chunksize : int or None, default None
+        Number of entries sent to a process at once.
+        If None, entries are split into four chunks per process.
 
     Examples
     --------
@@ -394,6 +864,10 @@ class Bibliography:
         self,
         targetbasename='wdbib',
         workdir='.tmp',
+        bibitem_cache=None,
+        workers=None,
+        parallel_threshold=500,
+        chunksize=None,
     ):
         """Cunstructor of Bibliography
         """
@@ -407,6 +881,37 @@ class Bibliography:
             ).resolve()
 
         self._targetbasename = targetbasename
+        if bibitem_cache is None:
+            bibitem_cache = BibitemCache()
+        self._bibitem_cache = bibitem_cache
+        self._workers = workers
+        self._parallel_threshold = parallel_threshold
+        self._chunksize = chunksize
+        Bibliography.reset(self)
+
+    def reset(self):
+        """Forget bibliography entries of the current document.
+
+        bibitem_cache is kept, so that entries rendered for
+        a document are not converted again for the next one,
+        and saved if it has a path.
+        """
+        self._bibitem_cache.save()
+        self._entries = None
+        self._entries_by_key = {}
+        self._entries_by_label = {}
+        self._thebibtext = None
+
+    @property
+    def bibitem_cache(self):
+        """[Read only] Returns cache of converted bibliography entries.
+
+        Returns
+        -------
+        BibitemCache
+            Cache object. Its stats attribute shows hit and miss counts.
+        """
+        return self._bibitem_cache
 
     @property
     def thebibliography(self):
@@ -432,15 +937,147 @@ class Bibliography:
             If thebibliography text is not set.
         """  # noqa E501
         if self._thebibtext is None:
+            self._thebibtext = ''.join(self.iter_thebibliography())
+        return self._thebibtext
+
+    @property
+    def entries(self):
+        """[Read only] Returns bibliography entries in .bbl order.
+
+        Returns
+        -------
+        tuple of BibEntry
+            Entries read by read_bbl. Texts are rendered on access.
+
+        Raises
+        ------
+        ValueError
+            If .bbl file is not read yet.
+        """
+        if self._entries is None:
             raise ValueError(
                 'Thebibliography text is not set yet.'
             )
-        return self._thebibtext
+        return self._entries
+
+    def entry(self, key):
+        """Returns bibliography entry of a citation key.
+
+        Parameters
+        ----------
+        key : str
+            Citation key.
+
+        Returns
+        -------
+        BibEntry
+            Entry of the key.
+
+        Raises
+        ------
+        KeyError
+            If the key is not in the bibliography.
+        """
+        self.entries  # Raise ValueError if .bbl is not read yet.
+        return self._entries_by_key[key]
+
+    def entry_by_label(self, label):
+        """Returns bibliography entry of a citation label.
+
+        Parameters
+        ----------
+        label : str or int
+            Citation label such as 1 or '1'.
+
+        Returns
+        -------
+        BibEntry
+            Entry of the label.
+
+        Raises
+        ------
+        KeyError
+            If the label is not in the bibliography.
+        """
+        self.entries  # Raise ValueError if .bbl is not read yet.
+        return self._entries_by_label[str(label)]
+
+    def iter_thebibliography(self):
+        r"""Yield lines of thebibliography plain text one by one.
+
+        Entries are rendered in batches while iterating,
+        without building whole thebibliography text.
+        bibitem_cache is saved once per batch.
+
+        Yields
+        ------
+        str
+            One line such as '[1]\tF. Author, "Title," 2022.\n'.
+        """
+        entries = self.entries
+        batch = max(self._parallel_threshold, 1)
+        for i in range(0, len(entries), batch):
+            chunk = entries[i:i + batch]
+            self._render_entries(chunk)
+            self._bibitem_cache.save()
+            for e in chunk:
+                yield '[%s]\t' % e.label + e.text
+
+    @property
+    def thebibliography_xml(self):
+        """[Read only] Flat OPC package to replace \\thebibliography.
+
+        WordprocessingML version of thebibliography.
+        Each entry is a paragraph with a hanging indent,
+        and a tab is inserted after the citation label.
+        Italic text is kept and URLs are hyperlinks.
+        The package can be inserted into word file at once
+        by Range.InsertXML.
+
+        Returns
+        -------
+        str
+            Flat OPC package of thebibliography.
+
+        Raises
+        ------
+        ValueError
+            If .bbl file is not read yet.
+        """
+        return _FLAT_OPC % ''.join(self.iter_thebibliography_xml())
+
+    def iter_thebibliography_xml(self, hanging=None):
+        """Yield WordprocessingML paragraphs of thebibliography one by one.
+
+        Paragraphs can be spliced into document.xml of .docx package.
+
+        Parameters
+        ----------
+        hanging : int or None, default None
+            Hanging indent in twips.
+            If None, the indent is fitted to the longest label.
+
+        Yields
+        ------
+        str
+            One w:p element.
+        """
+        entries = self.entries
+        if hanging is None and entries:
+            hanging = 120 * (len('[%s]' % entries[-1].label) + 1)
+        batch = max(self._parallel_threshold, 1)
+        for i in range(0, len(entries), batch):
+            chunk = entries[i:i + batch]
+            self._render_entries(chunk, runs=True)
+            for e in chunk:
+                yield _bibitem_paragraph('[%s]' % e.label, e.runs, hanging)
 
     def read_bbl(self):
         """Read .bbl file.
 
-        Read .bbl file to extract formatted thebibliography text.
+        Read .bbl file and split it into bibliography entries.
+        Each entry is converted into plain text on demand.
+        Only the entries not found in bibitem_cache are converted.
 
         Examples
         --------
@@ -450,89 +1087,584 @@ class Bibliography:
         """
         fn = self.workdir / (self._targetbasename + '.bbl')
         with codecs.open(fn, 'r', 'utf-8') as f:
-            self._bbldata = f.readlines()
-        self._make_thebibliography_text()
-
-    def _make_thebibliography_text(self):
-        """Generate thebibliography plain text to incert word file.
-        """
-        replacer = {}
-        replacer.update({
-            r'\n  ': ' ',
-            r'\{\\em (.*?)\}': r'\1',
-            r'\\emph\{((?>[^\{\}]+|(?R))*)\}': r'\1',
-            r'\\BIBforeignlanguage\{(.*?)\}\{(.*?)\}': r'\2',
-            r'\\BIBforeignlanguage\{(.*?)\{(.*?)\}\}': r'\2',
-            r'~': ' ',
-            r'\\,': '',
-            r'--': u'\u2013',
-            r'``': '“',
-            r"''": '”',
-            r'\n\n': '\n',
-            r'\\BIBentryALTinterwordspacing\n': '',
-            r'\\BIBentrySTDinterwordspacing\n': '',
-            r'\\url\{(.*?)\}': r'\1',
-            r'\{\\"\{A\}\}': 'Ä',
-            r'\{\\"\{a\}\}': 'ä',
-            r'\{\\"\{E\}\}': 'Ë',
-            r'\{\\"\{e\}\}': 'ë',
-            r'\{\\"\{I\}\}': 'Ï',
-            r'\{\\"\{i\}\}': 'ï',
-            r'\{\\"\{O\}\}': 'Ö',
-            r'\{\\"\{o\}\}': 'ö',
-            r'\{\\"\{U\}\}': 'Ü',
-            r'\{\\"\{u\}\}': 'ü',
-            r'\{\\"\{Y\}\}': 'Ÿ',
-            r'\{\\"\{y\}\}': 'ÿ',
-            r"\{\\'\{E\}\}": 'É',
-            r"\{\\'\{e\}\}": 'é',
-            r"\{\\'\{O\}\}": 'Ó',
-            r"\{\\'\{o\}\}": 'ó',
-            r'{\\AA}': 'Å',
-            r'{\\aa}': 'å',
-            r' +': ' ',
-            r'\\hskip [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em ' +
-            r'plus [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em ' +
-            r'minus [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em\\relax': ' ',
-            })
-        thebib_begin = None
-        for i, line in enumerate(self._bbldata):
-            if line.startswith('\\bibitem') and thebib_begin is None:
-                thebib_begin = i
-            if line.startswith('\\end{thebibliography}'):
-                thebib_end = i
-        thebibtext = ''.join(self._bbldata[thebib_begin: thebib_end])
-
-        # Replace thebibliography text
-        found = True
-        while found:
-            found = False
-            for k, v in replacer.items():
-                thebibold = thebibtext
-                import regex
-                thebibtext = regex.sub(k, v, thebibtext)
-                if thebibold != thebibtext:
-                    found = True
-
-        # Bracket removal
-        found = True
-        while found:
-            found = False
-            thebibold = thebibtext
-            import regex
-            thebibtext = regex.sub(
-                r'(?<!bibitem)\{((?>[^\{\}]+|(?R))*)\}',
-                r'\1',
-                thebibtext
+            self._parse_bbl(f.read())
+
+    def _parse_bbl(self, bbl):
+        """Split .bbl text into bibliography entries.
+
+        The text is referred only by the entries,
+        so that it is released with them.
+        """
+        starts = [
+            m for m in re.finditer(
+                r'^\\bibitem(?:\[[^\]]*\])?\{(.*?)\}\n', bbl, re.MULTILINE
+            )
+        ]
+        end = None
+        for m in re.finditer(r'^\\end\{thebibliography\}', bbl, re.MULTILINE):
+            end = m.start()
+        entries = []
+        for c, m in enumerate(starts):
+            if c + 1 < len(starts):
+                block_end = starts[c + 1].start()
+            else:
+                block_end = end if end is not None else len(bbl)
+            entries.append(BibEntry(
+                m.group(1), str(c + 1), bbl, m.start(), block_end, self
+            ))
+        self._entries = tuple(entries)
+        self._entries_by_key = {e.key: e for e in entries}
+        self._entries_by_label = {e.label: e for e in entries}
+        self._thebibtext = None
+
+    def _render_entries(self, entries, runs=False):
+        """Render texts of entries, looking up bibitem_cache first.
+
+        Parameters
+        ----------
+        entries : sequence of BibEntry
+            Entries to render. Already rendered entries are skipped.
+        runs : bool, default False
+            If True, render formatted runs instead of plain texts.
+            Formatted runs are not cached.
+        """
+        if runs:
+            missing = [e for e in entries if e._runs is None]
+            if missing:
+                converted = self._convert_bibitems(
+                    [e.raw for e in missing], _convert_bibitem_runs
+                )
+                for e, r in zip(missing, converted):
+                    e._runs = r
+            return
+
+        missing = []
+        for e in entries:
+            if e._text is not None:
+                continue
+            raw = e.raw
+            e._text = self._bibitem_cache.get(raw)
+            if e._text is None:
+                missing.append(e)
+        if not missing:
+            return
+        converted = self._convert_bibitems([e.raw for e in missing])
+        for e, text in zip(missing, converted):
+            e._text = text
+            self._bibitem_cache.put(e.raw, text)
+
+    def _convert_bibitems(self, blocks, convert=None):
+        """Convert raw \\bibitem blocks, in parallel if there are many.
+
+        Parameters
+        ----------
+        blocks : list of str
+            Raw \\bibitem blocks.
+        convert : callable or None, default None
+            Module level function to convert a block.
+            If None, blocks are converted into plain texts.
+
+        Returns
+        -------
+        list
+            Converted entries in the same order as blocks.
+        """
+        if convert is None:
+            convert = _convert_bibitem
+        workers = self._workers or os.cpu_count() or 1
+        if workers < 2 or len(blocks) < max(2, self._parallel_threshold):
+            return [convert(b) for b in blocks]
+
+        chunksize = self._chunksize or max(1, len(blocks) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(workers) as ex:
+            return list(ex.map(convert, blocks, chunksize=chunksize))
+
+
+class BuildResult(Cite):
+    r"""Serializable result of a LaTeX build.
+
+    BuildResult keeps what is needed to format citations and
+    thebibliography: citation labels, delimiters, bibliography entries,
+    bibliography style and preamble. It can be saved to and loaded from
+    a JSON file, so that another process or a later run can format
+    citations without running or parsing LaTeX.
+    Citations are formatted by the cite method as LaTeX.cite.
+    The distinct citations and digests of the .bib and .bst files
+    of the build are kept to check if the result is current,
+    see is_current.
+
+    Parameters
+    ----------
+    citation_labels : dict
+        Citation key to citation number map.
+    entries : list of tuple
+        Bibliography entries of (key, label, text) in .bbl order.
+    citeleft : str, default '['
+        Left delimiter of list.
+    citeright : str, default ']'
+        Right delimiter of list.
+    use_cite_package : bool, default False
+        If True, emulate cite package's behavior.
+    bibliographystyle : str or None, default None
+        Bibliography style used for the build.
+    preamble : str or None, default None
+        Preamble used for the build.
+    citations : list of str or None, default None
+        Distinct citation lines such as \\cite{key1,key2} and
+        \\nocite{key3} in order of first appearance.
+    sources : dict or None, default None
+        File name to SHA-1 digest map of .bib and .bst files.
+
+    Examples
+    --------
+    >>> import wdbibtex
+    >>> result = wdbibtex.BuildResult(
+    ...     {'key1': 1, 'key2': 2},
+    ...     [('key1', '1', 'A. Name, 2022.\n'), ('key2', '2', 'B. Name.\n')],
+    ... )
+    >>> result.cite('\\cite{key2,key1}')
+    '[2,1]'
+    >>> result.thebibliography
+    '[1]\tA. Name, 2022.\n[2]\tB. Name.\n'
+    >>> result.save('.tmp/wdbib.json')  # doctest: +SKIP
+    >>> result = wdbibtex.BuildResult.load('.tmp/wdbib.json')  # doctest: +SKIP
+    """
+
+    # Bumped when the file format changes.
+    _version = 2
+
+    def __init__(
+            self,
+            citation_labels,
+            entries,
+            citeleft='[',
+            citeright=']',
+            use_cite_package=False,
+            bibliographystyle=None,
+            preamble=None,
+            citations=None,
+            sources=None,
+    ):
+        """Constructor of BuildResult.
+        """
+        super().__init__(
+            citeleft=citeleft,
+            citeright=citeright,
+            use_cite_package=use_cite_package,
+        )
+        self._citation_labels = dict(citation_labels)
+        self._result_entries = [tuple(e) for e in entries]
+        self._bibliographystyle = bibliographystyle
+        self._preamble = preamble
+        self._citations = None if citations is None else list(citations)
+        self._sources = None if sources is None else dict(sources)
+
+    @property
+    def entries(self):
+        """[Read only] Returns bibliography entries.
+
+        Returns
+        -------
+        list of tuple
+            Entries of (key, label, text) in .bbl order.
+        """
+        return list(self._result_entries)
+
+    @property
+    def bibliographystyle(self):
+        """[Read only] Returns bibliography style used for the build.
+        """
+        return self._bibliographystyle
+
+    @property
+    def preamble(self):
+        """[Read only] Returns preamble used for the build.
+        """
+        return self._preamble
+
+    @property
+    def citations(self):
+        """[Read only] Returns distinct citation lines of the build.
+        """
+        return None if self._citations is None else list(self._citations)
+
+    @property
+    def sources(self):
+        """[Read only] Returns digests of .bib and .bst files of the build.
+        """
+        return None if self._sources is None else dict(self._sources)
+
+    @property
+    def thebibliography(self):
+        """[Read only] Plain text to replace \\thebibliography in word file.
+
+        Same as LaTeX.thebibliography of the build.
+        """
+        return ''.join(
+            '[%s]\t' % label + text for _, label, text in self._result_entries
+        )
+
+    def is_current(self, tx, citations, bib=None):
+        r"""Check if the result can be used instead of a new build.
+
+        The result is current only if the preamble and bibliography
+        style of tx, the distinct citations in order of first appearance
+        and the contents of the .bib and .bst files are equal to
+        those of the build. Removed or reordered citations change
+        numbers of unsorted styles, so a result labelling all cited keys
+        is not enough.
+
+        Parameters
+        ----------
+        tx : LaTeX
+            LaTeX object of the new build, whose preamble and
+            bibliography style are set.
+        citations : iterable of str or Citation
+            Citations of the new build.
+        bib : str or None, default None
+            Bibliography file(s) as for LaTeX.write.
+
+        Returns
+        -------
+        bool
+            True if the result is current.
+
+        Examples
+        --------
+        >>> import wdbibtex
+        >>> tx = wdbibtex.LaTeX()
+        >>> result = wdbibtex.BuildResult(
+        ...     {'a': 1, 'b': 2}, [],
+        ...     preamble=tx.preamble, citations=['\\cite{a}', '\\cite{b}'],
+        ...     sources={},
+        ... )
+        >>> cites = ['\\cite{a}', '\\cite{b}', '\\cite{a}']
+        >>> result.is_current(tx, cites, bib='')
+        True
+        >>> result.is_current(tx, ['\\cite{b}', '\\cite{a}'], bib='')
+        False
+        """
+        if self._citations is None or self._sources is None:
+            return False
+        if (
+            self._preamble != tx.preamble
+            or self._bibliographystyle != tx.bibliographystyle
+            or self._citations != list(_context_lines(citations))
+        ):
+            return False
+        return self._sources == _source_hashes(
+            tx.workdir, _bibliography_option(bib), tx.bibliographystyle
+        )
+
+    def save(self, path):
+        """Save the result to a JSON file.
+
+        Parameters
+        ----------
+        path : str or path object
+            JSON file to write.
+        """
+        path = pathlib.Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        with codecs.open(tmp, 'w', 'utf-8') as f:
+            json.dump(
+                {
+                    'version': self._version,
+                    'citation_labels': self._citation_labels,
+                    'entries': self._result_entries,
+                    'citeleft': self._citeleft,
+                    'citeright': self._citeright,
+                    'use_cite_package': self._use_cite_package,
+                    'bibliographystyle': self._bibliographystyle,
+                    'preamble': self._preamble,
+                    'citations': self._citations,
+                    'sources': self._sources,
+                },
+                f,
+                ensure_ascii=False,
+                separators=(',', ':'),
             )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a result from a JSON file.
+
+        Parameters
+        ----------
+        path : str or path object
+            JSON file written by save.
+
+        Returns
+        -------
+        BuildResult
+            Loaded result.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a result of this version.
+        """
+        with codecs.open(path, 'r', 'utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != cls._version:
+            raise ValueError(
+                'Unsupported build result version: %s' % data.get('version')
+            )
+        return cls(
+            data['citation_labels'],
+            data['entries'],
+            citeleft=data['citeleft'],
+            citeright=data['citeright'],
+            use_cite_package=data['use_cite_package'],
+            bibliographystyle=data['bibliographystyle'],
+            preamble=data['preamble'],
+            citations=data['citations'],
+            sources=data['sources'],
+        )
+
+
+# Rules to convert LaTeX bibliography text into plain text.
+_BIBITEM_REPLACER = {
+    r'\n  ': ' ',
+    r'\{\\em (.*?)\}': r'\1',
+    r'\\emph\{((?>[^\{\}]+|(?R))*)\}': r'\1',
+    r'\\BIBforeignlanguage\{(.*?)\}\{(.*?)\}': r'\2',
+    r'\\BIBforeignlanguage\{(.*?)\{(.*?)\}\}': r'\2',
+    r'~': ' ',
+    r'\\,': '',
+    r'--': u'\u2013',
+    r'``': '“',
+    r"''": '”',
+    r'\n\n': '\n',
+    r'\\BIBentryALTinterwordspacing\n': '',
+    r'\\BIBentrySTDinterwordspacing\n': '',
+    r'\\url\{(.*?)\}': r'\1',
+    r'\{\\"\{A\}\}': 'Ä',
+    r'\{\\"\{a\}\}': 'ä',
+    r'\{\\"\{E\}\}': 'Ë',
+    r'\{\\"\{e\}\}': 'ë',
+    r'\{\\"\{I\}\}': 'Ï',
+    r'\{\\"\{i\}\}': 'ï',
+    r'\{\\"\{O\}\}': 'Ö',
+    r'\{\\"\{o\}\}': 'ö',
+    r'\{\\"\{U\}\}': 'Ü',
+    r'\{\\"\{u\}\}': 'ü',
+    r'\{\\"\{Y\}\}': 'Ÿ',
+    r'\{\\"\{y\}\}': 'ÿ',
+    r"\{\\'\{E\}\}": 'É',
+    r"\{\\'\{e\}\}": 'é',
+    r"\{\\'\{O\}\}": 'Ó',
+    r"\{\\'\{o\}\}": 'ó',
+    r'{\\AA}': 'Å',
+    r'{\\aa}': 'å',
+    r' +': ' ',
+    r'\\hskip [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em ' +
+    r'plus [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em ' +
+    r'minus [+-]?(?:\d*\.)?\d+(?:(?<!(\.\d+))\.\d*)?em\\relax': ' ',
+}
+
+
+def _convert_bibitem(block):
+    r"""Convert a raw \bibitem block into plain text.
+
+    The \bibitem command line is dropped and the rest of block
+    is converted until no conversion rule matches.
+
+    Parameters
+    ----------
+    block : str
+        Raw \bibitem block of .bbl file.
+
+    Returns
+    -------
+    str
+        Plain text of the bibliography entry without label.
+
+    Examples
+    --------
+    >>> from wdbibtex.latex import _convert_bibitem
+    >>> _convert_bibitem(
+    ...     "\\bibitem{key}\nA.~Name, ``Title,'' {\\em Journal},\n"
+    ...     "  pp.~1--2.\n\n"
+    ... )
+    'A. Name, “Title,” Journal, pp. 1–2.\n'
+    """
+    thebibtext = re.sub(r'^\\bibitem(\[[^\]]*\])?\{.*?\}\n', '', block)
+    return _rewrite_bibitem(thebibtext, _BIBITEM_REPLACER)
+
+
+def _rewrite_bibitem(thebibtext, replacer):
+    """Apply conversion rules and remove brackets until nothing changes.
+    """
+    import regex
+
+    # Replace thebibliography text
+    found = True
+    while found:
+        found = False
+        for k, v in replacer.items():
+            thebibold = thebibtext
+            thebibtext = regex.sub(k, v, thebibtext)
             if thebibold != thebibtext:
                 found = True
 
-        for c, m in enumerate(re.findall('\\\\bibitem{(.*)}\n', thebibtext)):
-            thebibtext = re.sub(
-                '\\\\bibitem{%s}\n' % m, '[%s]\t' % (c+1), thebibtext
+    # Bracket removal
+    found = True
+    while found:
+        found = False
+        thebibold = thebibtext
+        thebibtext = regex.sub(
+            r'(?<!bibitem)\{((?>[^\{\}]+|(?R))*)\}',
+            r'\1',
+            thebibtext
+        )
+        if thebibold != thebibtext:
+            found = True
+    return thebibtext
+
+
+# Private use characters marking formatted text while converting.
+_ITALIC_BEGIN = u'\ue000'
+_ITALIC_END = u'\ue001'
+_URL_BEGIN = u'\ue002'
+_URL_END = u'\ue003'
+
+
+def _convert_bibitem_runs(block):
+    r"""Convert a raw \bibitem block into formatted runs.
+
+    Conversion rules are the same as _convert_bibitem
+    except that italic text and URLs are kept as runs.
+
+    Parameters
+    ----------
+    block : str
+        Raw \bibitem block of .bbl file.
+
+    Returns
+    -------
+    list of tuple
+        Runs of (text, italic, url) without label and line breaks.
+
+    Examples
+    --------
+    >>> from wdbibtex.latex import _convert_bibitem_runs
+    >>> _convert_bibitem_runs(
+    ...     "\\bibitem{key}\nA.~Name, {\\em Journal},\n"
+    ...     "  \\url{http://a.org/~b}.\n\n"
+    ... )
+    [('A. Name, ', False, None), ('Journal', True, None), (', ', False, None), ('http://a.org/~b', False, 'http://a.org/~b'), ('.', False, None)]
+    """  # noqa E501
+    urls = []
+
+    def _url(m):
+        urls.append(m.group(1))
+        return '%s%d%s' % (_URL_BEGIN, len(urls) - 1, _URL_END)
+
+    italic = _ITALIC_BEGIN + r'\1' + _ITALIC_END
+    replacer = dict(_BIBITEM_REPLACER)
+    replacer[r'\{\\em (.*?)\}'] = italic
+    replacer[r'\\emph\{((?>[^\{\}]+|(?R))*)\}'] = italic
+
+    thebibtext = re.sub(r'^\\bibitem(\[[^\]]*\])?\{.*?\}\n', '', block)
+    # URLs are taken out first, so that the rules never touch them.
+    thebibtext = re.sub(r'\\url\{(.*?)\}', _url, thebibtext)
+    thebibtext = _rewrite_bibitem(thebibtext, replacer)
+    thebibtext = thebibtext.rstrip('\n').replace('\n', ' ')
+
+    runs = []
+    depth = 0
+    markers = '(%s|%s|%s\\d+%s)' % (
+        _ITALIC_BEGIN, _ITALIC_END, _URL_BEGIN, _URL_END
+    )
+    for token in re.split(markers, thebibtext):
+        if token == _ITALIC_BEGIN:
+            depth += 1
+        elif token == _ITALIC_END:
+            depth = max(depth - 1, 0)
+        elif token.startswith(_URL_BEGIN):
+            url = urls[int(token[1:-1])]
+            runs.append((url, depth > 0, url))
+        elif token:
+            runs.append((token, depth > 0, None))
+    return runs
+
+
+def _bibitem_paragraph(label, runs, hanging=None):
+    """Render a WordprocessingML paragraph of a bibliography entry.
+
+    Parameters
+    ----------
+    label : str
+        Citation label such as [1].
+    runs : list of tuple
+        Runs of (text, italic, url) as returned by _convert_bibitem_runs.
+    hanging : int or None, default None
+        Hanging indent in twips. If None, no indent is set.
+
+    Returns
+    -------
+    str
+        A w:p element.
+    """
+    from xml.sax.saxutils import escape
+
+    def _run(text, italic=False):
+        rpr = '<w:rPr><w:i/></w:rPr>' if italic else ''
+        return '<w:r>%s<w:t xml:space="preserve">%s</w:t></w:r>' % (
+            rpr, escape(text)
+        )
+
+    xml = ['<w:p>']
+    if hanging is not None:
+        xml.append(
+            '<w:pPr><w:ind w:left="%d" w:hanging="%d"/></w:pPr>'
+            % (hanging, hanging)
+        )
+    xml.append(_run(label))
+    xml.append('<w:r><w:tab/></w:r>')
+    for text, italic, url in runs:
+        if url is None:
+            xml.append(_run(text, italic))
+        else:
+            xml.append(
+                '<w:fldSimple w:instr=" HYPERLINK %s ">%s</w:fldSimple>'
+                % (escape('"%s"' % url, {'"': '&quot;'}), _run(text, italic))
             )
-        self._thebibtext = thebibtext
+    xml.append('</w:p>')
+    return ''.join(xml)
+
+
+# Flat OPC package wrapping WordprocessingML body for Range.InsertXML.
+_FLAT_OPC = (
+    '<?xml version="1.0" standalone="yes"?>'
+    '<?mso-application progid="Word.Document"?>'
+    '<pkg:package'
+    ' xmlns:pkg="http://schemas.microsoft.com/office/2006/xmlPackage">'
+    '<pkg:part pkg:name="/_rels/.rels" pkg:contentType='
+    '"application/vnd.openxmlformats-package.relationships+xml">'
+    '<pkg:xmlData>'
+    '<Relationships'
+    ' xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org'
+    '/officeDocument/2006/relationships/officeDocument"'
+    ' Target="word/document.xml"/>'
+    '</Relationships>'
+    '</pkg:xmlData>'
+    '</pkg:part>'
+    '<pkg:part pkg:name="/word/document.xml" pkg:contentType='
+    '"application/vnd.openxmlformats-officedocument'
+    '.wordprocessingml.document.main+xml">'
+    '<pkg:xmlData>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org'
+    '/wordprocessingml/2006/main">'
+    '<w:body>%s</w:body>'
+    '</w:document>'
+    '</pkg:xmlData>'
+    '</pkg:part>'
+    '</pkg:package>'
+)
 
 
 class LaTeX(Cite, Bibliography):
@@ -563,6 +1695,41 @@ class LaTeX(Cite, Bibliography):
         If None, automatically selected accorgin to system locale.
     workdir : str or path object, default '.tmp'
         Temporal working directory to store LaTeX contents.
+    bibitem_cache : BibitemCache or None, default None
+        Cache of converted bibliography entries.
+        If None, an in-memory cache owned by this object is used.
+    workers : int or None, default None
+        Number of processes to convert bibliography entries in parallel.
+        If None, the number of CPUs is used.
+    parallel_threshold : int, default 500
+        Minimum number of entries to be converted to use processes.
+    chunksize : int or None, default None
+        Number of entries sent to a process at once.
+    precompile : bool, default False
+        If True, the preamble is dumped once into a format file
+        by mylatexformat, and LaTeX passes load the format
+        instead of the document class and packages.
+        The format is named by the hash of the preamble and LaTeX command,
+        and dumped again only if they change.
+        If dumping fails, the passes run without the format.
+    draftmode : bool, default False
+        If True, LaTeX passes run without writing output files
+        where the LaTeX command supports it,
+        i.e. -draftmode of pdflatex and lualatex and -no-pdf of xelatex.
+    runner : Runner or None, default None
+        Runner of LaTeX and BibTeX commands with timeouts and
+        resource limits. If None, a Runner without limits is used,
+        which captures output of the commands to files in workdir.
+    bibtex_shards : int or None, default None
+        If given, cited keys are split into this number of shards
+        and BibTeX runs on the shards in parallel processes.
+        Sharding keeps BibTeX within its capacity for tens of thousands
+        of citations. The .bbl files are merged in order of citation,
+        or by sort keys for sorted styles. BibTeX runs once for all keys
+        if the style or database cannot be sharded,
+        e.g. alpha and author-year styles or entries with crossref.
+    shard_threshold : int, default 1000
+        Minimum number of cited keys to shard BibTeX runs.
     """
     def __init__(
             self,
@@ -573,9 +1740,29 @@ class LaTeX(Cite, Bibliography):
             texcmd=None,
             texopts=None,
             workdir='.tmp',
+            bibitem_cache=None,
+            workers=None,
+            parallel_threshold=500,
+            chunksize=None,
+            precompile=False,
+            draftmode=False,
+            runner=None,
+            bibtex_shards=None,
+            shard_threshold=1000,
     ):
 
+        if bibtex_shards is not None and bibtex_shards < 1:
+            raise ValueError('Number of BibTeX shards must be one or more.')
         super(LaTeX, self).__init__()
+        Bibliography.__init__(
+            self,
+            targetbasename=targetbasename,
+            workdir=workdir,
+            bibitem_cache=bibitem_cache,
+            workers=workers,
+            parallel_threshold=parallel_threshold,
+            chunksize=chunksize,
+        )
 
         self.__locale = self.__default_locale()
 
@@ -607,16 +1794,89 @@ class LaTeX(Cite, Bibliography):
         self.__texopts = texopts
         self.__bibtexcmd = bibtexcmd
         self.__bibtexopts = bibtexopts
+        self.__precompile = precompile
+        self.__draftmode = draftmode
+        if runner is None:
+            runner = Runner()
+        self.__runner = runner
+        self.__bibtex_shards = bibtex_shards
+        self.__shard_threshold = shard_threshold
+        self.__build_stats = {}
+        self.__build_summary = []
+        self.__bib = ''
+        self.__citations = []
         self.__packages = None
         self.__bibliographystyle = None
         self.__formatted_bibliographystyle = None
         self.__documentclass = None
-        self.__package_list = []
+        self.__package_list = collections.OrderedDict()
+        self.__preamble = None
         self.preamble = preamble
 
         # Makedir working directory if not exist.
         self.workdir.mkdir(exist_ok=True)
 
+    def reset(self):
+        """Forget citations and bibliography of the current document.
+
+        Call reset between documents to reuse a LaTeX object,
+        e.g. in a long-running process.
+        Preamble, commands and bibitem_cache are kept.
+
+        Examples
+        --------
+        >>> import wdbibtex
+        >>> tx = wdbibtex.LaTeX()
+        >>> tx.citation_labels = {'key1': 1}
+        >>> tx.reset()
+        >>> tx.citation_labels
+        {}
+        """
+        Cite.reset(self)
+        Bibliography.reset(self)
+        self.__build_stats = {}
+        self.__build_summary = []
+        self.__bib = ''
+        self.__citations = []
+
+    def result(self, citations=None):
+        """Returns serializable result of the build.
+
+        All bibliography entries are rendered.
+        Digests of the .bib and .bst files are taken from workdir
+        or from the files found by kpsewhich.
+
+        Parameters
+        ----------
+        citations : iterable of str or Citation or None, default None
+            Citations the result is valid for, e.g. all citations
+            of a document whose keys were built from a part of them.
+            If None, the citations written by write.
+
+        Returns
+        -------
+        BuildResult
+            Citation labels, entries, delimiters, style, preamble,
+            citations and digests of source files.
+        """
+        if citations is None:
+            citations = self.__citations
+        else:
+            citations = list(_context_lines(citations))
+        return BuildResult(
+            self.citation_labels,
+            [(e.key, e.label, e.text) for e in self.entries],
+            citeleft=self.citeleft,
+            citeright=self.citeright,
+            use_cite_package=self._use_cite_package,
+            bibliographystyle=self.bibliographystyle,
+            preamble=self.preamble,
+            citations=citations,
+            sources=_source_hashes(
+                self.workdir, self.__bib, self.bibliographystyle
+            ),
+        )
+
     @property
     def documentclass(self):
         """LaTeX documentclass string."""
@@ -646,6 +1906,7 @@ class LaTeX(Cite, Bibliography):
         if documentclass.startswith('\\'):
             self.__documentclass = documentclass
         else:
+            opts = ''
             if bool(options):
                 opts = '[%s]' % ','.join(options)
             self.__documentclass = \
@@ -785,23 +2046,18 @@ class LaTeX(Cite, Bibliography):
         \usepackage{cite}
         \usepackage[dvipdfmx]{graphicx}
         """
+        if self.__packages is None and self.__package_list:
+            pkgs = []
+            for pkg, opts in self.__package_list.items():
+                if bool(opts):
+                    pkgs.append(
+                        '\\usepackage[%s]{%s}' % (','.join(opts), pkg)
+                    )
+                else:
+                    pkgs.append('\\usepackage{%s}' % pkg)
+            self.__packages = '\n'.join(pkgs)
         return self.__packages
 
-    def __update_packages(self):
-        pkgs = []
-        is_cite_package_found = False
-        for pkg, *opts in self.__package_list:
-            if bool(opts):
-                pkgs.append('\\usepackage[%s]{%s}' % (','.join(opts), pkg))
-            else:
-                pkgs.append('\\usepackage{%s}' % pkg)
-
-            if pkg == 'cite':
-                is_cite_package_found = True
-
-        self.__packages = '\n'.join(pkgs)
-        self._use_cite_package = is_cite_package_found
-
     def add_package(self, package, *options):
         """Add a package to the package list
 
@@ -818,18 +2074,13 @@ class LaTeX(Cite, Bibliography):
         """
 
         # Overwrite duplicated package
-        for i, (p, *o) in enumerate(self.__package_list):
-            if p == package:
-                self.__package_list.pop(i)
-                break
-        self.__package_list.append(
-            [package, *options]
-        )
+        self.__package_list.pop(package, None)
+        self.__package_list[package] = list(options)
+        if package == 'cite':
+            self._use_cite_package = True
 
-        # Update package string.
-        self.__update_packages()
-
-        # Update preamble
+        # Package string and preamble are rendered on next access.
+        self.__packages = None
         self.__update_preamble()
 
     def is_package_used(self, p):
@@ -867,14 +2118,9 @@ class LaTeX(Cite, Bibliography):
         \usepackage{cite}
         \usepackage[dvipdfmx]{graphicx}
         """
-        for package in self.__package_list:
-            if package[0] == p:
-                if len(package) == 1:
-                    return True
-                else:
-                    return package[1:]
-        else:
+        if p not in self.__package_list:
             return False
+        return list(self.__package_list[p]) or True
 
     def write(self, c, bib=None):
         r"""Write .tex file.
@@ -884,34 +2130,47 @@ class LaTeX(Cite, Bibliography):
         pre-defined (at constructor of LaTeX object) preamble,
         \\bibliography, and \\bibliographystyle.
 
+        If citations are given as an iterable,
+        one citation line is written per distinct list of keys
+        in order of first appearance, so that numbering of unsorted
+        styles is kept while repeated citations are not written again.
+        The iterable is consumed one by one while writing.
+
         Parameters
         ----------
-        c : str
-            String data to be written in .tex file.
+        c : str or iterable of str or Citation
+            String data to be written in .tex file as is,
+            or citation commands and records.
         bib : str or None, default None
             Bibliography library file(s). If None, use all .bib files in cwd.
-        """
-        import glob
 
-        if bib is None:
-            # Use only root name (file name without extension).
-            bib = ','.join(
-                [os.path.splitext(b)[0] for b in glob.glob('*.bib')]
-            )
+        Examples
+        --------
+        >>> import wdbibtex
+        >>> tx = wdbibtex.LaTeX()
+        >>> tx.write(['\\cite{a}', '\\citep[p.~1]{a}', '\\cite{b, a}'])
+        >>> tx._citation_keys_in_context
+        ['a', 'b,a']
+        """
+        bib = _bibliography_option(bib)
+        self.__bib = bib
+        self.__citations = []
 
         fn = self.workdir / (self.__targetbasename + '.tex')
         with codecs.open(fn, 'w', 'utf-8') as f:
-            f.writelines(
-                '\n'.join([
-                    self.preamble,
-                    '\\begin{document}',
-                    c,
-                    '\\bibliography{%s}' % bib,
-                    '\\end{document}',
-                    '',
-                ])
-            )
-        self._parse_context(c)
+            f.write(self.preamble + '\n')
+            f.write('\\begin{document}\n')
+            if isinstance(c, str):
+                f.write(c + '\n')
+                self._parse_context(c)
+                self.__citations = list(_context_lines([c]))
+            else:
+                for line in _context_lines(c):
+                    f.write(line + '\n')
+                    self._parse_context(line)
+                    self.__citations.append(line)
+            f.write('\\bibliography{%s}\n' % bib)
+            f.write('\\end{document}\n')
 
     def build(self):
         """Build LaTeX related files.
@@ -923,18 +2182,44 @@ class LaTeX(Cite, Bibliography):
         3. latex: to update .aux.
         4. latex: to complete .aux.
 
-        Firstly the current directory is switched to the working directory.
-        Secondly the above four steps are invoked.
-        Thirdly read .bbl and .aux files are parsed.
-        Finally, the current directory is switched
-        to the original working directory.
+        The commands are invoked in the working directory
+        without changing the current directory of the process,
+        so that builds can run in background threads.
+        With precompile, the preamble format is dumped before step 1
+        if not dumped yet. Timings of the steps are in build_stats.
+
+        The .log or .blg file is checked after each step,
+        and the remaining steps are not run if the step failed.
+        Warnings are issued as wdbibtex.TeXWarning.
+        Output of the commands is captured by runner, and run time,
+        warnings and undefined citations of each step are
+        in build_summary, also after a failed step.
+
+        Raises
+        ------
+        LaTeXError
+            If LaTeX reported errors.
+        BibTeXError
+            If BibTeX reported errors, e.g. .bst file is not found.
+        MissingCitationError
+            If cited keys are not found in the bibliography database.
+        TeXCapacityError
+            If LaTeX or BibTeX exceeded its capacity.
+        TeXTimeoutError
+            If a step did not finish within the timeout of runner.
         """
-        import subprocess
-        cwd = os.getcwd()  # Save original working directory.
-        os.chdir(self.workdir)
+        import time
+
+        stats = {'format': 0.0, 'latex': [], 'bibtex': 0.0}
+        t = time.perf_counter()
+        fmt = self.__dump_format() if self.__precompile else None
+        stats['format'] = time.perf_counter() - t
+
         latexcmd = ' '.join(filter(None, [
             self.__texcmd,
+            '-fmt=%s' % fmt if fmt else None,
             self.__texopts,
+            self.__draft_option() if self.__draftmode else None,
             self.__targetbasename + '.tex'
         ]))
         bibtexcmd = ' '.join(filter(None, [
@@ -944,12 +2229,254 @@ class LaTeX(Cite, Bibliography):
         ]))
 
         # Four steps to complete build LaTeX project.
-        subprocess.call(latexcmd, shell=True)
-        subprocess.call(bibtexcmd, shell=True)
-        subprocess.call(latexcmd, shell=True)
-        subprocess.call(latexcmd, shell=True)
+        self.__build_stats = stats
+        self.__build_summary = []
+        base = self.workdir / self.__targetbasename
+        for cmd, step in (
+            (latexcmd, 'latex'),
+            (bibtexcmd, 'bibtex'),
+            (latexcmd, 'latex'),
+            (latexcmd, 'latex'),
+        ):
+            if step == 'latex':
+                step = 'latex pass %d' % (len(stats['latex']) + 1)
+            # The step is in the summary even if it fails or times out.
+            summary = {
+                'step': step,
+                'seconds': 0.0,
+                'returncode': None,
+                'warnings': [],
+                'missing': [],
+                'output': None,
+            }
+            self.__build_summary.append(summary)
+            t = time.perf_counter()
+            sharded = None
+            whole = False
+            try:
+                if step == 'bibtex' and self.__bibtex_shards:
+                    sharded = self.__run_bibtex_shards(base)
+                if sharded is None:
+                    whole = True
+                    returncode = self.__runner.run(
+                        cmd, cwd=self.workdir, step=step
+                    )
+                else:
+                    returncode, shard_warnings = sharded
+            except texlog.MissingCitationError as e:
+                summary['missing'] = list(e.keys)
+                raise
+            finally:
+                seconds = time.perf_counter() - t
+                summary['seconds'] = seconds
+                if whole:
+                    summary['output'] = self.__runner.output_file(step)
+            summary['returncode'] = returncode
+            try:
+                if step != 'bibtex':
+                    stats['latex'].append(seconds)
+                    report = texlog.check_latex_log(
+                        base.with_suffix('.log'),
+                        step=step,
+                        returncode=returncode,
+                        final=len(stats['latex']) == 3,
+                    )
+                elif sharded is None:
+                    stats['bibtex'] = seconds
+                    report = texlog.check_blg(
+                        base.with_suffix('.blg'), returncode=returncode
+                    )
+                else:
+                    stats['bibtex'] = seconds
+                    report = texlog.LogReport([], shard_warnings, [], False)
+            except texlog.MissingCitationError as e:
+                summary['missing'] = list(e.keys)
+                raise
+            summary['warnings'] = list(report.warnings)
+
+    @property
+    def build_stats(self):
+        """[Read only] Returns timings of the last build in seconds.
+
+        Returns
+        -------
+        dict
+            Timings with the following keys.
+
+            - format: checking and dumping the preamble format.
+            - latex: list of timings of the three LaTeX passes.
+            - bibtex: BibTeX run.
+        """
+        return dict(self.__build_stats)
+
+    @property
+    def build_summary(self):
+        """[Read only] Returns summary of the steps of the last build.
+
+        Returns
+        -------
+        list of dict
+            One dict per run step in order with the following keys.
+
+            - step: name of the step, e.g. 'latex pass 1'.
+            - seconds: run time of the command.
+            - returncode: exit status of the command,
+              or None if the step did not finish, e.g. timed out.
+            - warnings: warnings in .log or .blg file.
+            - missing: undefined citation keys if the step failed by them.
+            - output: file of captured output, or None.
+
+        See also
+        --------
+        wdbibtex.texlog.format_summary : Format summary as text.
+        """
+        return [dict(r) for r in self.__build_summary]
+
+    @property
+    def format_name(self):
+        """[Read only] Returns name of the preamble format.
+
+        The name consists of the target base name and the hash of
+        LaTeX command and preamble, e.g. wdbib-0123456789ab.
+        """
+        h = hashlib.sha1(
+            (self.__texcmd + '\n' + self.preamble).encode('utf-8')
+        ).hexdigest()
+        return '%s-%s' % (self.__targetbasename, h[:12])
+
+    def __dump_format(self):
+        """Dump the preamble into a format file unless already dumped.
+
+        Returns
+        -------
+        str or None
+            Format name, or None if dumping failed.
+        """
+        name = self.format_name
+        if (self.workdir / (name + '.fmt')).exists():
+            return name
+        for old in self.workdir.glob(self.__targetbasename + '-*.fmt'):
+            old.unlink()
+
+        # mylatexformat dumps the preamble of .tex file up to
+        # \begin{document}, which is skipped when the format is loaded.
+        cmd = ' '.join([
+            self.__texcmd,
+            '-ini',
+            '-interaction=nonstopmode',
+            '-jobname=%s' % name,
+            # The format is named after the engine, not the command path.
+            '"&%s"' % self.__engine(),
+            'mylatexformat.ltx',
+            self.__targetbasename + '.tex',
+        ])
+        self.__runner.run(cmd, cwd=self.workdir, step='format')
+        if (self.workdir / (name + '.fmt')).exists():
+            return name
+        return None
+
+    def __run_bibtex_shards(self, base):
+        """Run BibTeX on shards of cited keys and merge .bbl files.
+
+        Shards are named like wdbib-shard0 in workdir.
+        The .blg file of each shard is checked as the bibtex step.
+
+        Parameters
+        ----------
+        base : path object
+            Base path of .aux and .bbl files.
+
+        Returns
+        -------
+        tuple or None
+            Highest exit status and warnings of the shards,
+            or None if the citations cannot be sharded.
+        """
+        keys, bibstyle, bibdata = bibshard.read_aux(base.with_suffix('.aux'))
+        if (
+            keys is None
+            or not bibstyle
+            or not bibdata
+            or len(keys) < max(self.__shard_threshold, 2)
+        ):
+            return None
+        bst = bibshard.find_file(self.workdir, bibstyle + '.bst')
+        bibs = [
+            bibshard.find_file(self.workdir, b + '.bib')
+            for b in bibdata.split(',')
+        ]
+        if bst is None or None in bibs:
+            return None
+        with codecs.open(bst, 'r', 'utf-8', errors='replace') as f:
+            bst = f.read()
+        texts = []
+        for b in bibs:
+            with codecs.open(b, 'r', 'utf-8', errors='replace') as f:
+                texts.append(f.read())
+        how = bibshard.plan(bst, texts)
+        if how is None:
+            return None
+        if how == 'sorted':
+            name = self.__targetbasename + '-shardsort'
+            with codecs.open(
+                self.workdir / (name + '.bst'), 'w', 'utf-8'
+            ) as f:
+                f.write(bibshard.sort_key_bst(bst))
+            bibstyle = name
+
+        shards = bibshard.split(keys, self.__bibtex_shards)
+        names = [
+            '%s-shard%d' % (self.__targetbasename, i)
+            for i in range(len(shards))
+        ]
+        for name, shard in zip(names, shards):
+            bibshard.write_aux(
+                self.workdir / (name + '.aux'), shard, bibstyle, bibdata
+            )
+
+        def run(i):
+            step = 'bibtex shard %d' % i
+            cmd = ' '.join(filter(None, [
+                self.__bibtexcmd, self.__bibtexopts, names[i]
+            ]))
+            return self.__runner.run(cmd, cwd=self.workdir, step=step)
+
+        with concurrent.futures.ThreadPoolExecutor(len(shards)) as ex:
+            returncodes = list(ex.map(run, range(len(shards))))
+        shard_warnings = []
+        bbls = []
+        for i, name in enumerate(names):
+            report = texlog.check_blg(
+                self.workdir / (name + '.blg'),
+                step='bibtex shard %d' % i,
+                returncode=returncodes[i],
+            )
+            shard_warnings.extend(report.warnings)
+            with codecs.open(
+                self.workdir / (name + '.bbl'), 'r', 'utf-8'
+            ) as f:
+                bbls.append(f.read())
+        merged = bibshard.merge_bbl(bbls, sorted_style=how == 'sorted')
+        if merged is None:
+            return None
+        with codecs.open(base.with_suffix('.bbl'), 'w', 'utf-8') as f:
+            f.write(merged)
+        return max(returncodes), shard_warnings
+
+    def __engine(self):
+        """Returns name of the LaTeX command without directory and extension.
+        """
+        return os.path.splitext(os.path.basename(self.__texcmd))[0]
 
-        os.chdir(cwd)  # Back to original working directory.
+    def __draft_option(self):
+        """Returns option to suppress output of LaTeX command, or None.
+        """
+        engine = self.__engine()
+        if engine in ('pdflatex', 'lualatex'):
+            return '-draftmode'
+        elif engine == 'xelatex':
+            return '-no-pdf'
+        return None
 
     @property
     def preamble(self):
@@ -977,7 +2504,15 @@ class LaTeX(Cite, Bibliography):
         str
             Preamble text.
         """
-
+        if self.__preamble is None:
+            contents = [
+                self.documentclass,
+                self.packages,
+                self.formatted_bibliographystyle,
+            ]
+            self.__preamble = '\n'.join(
+                [c for c in contents if c is not None]
+            )
         return self.__preamble
 
     @preamble.setter
@@ -996,57 +2531,21 @@ class LaTeX(Cite, Bibliography):
             )
 
     def __update_preamble(self):
-
-        contents = [
-            self.documentclass,
-            self.packages,
-            self.formatted_bibliographystyle,
-        ]
-        self.__preamble = '\n'.join(
-            [c for c in contents if c is not None]
-        )
+        # The preamble is rendered on next access.
+        self.__preamble = None
 
     def __parse_preamble(self, preamble):
-        detect_documentclass = False
-        for ln in preamble.split('\n'):
-            if ln.startswith('%') and not detect_documentclass:
-                pass
-
-            elif re.match(r'.*documentclass.*', ln):
-                detect_documentclass = True
-                m = re.match(r'.*documentclass(\[(.*)\])*\{(.*)\}', ln)
-                documentclass_opt = []
-                if m.group(1) is not None:
-                    documentclass_opt = m.group(2).replace(' ', '').split(',')
-                documentclsass = m.group(3)
-
-                self.set_documentclass(documentclsass, *documentclass_opt)
-
-            elif re.match(r'.*usepackage.*', ln):
-                m = re.match(r'.*usepackage(\[(.*)\])*\{(.*)\}', ln)
-                package_opt = []
-                if m.group(1) is not None:
-                    package_opt = m.group(2).replace(' ', '').split(',')
-                package = m.group(3)
-
-                self.add_package(package, *package_opt)
-
-            elif re.match(r'.*bibliographystyle.*', ln):
-                m = re.match(r'.*bibliographystyle\{(.*)\}', ln)
-                bibliographystyle = m.group(1)
-
-                self.set_bibliographystyle(bibliographystyle)
-
-            elif re.match(r'.*renewcommand\\citeleft.*', ln):
-                m = re.match(r'.*renewcommand\\citeleft\{(.*)\}', ln)
-                self.citeleft = m.group(1)
-
-            elif re.match(r'.*renewcommand\\citeright.*', ln):
-                m = re.match(r'.*renewcommand\\citeright\{(.*)\}', ln)
-                self.citeright = m.group(1)
-
-            else:
-                pass
+        for command, arg, options in _parse_preamble(preamble):
+            if command == 'documentclass':
+                self.set_documentclass(arg, *options)
+            elif command == 'usepackage':
+                self.add_package(arg, *options)
+            elif command == 'bibliographystyle':
+                self.set_bibliographystyle(arg)
+            elif command == 'citeleft':
+                self.citeleft = arg
+            elif command == 'citeright':
+                self.citeright = arg
 
     @property
     def locale(self):
@@ -1087,3 +2586,74 @@ class LaTeX(Cite, Bibliography):
             return 'ja'
         else:
             raise ValueError('Unhandled locale %s' % locale.getlocale())
+
+
+# Brace group with up to three levels of nested braces.
+_BRACED = r'\{(?:[^{}]|\{(?:[^{}]|\{[^{}]*\})*\})*\}'
+
+# Lexer of preamble commands used by WdBibTeX.
+# Commands may span lines. Comments and definitions of other commands
+# are consumed as a whole, so that commands in them are not used.
+_PREAMBLE_LEXER = re.compile(
+    r"""
+    (?P<comment>(?<!\\)%%[^\n]*)
+    | \\(?P<command>documentclass|usepackage)\s*
+        (?:\[(?P<options>[^\]]*)\]\s*)?
+        \{(?P<arg>[^{}]*)\}
+    | \\bibliographystyle\s*\{(?P<bst>[^{}]*)\}
+    | \\(?:re)?newcommand\*?\s*
+        (?:\\(?P<name>[A-Za-z@]+)|\{\s*\\(?P<bracedname>[A-Za-z@]+)\s*\})\s*
+        (?:\[[^\]]*\]\s*){0,2}
+        (?P<body>%s)
+    """ % _BRACED,
+    re.VERBOSE,
+)
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_preamble(preamble):
+    r"""Parse preamble into commands used by WdBibTeX in one pass.
+
+    The results are cached by the preamble text,
+    because batch runs parse the same preamble for every document.
+
+    Parameters
+    ----------
+    preamble : str
+        Preamble text.
+
+    Returns
+    -------
+    tuple of tuple
+        Commands of (command, argument, options) in order of appearance.
+        command is one of documentclass, usepackage, bibliographystyle,
+        citeleft and citeright.
+
+    Examples
+    --------
+    >>> from wdbibtex.latex import _parse_preamble
+    >>> _parse_preamble(
+    ...     '\\documentclass[a4paper, 10pt]{article}\n'
+    ...     '% \\usepackage{unused}\n'
+    ...     '\\usepackage[\n  super,\n]{cite}\n'
+    ...     '\\renewcommand{\\citeleft}{\\textsuperscript{[}}\n'
+    ... )
+    (('documentclass', 'article', ('a4paper', '10pt')), ('usepackage', 'cite', ('super',)), ('citeleft', '\\textsuperscript{[}', ()))
+    """  # noqa E501
+    commands = []
+    for m in _PREAMBLE_LEXER.finditer(preamble):
+        if m.group('command'):
+            options = ()
+            if m.group('options') is not None:
+                options = re.sub(r'\s+', '', m.group('options'))
+                options = tuple(o for o in options.split(',') if o)
+            for arg in re.sub(r'\s+', '', m.group('arg')).split(','):
+                if arg:
+                    commands.append((m.group('command'), arg, options))
+        elif m.group('bst') is not None:
+            commands.append(('bibliographystyle', m.group('bst').strip(), ()))
+        elif m.group('body') is not None:
+            name = m.group('name') or m.group('bracedname')
+            if name in ('citeleft', 'citeright'):
+                commands.append((name, m.group('body')[1:-1], ()))
+    return tuple(commands)
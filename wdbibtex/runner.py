@@ -0,0 +1,262 @@
+import codecs
+import collections
+import os
+import pathlib
+import signal
+import subprocess
+import sys
+
+from .texlog import TeXTimeoutError
+
+
+class Runner:
+    """Bounded runner of LaTeX and BibTeX commands.
+
+    Each command runs in its own process group with stdin closed,
+    so that it can never wait for terminal input.
+    If a command runs longer than the timeout, the whole process group
+    is killed and TeXTimeoutError naming the step is raised.
+    Output of commands (stdout and stderr) is captured to a file
+    of each step in the working directory, e.g. latex-pass-1.out,
+    kept in memory as the last lines, or written to the console.
+
+    Resource limits are POSIX only. They are set by ulimit of the shell
+    running the command, not in the forked child before exec,
+    which is unsafe in a process with threads.
+    A command whose limits cannot be set exits with status 126.
+
+    Parameters
+    ----------
+    timeout : float or None, default None
+        Wall-clock timeout of each step in seconds.
+        If None, steps are not timed out.
+    cpu_time : int or None, default None
+        CPU time limit of each step in seconds. POSIX only.
+    memory : int or None, default None
+        Address space limit of each step in bytes. POSIX only.
+    output : {'file', 'memory', 'console'}, default 'file'
+        Where output of commands goes.
+    lines : int, default 200
+        Number of last output lines kept of each step
+        if output is 'memory'.
+
+    Examples
+    --------
+    >>> import wdbibtex
+    >>> runner = wdbibtex.Runner(timeout=60, memory=2 << 30)
+    >>> tx = wdbibtex.LaTeX(runner=runner)  # doctest: +SKIP
+    """
+
+    def __init__(
+            self,
+            timeout=None,
+            cpu_time=None,
+            memory=None,
+            output='file',
+            lines=200,
+    ):
+        """Constructor of Runner.
+        """
+        if (cpu_time or memory) and sys.platform == 'win32':
+            raise ValueError('Resource limits are not supported on Windows.')
+        if output not in ('file', 'memory', 'console'):
+            raise ValueError('Unknown output: %s' % output)
+        self.__timeout = timeout
+        self.__cpu_time = cpu_time
+        self.__memory = memory
+        self.__output = output
+        self.__lines = lines
+        self.__outputs = {}
+
+    @property
+    def timeout(self):
+        """[Read only] Returns wall-clock timeout of each step in seconds.
+        """
+        return self.__timeout
+
+    @property
+    def cpu_time(self):
+        """[Read only] Returns CPU time limit of each step in seconds.
+        """
+        return self.__cpu_time
+
+    @property
+    def memory(self):
+        """[Read only] Returns address space limit of each step in bytes.
+        """
+        return self.__memory
+
+    @property
+    def output(self):
+        """[Read only] Returns where output of commands goes.
+        """
+        return self.__output
+
+    def copy(self):
+        """Returns a runner of the same limits and output.
+
+        Outputs captured by this runner are not copied.
+        Use one runner per thread when steps of the same name
+        run in parallel, e.g. builds of several bibliography styles.
+
+        Returns
+        -------
+        Runner
+            New runner.
+        """
+        return Runner(
+            timeout=self.__timeout,
+            cpu_time=self.__cpu_time,
+            memory=self.__memory,
+            output=self.__output,
+            lines=self.__lines,
+        )
+
+    def output_of(self, step):
+        """Returns captured output of the last run of a step.
+
+        Parameters
+        ----------
+        step : str or None
+            Name of the step given to run().
+
+        Returns
+        -------
+        str or None
+            Captured output, or None if output is not captured.
+        """
+        captured = self.__outputs.get(step)
+        if isinstance(captured, pathlib.Path):
+            if not captured.exists():
+                return None
+            with codecs.open(captured, 'r', 'utf-8', errors='replace') as f:
+                return f.read()
+        if captured is not None:
+            return ''.join(captured)
+        return None
+
+    def output_file(self, step):
+        """Returns output file of the last run of a step.
+
+        Parameters
+        ----------
+        step : str or None
+            Name of the step given to run().
+
+        Returns
+        -------
+        path object or None
+            Output file, or None if output is not captured to a file.
+        """
+        captured = self.__outputs.get(step)
+        if isinstance(captured, pathlib.Path):
+            return captured
+        return None
+
+    def run(self, cmd, cwd=None, step=None):
+        """Run a shell command and wait for it within the timeout.
+
+        Parameters
+        ----------
+        cmd : str
+            Shell command line.
+        cwd : str, path object or None, default None
+            Working directory of the command.
+        step : str or None, default None
+            Name of the step for messages, e.g. 'latex pass 1'.
+
+        Returns
+        -------
+        int
+            Exit status of the command.
+
+        Raises
+        ------
+        TeXTimeoutError
+            If the command does not finish within the timeout.
+        """
+        kwargs = {}
+        script = cmd
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+            script = ''.join(
+                '%s || exit 126\n' % u for u in self.__ulimits()
+            ) + cmd
+
+        out = None
+        if self.__output == 'file':
+            name = (step or 'command').replace(' ', '-') + '.out'
+            path = pathlib.Path(cwd or '.') / name
+            out = open(path, 'wb')
+            kwargs['stdout'] = out
+            kwargs['stderr'] = subprocess.STDOUT
+            self.__outputs[step] = path
+        elif self.__output == 'memory':
+            kwargs['stdout'] = subprocess.PIPE
+            kwargs['stderr'] = subprocess.STDOUT
+            self.__outputs[step] = collections.deque(maxlen=self.__lines)
+
+        try:
+            proc = subprocess.Popen(
+                script,
+                shell=True,
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                **kwargs
+            )
+        except BaseException:
+            if out is not None:
+                out.close()
+            raise
+        try:
+            if self.__output == 'memory':
+                stdout, _ = proc.communicate(timeout=self.__timeout)
+                self.__outputs[step].extend(
+                    stdout.decode('utf-8', 'replace').splitlines(True)
+                )
+                return proc.returncode
+            return proc.wait(timeout=self.__timeout)
+        except subprocess.TimeoutExpired:
+            self.__kill(proc)
+            raise TeXTimeoutError(
+                'timed out after %g seconds: %s' % (self.__timeout, cmd),
+                step=step,
+            )
+        except BaseException:
+            self.__kill(proc)
+            raise
+        finally:
+            if out is not None:
+                out.close()
+            if proc.stdout is not None:
+                proc.stdout.close()
+
+    def __ulimits(self):
+        """Returns shell commands setting resource limits.
+        """
+        ulimits = []
+        if self.__cpu_time:
+            ulimits.append('ulimit -t %d' % self.__cpu_time)
+        if self.__memory:
+            # ulimit -v takes kibibytes.
+            ulimits.append('ulimit -v %d' % (self.__memory // 1024))
+        return ulimits
+
+    def __kill(self, proc):
+        """Kill the process group of the command and reap it.
+        """
+        if proc.poll() is None:
+            if sys.platform == 'win32':
+                subprocess.call(
+                    ['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+            else:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        proc.wait()
@@ -0,0 +1,491 @@
+import argparse
+import collections
+import contextlib
+import json
+import os
+import queue
+import shutil
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+import wdbibtex
+
+# Events which end the response to one request.
+_FINAL_EVENTS = ('done', 'error', 'metrics', 'pong')
+
+# Number of recent jobs used for latency metrics.
+_LATENCY_WINDOW = 1000
+
+# Options of requests given to LaTeX objects.
+_LATEX_OPTIONS = (
+    'precompile', 'draftmode', 'timeout', 'verbose', 'bibtex_shards'
+)
+
+
+class Server:
+    """Local build service with a warm pool of workers.
+
+    Server accepts requests as JSON lines on a Unix socket or
+    a localhost TCP port, and answers each request with JSON lines of
+    events. Build jobs are queued and run by worker threads,
+    each of which keeps its own warm Word application,
+    so that clients skip interpreter start, imports and Word start.
+    Jobs on the same file run one at a time, since they write
+    the same target file.
+
+    The following requests are accepted.
+
+    - {"op": "build", "file": ..., "bib": ..., "bst": ..., ...}
+       Build a document. Other keys are options of
+       python -m wdbibtex in snake case, e.g. "rich_bibliography": true.
+       Answered by queued, started, phase events and done or error.
+    - {"op": "metrics"}
+       Answered by a metrics event of queue depth and latencies.
+    - {"op": "ping"}
+       Answered by a pong event.
+
+    An "id" of the request is copied to its events.
+
+    Parameters
+    ----------
+    address : str or tuple
+        Path of Unix socket, or (host, port) of TCP socket.
+        Port 0 binds a free port, see server_address.
+    workers : int, default 1
+        Number of worker threads.
+    build : callable or None, default None
+        Function of (request, progress, state) which builds a document.
+        progress(phase, seconds) reports a finished phase, and
+        state is a dict kept by the worker between jobs.
+        The return value is sent as build_stats of the done event.
+        If None, documents are built by WdBibTeX.
+
+    Examples
+    --------
+    >>> from wdbibtex.server import Server, submit
+    >>> with Server(('127.0.0.1', 0), workers=2) as server:  # doctest: +SKIP
+    ...     server.serve_forever()
+
+    In a client,
+
+    >>> for event in submit(address, {'op': 'build', 'file': 'a.docx'}):
+    ...     print(event)  # doctest: +SKIP
+    """
+
+    def __init__(self, address, workers=1, build=None):
+        """Constructor of Server.
+        """
+        if workers < 1:
+            raise ValueError('Number of workers must be one or more.')
+        self.__build = build or _build_document
+        self.__jobs = queue.Queue()
+        self.__lock = threading.Lock()
+        # Target file to [lock, number of jobs using it].
+        self.__targets = {}
+        self.__running = 0
+        self.__completed = 0
+        self.__failed = 0
+        self.__latency = collections.deque(maxlen=_LATENCY_WINDOW)
+        self.__wait = collections.deque(maxlen=_LATENCY_WINDOW)
+
+        handler = self.__handler()
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.unlink(address)
+            self.__server = socketserver.ThreadingUnixStreamServer(
+                address, handler
+            )
+        else:
+            self.__server = socketserver.ThreadingTCPServer(address, handler)
+        self.__server.daemon_threads = True
+        self.__serving = threading.Event()
+
+        self.__workers = [
+            threading.Thread(target=self.__work, daemon=True)
+            for _ in range(workers)
+        ]
+        for w in self.__workers:
+            w.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    @property
+    def server_address(self):
+        """[Read only] Returns bound address.
+
+        Returns
+        -------
+        str or tuple
+            Path of Unix socket, or (host, port) of TCP socket.
+        """
+        return self.__server.server_address
+
+    @property
+    def workers(self):
+        """[Read only] Returns number of worker threads.
+        """
+        return len(self.__workers)
+
+    def metrics(self):
+        """Returns queue depth and latency metrics.
+
+        Latencies are in seconds over the recent 1000 jobs.
+        latency is from queueing to finishing a job,
+        and wait is from queueing to starting it.
+
+        Returns
+        -------
+        dict
+            Metrics with keys queue_depth, running, workers, completed,
+            failed, latency and wait. latency and wait are dicts of
+            count, mean, p50, p95 and max.
+        """
+        with self.__lock:
+            return {
+                'queue_depth': self.__jobs.qsize(),
+                'running': self.__running,
+                'workers': len(self.__workers),
+                'completed': self.__completed,
+                'failed': self.__failed,
+                'latency': _summary(self.__latency),
+                'wait': _summary(self.__wait),
+            }
+
+    def serve_forever(self):
+        """Serve requests until shutdown() is called.
+        """
+        self.__serving.set()
+        self.__server.serve_forever()
+
+    def shutdown(self):
+        """Stop serving, finish queued jobs and stop workers.
+
+        Must not be called from the thread running serve_forever().
+        """
+        if self.__server is None:
+            return
+        server, self.__server = self.__server, None
+        if self.__serving.is_set():
+            server.shutdown()
+        server.server_close()
+        if isinstance(server.server_address, str):
+            try:
+                os.unlink(server.server_address)
+            except FileNotFoundError:
+                pass
+        for _ in self.__workers:
+            self.__jobs.put(None)
+        for w in self.__workers:
+            w.join()
+
+    def submit(self, request):
+        """Queue a build job.
+
+        Parameters
+        ----------
+        request : dict
+            Build request.
+
+        Returns
+        -------
+        queue.Queue
+            Events of the job. The last event is done or error.
+        """
+        events = queue.Queue()
+        events.put({'event': 'queued', 'queue_depth': self.__jobs.qsize() + 1})
+        self.__jobs.put((request, events, time.perf_counter()))
+        return events
+
+    def __work(self):
+        """Run queued jobs in a worker thread.
+        """
+        state = {}
+        try:
+            while True:
+                job = self.__jobs.get()
+                if job is None:
+                    break
+                request, events, t_queued = job
+                t_start = time.perf_counter()
+                with self.__lock:
+                    self.__running += 1
+                    self.__wait.append(t_start - t_queued)
+                events.put({'event': 'started', 'wait': t_start - t_queued})
+
+                def progress(phase, seconds):
+                    events.put(
+                        {'event': 'phase', 'phase': phase, 'seconds': seconds}
+                    )
+
+                try:
+                    with self.__target(request):
+                        stats = self.__build(request, progress, state)
+                except Exception as e:
+                    final = {
+                        'event': 'error',
+                        'type': type(e).__name__,
+                        'message': str(e),
+                    }
+                else:
+                    final = {'event': 'done', 'build_stats': stats}
+                t_end = time.perf_counter()
+                with self.__lock:
+                    self.__running -= 1
+                    self.__latency.append(t_end - t_queued)
+                    if final['event'] == 'error':
+                        self.__failed += 1
+                    else:
+                        self.__completed += 1
+                final['seconds'] = t_end - t_start
+                events.put(final)
+        finally:
+            if state.get('pool') is not None:
+                state['pool'].shutdown()
+            if state.get('com'):
+                import pythoncom
+                pythoncom.CoUninitialize()
+
+    @contextlib.contextmanager
+    def __target(self, request):
+        """Run jobs on the same file one at a time.
+
+        Jobs on a file write the same target file,
+        so that a job waits until the previous one finishes.
+        """
+        key = os.path.realpath(str(request.get('file', '')))
+        with self.__lock:
+            entry = self.__targets.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self.__lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.__targets[key]
+
+    def __handler(self):
+        """Returns request handler class bound to this server.
+        """
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        request = json.loads(line)
+                        if not isinstance(request, dict):
+                            raise ValueError('Request must be an object.')
+                    except ValueError as e:
+                        self.send({}, {
+                            'event': 'error',
+                            'type': 'ValueError',
+                            'message': str(e),
+                        })
+                        continue
+                    op = request.get('op', 'build')
+                    if op == 'ping':
+                        self.send(request, {'event': 'pong'})
+                    elif op == 'metrics':
+                        self.send(request, dict(
+                            server.metrics(), event='metrics'
+                        ))
+                    elif op == 'build':
+                        events = server.submit(request)
+                        while True:
+                            event = events.get()
+                            self.send(request, event)
+                            if event['event'] in _FINAL_EVENTS:
+                                break
+                    else:
+                        self.send(request, {
+                            'event': 'error',
+                            'type': 'ValueError',
+                            'message': 'Unknown op: %s' % op,
+                        })
+
+            def send(self, request, event):
+                if 'id' in request:
+                    event = dict(event, id=request['id'])
+                self.wfile.write(
+                    json.dumps(event, separators=(',', ':')).encode('utf-8')
+                    + b'\n'
+                )
+                self.wfile.flush()
+
+        return Handler
+
+
+def submit(address, request):
+    """Send a request to a server and yield its events.
+
+    Parameters
+    ----------
+    address : str or tuple
+        Path of Unix socket, or (host, port) of TCP socket.
+    request : dict
+        Request to send.
+
+    Yields
+    ------
+    dict
+        Events of the request until done, error, metrics or pong.
+    """
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    with sock:
+        sock.connect(address)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            for line in f:
+                event = json.loads(line)
+                yield event
+                if event['event'] in _FINAL_EVENTS:
+                    return
+
+
+def _summary(values):
+    """Returns count, mean, p50, p95 and max of values."""
+    values = sorted(values)
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None,
+                'max': None}
+    n = len(values)
+    return {
+        'count': n,
+        'mean': sum(values) / n,
+        'p50': values[(n - 1) // 2],
+        'p95': values[min(n - 1, int(n * 0.95))],
+        'max': values[-1],
+    }
+
+
+def _build_document(request, progress, state):
+    """Build a document by WdBibTeX as python -m wdbibtex does.
+
+    The worker keeps one warm Word application in state['pool'],
+    and a LaTeX object in state['latex'] which is reset for each job.
+    All LaTeX objects of the worker share state['bibitem_cache'],
+    so that bibliography entries converted for a job are not
+    converted again for the next one.
+    Each job has its own working directory next to the document,
+    so that jobs on documents in the same directory do not share
+    LaTeX files.
+    """
+    if state.get('pool') is None:
+        if sys.platform == 'win32':
+            # Word applications are COM objects bound to this thread.
+            import pythoncom
+            pythoncom.CoInitialize()
+            state['com'] = True
+        state['pool'] = wdbibtex.WordPool(size=1)
+        state['bibitem_cache'] = wdbibtex.BibitemCache()
+
+    workdir = tempfile.mkdtemp(
+        prefix='.tmp-',
+        dir=os.path.dirname(os.path.abspath(request['file'])),
+    )
+    try:
+        # The LaTeX object is made again only if its options change.
+        options = tuple(request.get(k) for k in _LATEX_OPTIONS)
+        if state.get('latex_options') != options:
+            state['latex'] = wdbibtex.LaTeX(
+                workdir=workdir,
+                bibitem_cache=state['bibitem_cache'],
+                precompile=request.get('precompile', False),
+                draftmode=request.get('draftmode', False),
+                runner=wdbibtex.word._runner(request),
+                bibtex_shards=request.get('bibtex_shards'),
+            )
+            state['latex_options'] = options
+        wb = wdbibtex.WdBibTeX(
+            request['file'],
+            workdir=workdir,
+            performance_mode=request.get('performance_mode', False),
+            pool=state['pool'],
+            track=(
+                request.get('track', False)
+                or request.get('incremental', False)
+            ),
+        )
+        wdbibtex.word._run_build(
+            wb, request, progress, latex=state['latex']
+        )
+    finally:
+        if not request.get('keeptexdir', False):
+            shutil.rmtree(workdir, ignore_errors=True)
+    return wb.build_stats
+
+
+def getparser():
+    parser = argparse.ArgumentParser(
+        prog='python -m wdbibtex serve',
+        description="Serve WdBibTeX builds on a local socket."
+    )
+    parser.add_argument(
+        '--socket',
+        type=str,
+        default=None,
+        help=(
+            'Path of Unix socket to listen on. '
+            'Default: None(= listen on TCP --host and --port)'
+        )
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='127.0.0.1',
+        help=(
+            'Host to listen on. '
+            'Default: 127.0.0.1'
+        )
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=0,
+        help=(
+            'TCP port to listen on. '
+            'Default: 0(= any free port)'
+        )
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help=(
+            'Number of documents built at the same time. '
+            'Default: 1'
+        )
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = getparser()
+    args = parser.parse_args(argv)
+    address = args.socket or (args.host, args.port)
+    with Server(address, workers=args.workers) as server:
+        address = server.server_address
+        if not isinstance(address, str):
+            address = '%s:%d' % address[:2]
+        print('wdbibtex serving on %s' % address, flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
@@ -0,0 +1,153 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+from wdbibtex import bibshard  # noqa E402
+
+
+class TestMerge:
+
+    def test_order_of_citation(self):
+        merged = bibshard.merge_bbl([
+            self.bbl(['a', 'b']), self.bbl(['c'])
+        ])
+        assert merged == self.bbl(['a', 'b', 'c'])
+
+    def test_sorted(self):
+        merged = bibshard.merge_bbl([
+            self.bbl(['b', 'd'], sort_keys=['beta', 'delta']),
+            self.bbl(['a', 'c'], sort_keys=['alpha', 'charlie' * 20]),
+        ], sorted_style=True)
+        # Shards are sorted by themselves and merged by the sort keys.
+        assert merged == self.bbl(['a', 'b', 'c', 'd'])
+
+    def test_labelled_entries_are_not_merged(self):
+        assert bibshard.merge_bbl([
+            self.bbl(['a']).replace('\\bibitem{a}', '\\bibitem[Knu84]{a}'),
+            self.bbl(['b']),
+        ]) is None
+
+    def test_sort_key_bst(self):
+        bst = 'FUNCTION {presort} { }\nSORT\nITERATE {call.type$}\n'
+        patched = bibshard.sort_key_bst(bst)
+        assert 'ITERATE {call.type$}' not in patched
+        assert patched.endswith('ITERATE {wdbibtex.output.entry}\n')
+        assert patched.index('FUNCTION {wdbibtex.write.sort.key}') > \
+            patched.index('SORT')
+
+    def test_sort_key_bst_skips_comments(self):
+        bst = (
+            'SORT\nITERATE {call.type$}\n'
+            '% ITERATE {call.type$} is the output loop.\n'
+        )
+        patched = bibshard.sort_key_bst(bst)
+        assert patched.startswith('SORT\nFUNCTION {wdbibtex.write.sort.key}')
+        assert patched.endswith(
+            '% ITERATE {call.type$} is the output loop.\n'
+        )
+
+    def bbl(self, keys, sort_keys=None):
+        """.bbl text as written by BibTeX, optionally with sort keys."""
+        text = '\\begin{thebibliography}{%d}\n' % len(keys)
+        for i, k in enumerate(keys):
+            if sort_keys is not None:
+                key = sort_keys[i]
+                for j in range(0, len(key), 60):
+                    text += '%wdbibtex-sort ' + key[j:j + 60] + '|\n'
+            text += '\n\\bibitem{%s}\nEntry %s.\n' % (k, k)
+        return text + '\n\\end{thebibliography}\n'
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses shell scripts')
+class TestShardedBuild:
+
+    def test_shards_run_in_parallel_and_merge(self, workdir):
+        tx = self.latex(workdir)
+        tx.build()
+        runs = sorted((workdir / 'runs.log').read_text().split())
+        assert runs == ['wdbib-shard0', 'wdbib-shard1']
+        tx.read_aux()
+        tx.read_bbl()
+        assert [e.key for e in tx.entries] == ['k1', 'k2', 'k3', 'k4', 'k5']
+        assert tx.citation_labels == {
+            'k1': 1, 'k2': 2, 'k3': 3, 'k4': 4, 'k5': 5
+        }
+        assert [r['step'] for r in tx.build_summary][1] == 'bibtex'
+
+    def test_failed_shard_is_in_summary(self, workdir):
+        bibtex = workdir / 'fakebibtex'
+        bibtex.write_text(bibtex.read_text().replace(
+            '#!/bin/sh\n', '#!/bin/sh\n[ "$1" = wdbib-shard1 ] && exit 3\n'
+        ))
+        tx = self.latex(workdir)
+        with pytest.raises(wdbibtex.BibTeXError):
+            tx.build()
+        assert [(r['step'], r['returncode']) for r in tx.build_summary] == [
+            ('latex pass 1', 0), ('bibtex', None)
+        ]
+
+    @pytest.mark.parametrize('shards', [0, -1])
+    def test_invalid_shards(self, tmp_path, shards):
+        with pytest.raises(ValueError):
+            wdbibtex.LaTeX(workdir=str(tmp_path), bibtex_shards=shards)
+
+    def test_crossref_falls_back_to_one_run(self, workdir):
+        (workdir / 'library.bib').write_text(
+            '@inproceedings{k1, crossref={proc}}\n'
+        )
+        tx = self.latex(workdir)
+        tx.build()
+        assert (workdir / 'runs.log').read_text().split() == ['wdbib']
+
+    def latex(self, workdir):
+        tx = wdbibtex.LaTeX(
+            bibtexcmd=str(workdir / 'fakebibtex'),
+            texcmd=str(workdir / 'fakelatex'),
+            workdir=str(workdir),
+            bibtex_shards=2,
+            shard_threshold=1,
+        )
+        tx.set_bibliographystyle('unsrt')
+        tx.write(['\\cite{k%d}' % i for i in range(1, 6)], bib='library')
+        return tx
+
+    @pytest.fixture(scope='function')
+    def workdir(self, tmp_path):
+        tex = tmp_path / 'fakelatex'
+        tex.write_text(
+            '#!/bin/sh\n'
+            ': > wdbib.log\n'
+            '{\n'
+            "  sed -n 's/^\\\\cite{\\(.*\\)}$/\\\\citation{\\1}/p' wdbib.tex\n"
+            "  printf '%s\\n' '\\bibstyle{unsrt}' '\\bibdata{library}'\n"
+            '  if [ -f wdbib.bbl ]; then\n'
+            "    sed -n 's/^\\\\bibitem{\\(.*\\)}$/\\1/p' wdbib.bbl |"
+            " awk '{print \"\\\\bibcite{\" $0 \"}{\" NR \"}\"}'\n"
+            '  fi\n'
+            '} > wdbib.aux\n'
+        )
+        bibtex = tmp_path / 'fakebibtex'
+        bibtex.write_text(
+            '#!/bin/sh\n'
+            'echo "$1" >> runs.log\n'
+            '{\n'
+            "  printf '%s\\n' '\\begin{thebibliography}{9}'\n"
+            "  sed -n 's/^\\\\citation{\\(.*\\)}$/\\1/p' \"$1.aux\" |"
+            " while read k; do\n"
+            "    printf '\\n\\\\bibitem{%s}\\nEntry %s.\\n' \"$k\" \"$k\"\n"
+            '  done\n'
+            "  printf '\\n\\\\end{thebibliography}\\n'\n"
+            '} > "$1.bbl"\n'
+            ': > "$1.blg"\n'
+        )
+        tex.chmod(0o755)
+        bibtex.chmod(0o755)
+        (tmp_path / 'unsrt.bst').write_text(
+            'FUNCTION {article} { }\nITERATE {call.type$}\n'
+        )
+        (tmp_path / 'library.bib').write_text('@article{k1, title={T}}\n')
+        return tmp_path
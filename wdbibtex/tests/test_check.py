@@ -0,0 +1,79 @@
+import os
+import sys
+import zipfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+
+
+class TestCheckDocument:
+
+    def test_report(self, tmp_path):
+        docx = tmp_path / 'paper.docx'
+        with zipfile.ZipFile(docx, 'w') as zf:
+            zf.writestr(
+                'word/document.xml',
+                '<w:document xmlns:w="' + W + '"><w:body>'
+                '<w:p><w:r><w:t>\\begin{preamble}</w:t></w:r></w:p>'
+                '<w:p><w:r><w:t>\\usepackage{cite}</w:t></w:r></w:p>'
+                '<w:p><w:r><w:t>\\setlength{\\parindent}{0pt}</w:t></w:r>'
+                '</w:p>'
+                '<w:p><w:r><w:t>\\end{preamble}</w:t></w:r></w:p>'
+                '<w:p><w:r><w:t>See \\cite{Key1,</w:t></w:r>'
+                '<w:del><w:r><w:delText>gone</w:delText></w:r></w:del>'
+                '<w:r><w:t>key3}.</w:t></w:r></w:p>'
+                '</w:body></w:document>',
+            )
+            zf.writestr(
+                'word/footnotes.xml',
+                '<w:footnotes xmlns:w="' + W + '"><w:footnote><w:p><w:r>'
+                '<w:t>\\citep[p.~2]{key2}</w:t></w:r></w:p></w:footnote>'
+                '</w:footnotes>',
+            )
+        (tmp_path / 'a.bib').write_text(
+            '@string{j = "Journal"}\n'
+            '@article{key1,\n  title={One},\n}\n'
+            '@book{key2,\n  title={Two},\n}\n'
+        )
+        (tmp_path / 'b.bib').write_text('@misc{KEY2,\n  title={Two},\n}\n')
+
+        report = wdbibtex.check_document(docx)
+        assert report.citations == 2
+        assert report.missing == ['key3']
+        assert report.duplicates == {
+            'key2': [
+                ('key2', str(tmp_path / 'a.bib'), 5),
+                ('KEY2', str(tmp_path / 'b.bib'), 1),
+            ]
+        }
+        assert report.unused == [(3, '\\setlength')]
+
+        report = wdbibtex.check_document(docx, bib='a')
+        assert report.duplicates == {}
+        assert 'missing key: key3' in wdbibtex.check.format_report(report)
+
+    def test_alternate_content_is_counted_once(self, tmp_path):
+        docx = tmp_path / 'paper.docx'
+        with zipfile.ZipFile(docx, 'w') as zf:
+            zf.writestr(
+                'word/document.xml',
+                '<w:document xmlns:w="' + W + '" xmlns:mc="' + MC + '">'
+                '<w:body><w:p><w:r><mc:AlternateContent>'
+                '<mc:Choice Requires="wps"><w:p><w:r>'
+                '<w:t>\\cite{key1}</w:t></w:r></w:p></mc:Choice>'
+                '<mc:Fallback><w:p><w:r>'
+                '<w:t>\\cite{key1}</w:t></w:r></w:p></mc:Fallback>'
+                '</mc:AlternateContent></w:r></w:p>'
+                '<w:p><w:r><w:t>\\cite{key2}</w:t></w:r></w:p>'
+                '</w:body></w:document>',
+            )
+        (tmp_path / 'a.bib').write_text('@misc{key1,\n  title={One},\n}\n')
+
+        report = wdbibtex.check_document(docx)
+        assert report.citations == 2
+        assert report.missing == ['key2']
+
+
+W = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+MC = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
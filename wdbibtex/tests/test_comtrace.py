@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+from wdbibtex.comtrace import unwrap  # noqa E402
+
+
+class FakeCom:
+    """Object which looks like a pywin32 COM object."""
+
+    _oleobj_ = None
+
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class FakeCollection(FakeCom):
+
+    def __init__(self, *items):
+        super().__init__()
+        self.items = items
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __call__(self, i):
+        return self.items[i - 1]
+
+
+class FakeFind(FakeCom):
+
+    def __init__(self, hits):
+        super().__init__()
+        self.hits = hits
+
+    def Execute(self, text):
+        self.hits -= 1
+        return self.hits >= 0
+
+
+class TestComTracer:
+
+    def test_records(self):
+        tracer = wdbibtex.ComTracer()
+        rng = FakeCom(Text='\\cite{key}', Start=0, Find=FakeFind(2))
+        dc = tracer.wrap(
+            FakeCom(StoryRanges=FakeCollection(rng, rng)), 'Document'
+        )
+        assert len(dc.StoryRanges) == 2
+        assert dc.StoryRanges(1).Start == 0
+        for story in dc.StoryRanges:
+            story.Text
+            story.Text = '[1]'
+            fi = story.Find
+            while fi.Execute('key'):
+                pass
+        calls = {r['call']: r['count'] for r in tracer.records()}
+        assert calls == {
+            'Document.StoryRanges': 3,
+            'len(StoryRanges)': 1,
+            'StoryRanges()': 1,
+            'StoryRanges().Start': 1,
+            'StoryRanges[]': 2,
+            'StoryRanges[].Text': 2,
+            'StoryRanges[].Text=': 2,
+            'StoryRanges[].Find': 2,
+            'Find.Execute()': 4,
+        }
+        assert rng.Text == '[1]'
+        assert {r['caller'] for r in tracer.records()} == {'<other>'}
+
+    def test_unwrap_and_primitives(self):
+        tracer = wdbibtex.ComTracer()
+        raw = FakeCom(Next=None, Count=3)
+        obj = tracer.wrap(raw, 'Range')
+        assert obj.Next is None
+        assert obj.Count == 3
+        assert unwrap(obj) is raw
+        assert unwrap(raw) is raw
+
+    def test_emit(self, tmp_path):
+        stream = io.StringIO()
+        tracer = wdbibtex.ComTracer(top=1, stream=stream)
+        obj = tracer.wrap(FakeCom(Text='a', Start=0), 'Range')
+        obj.Text
+        obj.Start
+        obj.Start
+        tracer.emit()
+        lines = stream.getvalue().splitlines()
+        assert lines[0].split() == ['caller', 'call', 'count', 'seconds']
+        assert len(lines) == 3
+        assert lines[-1].split()[:2] == ['total', '3']
+
+        tracer = wdbibtex.ComTracer(file=tmp_path / 'trace.json')
+        obj = tracer.wrap(FakeCom(Text='a'), 'Range')
+        obj.Text
+        tracer.emit()
+        records = json.loads((tmp_path / 'trace.json').read_text())
+        assert [(r['call'], r['count']) for r in records] == [
+            ('Range.Text', 1)
+        ]
@@ -0,0 +1,150 @@
+import os
+import stat
+import struct
+import sys
+import zipfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+
+
+class TestDocxPackage:
+
+    def test_story_parts(self, docx):
+        pkg = wdbibtex.DocxPackage(docx)
+        assert pkg.story_parts == [
+            'word/document.xml',
+            'word/header1.xml',
+            'word/footnotes.xml',
+        ]
+
+    def test_save_replaced_part(self, docx, tmp_path):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+        xml = pkg.read_part('word/document.xml')
+        pkg.save(
+            target,
+            {'word/document.xml': xml.replace(b'\\cite{key}', b'[1]')},
+        )
+        with zipfile.ZipFile(target) as zf:
+            assert zf.testzip() is None
+            assert zf.namelist() == pkg.parts
+            assert zf.read('word/document.xml') == (
+                b'<w:document><w:t>See [1].</w:t></w:document>'
+            )
+            assert zf.read('word/media/image1.bin') == bytes(range(256)) * 64
+
+    def test_save_keeps_untouched_parts(self, docx, tmp_path):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+        pkg.save(target, {'word/document.xml': lambda chunks: chunks})
+        with zipfile.ZipFile(docx) as src, zipfile.ZipFile(target) as dst:
+            for name in ['word/media/image1.bin', 'word/header1.xml']:
+                a = src.getinfo(name)
+                b = dst.getinfo(name)
+                assert (a.CRC, a.file_size, a.compress_type) == \
+                    (b.CRC, b.file_size, b.compress_type)
+                assert src.read(name) == dst.read(name)
+
+    def test_save_copies_compressed_data(self, docx, tmp_path, monkeypatch):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+
+        def read(*args):
+            raise AssertionError('Copied member is decompressed.')
+
+        monkeypatch.setattr(zipfile.ZipExtFile, 'read', read)
+        pkg.save(target, {'word/document.xml': b'<w:document/>'})
+        for name in ['word/media/image1.bin', 'word/footnotes.xml']:
+            assert compressed(target, name) == compressed(docx, name)
+
+    def test_save_members_with_data_descriptors(self, tmp_path):
+        # zipfile writes data descriptors to unseekable streams.
+        fn = tmp_path / 'sample.docx'
+        with open(fn, 'wb') as f:
+            with zipfile.ZipFile(Unseekable(f), 'w', zipfile.ZIP_DEFLATED) \
+                    as zf:
+                zf.writestr('word/document.xml', '<w:document/>')
+                zf.writestr('word/media/image1.bin', b'image' * 100)
+        pkg = wdbibtex.DocxPackage(fn)
+        assert pkg.story_parts == ['word/document.xml']
+        target = tmp_path / 'sample_bib.docx'
+        pkg.save(target, {'word/document.xml': b'<w:document>1</w:document>'})
+        with zipfile.ZipFile(target) as zf:
+            assert zf.testzip() is None
+            assert zf.read('word/media/image1.bin') == b'image' * 100
+            assert not zf.getinfo('word/media/image1.bin').flag_bits & 0x08
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='POSIX file modes')
+    def test_save_keeps_file_mode(self, docx, tmp_path):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+        docx.chmod(0o644)
+        pkg.save(target)
+        assert stat.S_IMODE(target.stat().st_mode) == 0o644
+        target.chmod(0o640)
+        pkg.save(target)
+        assert stat.S_IMODE(target.stat().st_mode) == 0o640
+
+    def test_save_streamed_part(self, docx, tmp_path):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+
+        def upper(chunks):
+            for chunk in chunks:
+                yield chunk.upper()
+
+        pkg.save(target, {'word/header1.xml': upper})
+        with zipfile.ZipFile(target) as zf:
+            assert zf.read('word/header1.xml') == b'<W:HDR>HEADER</W:HDR>'
+
+    def test_save_unknown_part(self, docx, tmp_path):
+        pkg = wdbibtex.DocxPackage(docx)
+        target = tmp_path / 'sample_bib.docx'
+        with pytest.raises(KeyError):
+            pkg.save(target, {'word/missing.xml': b''})
+        assert not target.exists()
+        assert os.listdir(tmp_path) == ['sample.docx']
+
+    @pytest.fixture(scope='function')
+    def docx(self, tmp_path):
+        fn = tmp_path / 'sample.docx'
+        with zipfile.ZipFile(fn, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('[Content_Types].xml', '<Types/>')
+            zf.writestr(
+                'word/document.xml',
+                '<w:document><w:t>See \\cite{key}.</w:t></w:document>',
+            )
+            zf.writestr('word/header1.xml', '<w:hdr>header</w:hdr>')
+            zf.writestr('word/footnotes.xml', '<w:footnotes/>')
+            zf.writestr('word/media/image1.bin', bytes(range(256)) * 64)
+        return fn
+
+
+class Unseekable:
+    """Writable file which cannot seek or tell."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, b):
+        return self.f.write(b)
+
+    def flush(self):
+        self.f.flush()
+
+
+def compressed(path, name):
+    """Returns compressed data of a zip member."""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(name)
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = struct.unpack(
+            zipfile.structFileHeader, f.read(zipfile.sizeFileHeader)
+        )
+        f.seek(header[10] + header[11], os.SEEK_CUR)
+        return f.read(info.compress_size)
@@ -8,6 +8,7 @@ import subprocess
 import time
 import sys
 import unittest
+import xml.etree.ElementTree
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -395,3 +396,500 @@ class TestExamples:
         os.remove('examples/custom/sample_bib.docx')
         os.remove('examples/ieejtran/sample.docx')
         os.remove('examples/ieejtran/sample_bib.docx')
+
+
+class TestBibitemCache:
+
+    def test_read_bbl_hits_cache(self, bbl_dir):
+        bb = wdbibtex.Bibliography(workdir=bbl_dir)
+        bb.read_bbl()
+        first = bb.thebibliography
+        bb.read_bbl()
+        assert bb.thebibliography == first
+        assert bb.bibitem_cache.stats == {'hits': 2, 'misses': 2, 'size': 2}
+
+    def test_changed_entry_is_converted(self, bbl_dir):
+        cache = wdbibtex.BibitemCache()
+        bb = wdbibtex.Bibliography(workdir=bbl_dir, bibitem_cache=cache)
+        bb.read_bbl()
+        bb.thebibliography
+        fn = pathlib.Path(bbl_dir) / 'wdbib.bbl'
+        fn.write_text(fn.read_text().replace('Title2', 'Title3'))
+        bb = wdbibtex.Bibliography(workdir=bbl_dir, bibitem_cache=cache)
+        bb.read_bbl()
+        assert bb.thebibliography.endswith(
+            u"[2]\tG. Yamada, “Title3,” dec. 2019.\n"
+        )
+        assert cache.stats['hits'] == 1
+        assert cache.stats['misses'] == 3
+
+    def test_persistent_cache(self, bbl_dir, tmp_path):
+        path = tmp_path / 'cache.json'
+        bb = wdbibtex.Bibliography(
+            workdir=bbl_dir,
+            bibitem_cache=wdbibtex.BibitemCache(path=path),
+        )
+        bb.read_bbl()
+        bb.thebibliography
+        assert path.exists()
+        cache = wdbibtex.BibitemCache(path=path)
+        bb = wdbibtex.Bibliography(workdir=bbl_dir, bibitem_cache=cache)
+        bb.read_bbl()
+        bb.thebibliography
+        assert cache.stats == {'hits': 2, 'misses': 0, 'size': 2}
+
+    def test_entry_text_does_not_save(self, bbl_dir, tmp_path):
+        path = tmp_path / 'cache.json'
+        bb = wdbibtex.Bibliography(
+            workdir=bbl_dir,
+            bibitem_cache=wdbibtex.BibitemCache(path=path),
+        )
+        bb.read_bbl()
+        for e in bb.entries:
+            e.text
+        assert not path.exists()
+        bb.reset()
+        assert path.exists()
+
+    def test_entries_render_lazily(self, bbl_dir):
+        bb = wdbibtex.Bibliography(workdir=bbl_dir)
+        bb.read_bbl()
+        assert [(e.key, e.label) for e in bb.entries] == [
+            ('enArticle1', '1'),
+            ('enArticle2', '2'),
+        ]
+        assert bb.bibitem_cache.stats['misses'] == 0
+        entry = bb.entry('enArticle2')
+        assert entry is bb.entry_by_label(2)
+        assert entry.raw == (
+            "\\bibitem{enArticle2}\nG.~Yamada, ``Title2,'' dec. 2019.\n\n"
+        )
+        assert entry.text == u"G. Yamada, “Title2,” dec. 2019.\n"
+        assert bb.bibitem_cache.stats['misses'] == 1
+        assert ''.join(bb.iter_thebibliography()) == bb.thebibliography
+        with pytest.raises(KeyError):
+            bb.entry('missing')
+
+    def test_lru_eviction(self):
+        cache = wdbibtex.BibitemCache(maxsize=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        assert cache.get('a') == 'A'
+        cache.put('c', 'C')
+        assert cache.get('b') is None
+        assert cache.get('a') == 'A'
+        assert len(cache) == 2
+
+    @pytest.fixture(scope='function')
+    def bbl_dir(self, tmp_path):
+        (tmp_path / 'wdbib.bbl').write_text(
+            "\\begin{thebibliography}{1}\n"
+            "\n"
+            "\\bibitem{enArticle1}\n"
+            "I.~Yamada, ``Title1,'' {\\em Japanese\n"
+            "  Journal}, pp.~20--30, march 2019.\n"
+            "\n"
+            "\\bibitem{enArticle2}\n"
+            "G.~Yamada, ``Title2,'' dec. 2019.\n"
+            "\n"
+            "\\end{thebibliography}\n",
+            encoding='utf-8',
+        )
+        return str(tmp_path)
+
+
+class TestParallelConversion:
+
+    def test_parallel_equals_serial(self, tmp_path):
+        entries = []
+        for i in range(40):
+            entries.append(
+                "\\bibitem{key%d}\n"
+                "A.~Author%d, ``Title {%d},'' {\\em Journal},\n"
+                "  pp.~%d--%d, 2022.\n"
+                "\n" % (i, i, i, i, i + 1)
+            )
+        (tmp_path / 'wdbib.bbl').write_text(
+            "\\begin{thebibliography}{40}\n\n"
+            + ''.join(entries)
+            + "\\end{thebibliography}\n",
+            encoding='utf-8',
+        )
+        serial = wdbibtex.Bibliography(workdir=str(tmp_path), workers=1)
+        serial.read_bbl()
+        parallel = wdbibtex.Bibliography(
+            workdir=str(tmp_path),
+            workers=2,
+            parallel_threshold=1,
+            chunksize=3,
+        )
+        parallel.read_bbl()
+        assert parallel.thebibliography == serial.thebibliography
+        assert parallel.thebibliography.splitlines()[39] == (
+            u"[40]\tA. Author39, “Title 39,” Journal, pp. 39\u201340, 2022."
+        )
+
+
+class TestBibliographyXml:
+
+    def test_paragraph_per_entry(self, bbl_dir):
+        bb = wdbibtex.Bibliography(workdir=bbl_dir)
+        bb.read_bbl()
+        paragraphs = list(bb.iter_thebibliography_xml())
+        assert len(paragraphs) == 2
+        assert paragraphs[0].startswith(
+            '<w:p><w:pPr><w:ind w:left="480" w:hanging="480"/></w:pPr>'
+            '<w:r><w:t xml:space="preserve">[1]</w:t></w:r>'
+            '<w:r><w:tab/></w:r>'
+        )
+        assert (
+            '<w:r><w:rPr><w:i/></w:rPr>'
+            '<w:t xml:space="preserve">Japanese Journal</w:t></w:r>'
+        ) in paragraphs[0]
+
+    def test_url_is_hyperlink(self, bbl_dir):
+        bb = wdbibtex.Bibliography(workdir=bbl_dir)
+        bb.read_bbl()
+        assert bb.entry('enArticle2').runs == [
+            (u'G. Yamada, “Title2,” ', False, None),
+            ('http://a.org/~b&c', False, 'http://a.org/~b&c'),
+            (', dec. 2019.', False, None),
+        ]
+        assert (
+            '<w:fldSimple w:instr=" HYPERLINK &quot;http://a.org/~b&amp;c'
+            '&quot; ">'
+        ) in bb.thebibliography_xml
+
+    def test_flat_opc_is_well_formed(self, bbl_dir):
+        bb = wdbibtex.Bibliography(workdir=bbl_dir)
+        bb.read_bbl()
+        root = xml.etree.ElementTree.fromstring(
+            bb.thebibliography_xml.encode('utf-8')
+        )
+        w = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+        assert len(list(root.iter(w + 'p'))) == 2
+
+    @pytest.fixture(scope='function')
+    def bbl_dir(self, tmp_path):
+        (tmp_path / 'wdbib.bbl').write_text(
+            "\\begin{thebibliography}{1}\n"
+            "\n"
+            "\\bibitem{enArticle1}\n"
+            "I.~Yamada, ``Title1,'' {\\em Japanese\n"
+            "  Journal}, pp.~20--30, march 2019.\n"
+            "\n"
+            "\\bibitem{enArticle2}\n"
+            "G.~Yamada, ``Title2,'' \\url{http://a.org/~b&c}, dec. 2019.\n"
+            "\n"
+            "\\end{thebibliography}\n",
+            encoding='utf-8',
+        )
+        return str(tmp_path)
+
+
+class TestPreamble:
+
+    def test_multiline_and_comments(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path), preamble=(
+            "% \\documentclass{jarticle}\n"
+            "\\documentclass[\n"
+            "  a4paper,\n"
+            "]{article}\n"
+            "\\usepackage[super,\n  sort]{cite}  % \\usepackage{unused}\n"
+            "\\newcommand{\\foo}{\\usepackage{hidden}}\n"
+            "\\renewcommand\\citeleft{(}\n"
+            "\\renewcommand{\\citeright}{)}\n"
+            "\\bibliographystyle{ieeetr}\n"
+        ))
+        assert tx.preamble == (
+            "\\documentclass[a4paper]{article}\n"
+            "\\usepackage[super,sort]{cite}\n"
+            "\\bibliographystyle{ieeetr}"
+        )
+        assert tx.is_package_used('cite') == ['super', 'sort']
+        assert tx.is_package_used('unused') is False
+        assert tx.is_package_used('hidden') is False
+        assert tx.citeleft == '('
+        assert tx.citeright == ')'
+
+    def test_package_overwrite_moves_to_end(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.add_package('cite')
+        tx.add_package('graphicx', 'dvipdfmx')
+        tx.add_package('cite', 'super')
+        assert tx.packages == (
+            "\\usepackage[dvipdfmx]{graphicx}\n"
+            "\\usepackage[super]{cite}"
+        )
+        assert tx.preamble.endswith(tx.packages)
+
+    def test_parsed_preamble_is_cached(self, tmp_path):
+        from wdbibtex.latex import _parse_preamble
+        preamble = "\\documentclass{article}\n\\usepackage{cite}\n"
+        wdbibtex.LaTeX(workdir=str(tmp_path), preamble=preamble)
+        hits = _parse_preamble.cache_info().hits
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path), preamble=preamble)
+        assert _parse_preamble.cache_info().hits == hits + 1
+        assert tx.is_package_used('cite') is True
+
+
+class TestCitationTokenizer:
+
+    def test_command_forms(self):
+        found = wdbibtex.parse_citations(
+            "A \\cite{a}, \\citep[p.~3]{b}, \\citet*{c ,\n d}"
+            " \\citeleft \\nocite{*} \\parencite[see][]{e} \\citeauthor{f}."
+        )
+        assert [(c.command, c.star, c.options, c.keys) for c in found] == [
+            ('cite', False, (), ('a',)),
+            ('citep', False, ('p.~3',), ('b',)),
+            ('citet', True, (), ('c', 'd')),
+            ('nocite', False, (), ('*',)),
+            ('parencite', False, ('see', ''), ('e',)),
+            ('citeauthor', False, (), ('f',)),
+        ]
+        assert found[2].source == "\\citet*{c ,\n d}"
+        assert [c.textual for c in found] == [
+            False, False, True, False, False, True
+        ]
+
+    def test_positions(self):
+        text = "x \\cite{a} y \\cite[p.~1]{b}"
+        for c in wdbibtex.parse_citations(text):
+            assert text[c.start:c.end] == c.source
+
+    def test_cite_formats_records(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.citation_labels = {'a': 1, 'b': 2}
+        record, = wdbibtex.parse_citations("\\cite[p.~3]{a, b}")
+        assert tx.cite(record) == '[1,2, p. 3]'
+        assert tx.cite("\\parencite[see][]{b}") == '[see 2]'
+        assert tx.cite("\\nocite{*}") == ''
+        with pytest.raises(ValueError):
+            tx.cite('no citation')
+        for command in ['citet', 'citeauthor', 'citeyear', 'textcite']:
+            with pytest.raises(ValueError):
+                tx.cite('\\%s{a}' % command)
+
+    def test_context_keys(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx._parse_context("\\citep{a, b}\n\\nocite{*}\n\\cite[p.~1]{c}")
+        assert tx._citation_keys_in_context == ['a,b', 'c']
+
+
+class TestCompactContext:
+
+    def test_distinct_citations_in_first_appearance_order(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.set_bibliographystyle('unsrt')
+        cites = ['\\cite{b}', '\\cite{a, c}'] * 300 + [
+            '\\citep[p.~2]{b}',
+            '\\nocite{d}',
+            '\\cite{c}',
+        ]
+        tx.write(iter(cites), bib='library')
+        lines = (tmp_path / 'wdbib.tex').read_text().splitlines()
+        body = lines[lines.index('\\begin{document}') + 1:-2]
+        assert body == [
+            '\\cite{b}',
+            '\\cite{a,c}',
+            '\\nocite{d}',
+            '\\cite{c}',
+        ]
+        assert tx._citation_keys_in_context == ['b', 'a,c', 'c']
+
+    def test_rewrite_keeps_context_keys_unique(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.set_bibliographystyle('unsrt')
+        tx.write(['\\cite{a}'], bib='library')
+        tx.write(['\\cite{a}', '\\cite{b}'], bib='library')
+        assert tx._citation_keys_in_context == ['a', 'b']
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses a shell script')
+class TestPrecompiledFormat:
+
+    def test_format_is_dumped_once(self, fake_tex):
+        tx = self.latex(fake_tex)
+        tx.write('\\cite{a}', bib='library')
+        tx.build()
+        tx.build()
+        log = (fake_tex / 'tex.log').read_text().splitlines()
+        assert sum('-ini' in ln for ln in log) == 1
+        # The format of the engine is loaded by its name, not its path.
+        assert log[0] == (
+            '-ini -interaction=nonstopmode -jobname=%s &pdflatex '
+            'mylatexformat.ltx wdbib.tex' % tx.format_name
+        )
+        assert log[1:].count(
+            '-fmt=%s -interaction=nonstopmode -draftmode wdbib.tex'
+            % tx.format_name
+        ) == 6
+        assert len(tx.build_stats['latex']) == 3
+
+    def test_changed_preamble_dumps_new_format(self, fake_tex):
+        tx = self.latex(fake_tex)
+        tx.write('\\cite{a}', bib='library')
+        tx.build()
+        first = tx.format_name
+        tx.add_package('cite')
+        tx.build()
+        assert tx.format_name != first
+        assert [p.name for p in fake_tex.glob('*.fmt')] == [
+            tx.format_name + '.fmt'
+        ]
+
+    def latex(self, workdir):
+        tx = wdbibtex.LaTeX(
+            bibtexcmd='true',
+            texcmd=str(workdir / 'pdflatex'),
+            texopts='-interaction=nonstopmode',
+            workdir=str(workdir),
+            precompile=True,
+            draftmode=True,
+        )
+        tx.set_bibliographystyle('unsrt')
+        return tx
+
+    @pytest.fixture(scope='function')
+    def fake_tex(self, tmp_path):
+        tex = tmp_path / 'pdflatex'
+        tex.write_text(
+            '#!/bin/sh\n'
+            'echo "$@" >> tex.log\n'
+            'for a in "$@"; do\n'
+            '  case "$a" in -jobname=*) touch "${a#-jobname=}.fmt";; esac\n'
+            'done\n'
+        )
+        tex.chmod(0o755)
+        return tmp_path
+
+
+class TestSessionReuse:
+
+    def test_reset_forgets_previous_document(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.set_bibliographystyle('unsrt')
+        self.build(tx, tmp_path, 0, 3)
+        assert tx.cite('\\cite{doc0key2}') == '[3]'
+        tx.reset()
+        self.build(tx, tmp_path, 1, 2)
+        assert tx.citation_labels == {'doc1key0': 1, 'doc1key1': 2}
+        assert tx._citation_keys_in_context == ['doc1key0', 'doc1key1']
+        assert [e.key for e in tx.entries] == ['doc1key0', 'doc1key1']
+        with pytest.raises(KeyError):
+            tx.cite('\\cite{doc0key2}')
+
+    def test_memory_is_flat(self, tmp_path):
+        import tracemalloc
+        tx = wdbibtex.LaTeX(
+            workdir=str(tmp_path),
+            bibitem_cache=wdbibtex.BibitemCache(maxsize=100),
+        )
+        tx.set_bibliographystyle('unsrt')
+        # Count only memory allocated by wdbibtex itself,
+        # not interpreter tables which grow once in a while.
+        # Keys and entries are large, so that a leak of one document
+        # is much larger than noise of interpreter free lists.
+        package = [
+            tracemalloc.Filter(
+                True, os.path.join(os.path.dirname(wdbibtex.__file__), '*')
+            ),
+            tracemalloc.Filter(False, __file__),
+        ]
+        tracemalloc.start()
+        try:
+            for i in range(80):
+                if i == 20:
+                    before = tracemalloc.take_snapshot()
+                self.build(tx, tmp_path, i, 10, pad='x' * 500)
+                tx.thebibliography
+                tx.reset()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        growth = sum(
+            d.size_diff for d in after.filter_traces(package).compare_to(
+                before.filter_traces(package), 'filename'
+            )
+        )
+        assert growth < 100 * 1024
+
+    def build(self, tx, workdir, doc, n, pad=''):
+        """Write a document citing n keys and fake its .aux and .bbl."""
+        keys = ['doc%dkey%d%s' % (doc, i, pad) for i in range(n)]
+        tx.write(['\\cite{%s}' % k for k in keys], bib='library')
+        (workdir / 'wdbib.aux').write_text(
+            '\\relax\n\\bibstyle{unsrt}\n'
+            + ''.join('\\citation{%s}\n' % k for k in keys)
+            + '\\bibdata{library}\n'
+            + ''.join(
+                '\\bibcite{%s}{%d}\n' % (k, i + 1) for i, k in enumerate(keys)
+            )
+        )
+        (workdir / 'wdbib.bbl').write_text(
+            '\\begin{thebibliography}{%d}\n\n' % n
+            + ''.join(
+                '\\bibitem{%s}\nA.~Author, ``%s,\'\' 2022.\n\n' % (k, k)
+                for k in keys
+            )
+            + '\\end{thebibliography}\n'
+        )
+        tx.read_aux()
+        tx.read_bbl()
+
+
+class TestBuildResult:
+
+    def test_roundtrip_without_tex(self, tmp_path):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.add_package('cite')
+        tx.set_bibliographystyle('unsrt')
+        TestSessionReuse().build(tx, tmp_path, 0, 3)
+        tx.result().save(tmp_path / 'doc.wdbib.json')
+
+        result = wdbibtex.BuildResult.load(tmp_path / 'doc.wdbib.json')
+        assert result.cite('\\cite{doc0key2,doc0key0,doc0key1}') == (
+            tx.cite('\\cite{doc0key2,doc0key0,doc0key1}')
+        )
+        assert result.thebibliography == tx.thebibliography
+        assert result.bibliographystyle == 'unsrt'
+        assert result.preamble == tx.preamble
+        assert [e[0] for e in result.entries] == [
+            'doc0key0', 'doc0key1', 'doc0key2'
+        ]
+        cites = ['\\cite{doc0key0}', '\\cite{doc0key1}', '\\cite{doc0key2}']
+        assert result.citations == cites
+        assert result.is_current(tx, cites, bib='library')
+
+    @pytest.mark.parametrize('cites', [
+        ['\\cite{doc0key0}', '\\cite{doc0key2}'],
+        ['\\cite{doc0key1}', '\\cite{doc0key0}', '\\cite{doc0key2}'],
+        ['\\cite{doc0key0}', '\\cite{doc0key1}', '\\nocite{doc0key2}'],
+    ])
+    def test_removed_or_reordered_citation(self, tmp_path, cites):
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.set_bibliographystyle('unsrt')
+        TestSessionReuse().build(tx, tmp_path, 0, 3)
+        result = tx.result()
+        assert not result.is_current(tx, cites, bib='library')
+
+    def test_changed_sources(self, tmp_path):
+        (tmp_path / 'library.bib').write_text('@misc{doc0key0}\n')
+        (tmp_path / 'unsrt.bst').write_text('ENTRY {} {} {}\n')
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.set_bibliographystyle('unsrt')
+        TestSessionReuse().build(tx, tmp_path, 0, 1)
+        result = tx.result()
+        cites = ['\\cite{doc0key0}']
+        assert result.is_current(tx, cites, bib='library')
+        (tmp_path / 'library.bib').write_text('@misc{doc0key0,note={x}}\n')
+        assert not result.is_current(tx, cites, bib='library')
+        (tmp_path / 'library.bib').write_text('@misc{doc0key0}\n')
+        (tmp_path / 'unsrt.bst').write_text('ENTRY {} {} {label}\n')
+        assert not result.is_current(tx, cites, bib='library')
+
+    def test_version_mismatch(self, tmp_path):
+        (tmp_path / 'doc.wdbib.json').write_text('{"version": 0}')
+        with pytest.raises(ValueError):
+            wdbibtex.BuildResult.load(tmp_path / 'doc.wdbib.json')
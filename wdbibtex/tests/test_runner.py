@@ -0,0 +1,91 @@
+import os
+import pytest
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses POSIX commands')
+class TestRunner:
+
+    def test_exit_status(self, tmp_path):
+        runner = wdbibtex.Runner()
+        assert runner.run('exit 3', cwd=str(tmp_path)) == 3
+
+    def test_stdin_is_closed(self, tmp_path):
+        runner = wdbibtex.Runner(timeout=5)
+        assert runner.run('cat', cwd=str(tmp_path)) == 0
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        runner = wdbibtex.Runner(timeout=0.5)
+        t = time.perf_counter()
+        with pytest.raises(wdbibtex.TeXTimeoutError) as e:
+            runner.run(
+                'sleep 30 & echo $! > child.pid; wait',
+                cwd=str(tmp_path),
+                step='bibtex',
+            )
+        assert time.perf_counter() - t < 5
+        assert e.value.step == 'bibtex'
+        assert str(e.value).startswith('bibtex: timed out')
+        pid = int((tmp_path / 'child.pid').read_text())
+        time.sleep(0.1)
+        assert not self.running(pid)
+
+    def test_output_to_file(self, tmp_path):
+        runner = wdbibtex.Runner()
+        runner.run('echo out; echo err >&2', cwd=str(tmp_path), step='bibtex')
+        assert runner.output_file('bibtex') == tmp_path / 'bibtex.out'
+        assert runner.output_of('bibtex').split() == ['out', 'err']
+
+    def test_output_to_memory(self, tmp_path):
+        runner = wdbibtex.Runner(output='memory', lines=2)
+        runner.run('seq 1 5', cwd=str(tmp_path), step='latex pass 1')
+        assert runner.output_of('latex pass 1') == '4\n5\n'
+        assert runner.output_file('latex pass 1') is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_copy(self, tmp_path):
+        runner = wdbibtex.Runner(timeout=5, output='memory')
+        runner.run('echo out', cwd=str(tmp_path), step='bibtex')
+        copied = runner.copy()
+        assert copied.timeout == 5
+        assert copied.output == 'memory'
+        assert copied.output_of('bibtex') is None
+
+    def running(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        # A killed but not yet reaped process is a zombie.
+        if os.path.exists('/proc/%d/stat' % pid):
+            with open('/proc/%d/stat' % pid) as f:
+                return f.read().split(')')[-1].split()[0] != 'Z'
+        return True
+
+    def test_cpu_time_limit(self, tmp_path):
+        runner = wdbibtex.Runner(timeout=10, cpu_time=1)
+        returncode = runner.run(
+            '"%s" -c "while True: pass"' % sys.executable,
+            cwd=str(tmp_path),
+        )
+        assert returncode != 0
+
+    def test_limits_are_set_by_shell(self, tmp_path, monkeypatch):
+        runner = wdbibtex.Runner(
+            cpu_time=30, memory=2 << 30, output='memory'
+        )
+        popen = subprocess.Popen
+
+        def checked(*args, **kwargs):
+            assert 'preexec_fn' not in kwargs
+            return popen(*args, **kwargs)
+
+        monkeypatch.setattr(subprocess, 'Popen', checked)
+        assert runner.run('ulimit -t; ulimit -v', cwd=str(tmp_path)) == 0
+        assert runner.output_of(None) == '30\n%d\n' % (2 << 20)
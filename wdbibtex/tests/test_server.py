@@ -0,0 +1,144 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from wdbibtex.server import Server, _build_document, submit  # noqa E402
+from wdbibtex.tests.test_word import (  # noqa E402
+    fake_office,
+    stories,
+    write_document,
+)
+
+
+class TestServer:
+
+    def test_build_events_and_metrics(self, server):
+        events = list(submit(
+            server.server_address,
+            {'op': 'build', 'id': 7, 'file': 'a.docx', 'bst': 'unsrt'},
+        ))
+        assert [e['event'] for e in events] == [
+            'queued', 'started', 'phase', 'done'
+        ]
+        assert all(e['id'] == 7 for e in events)
+        assert events[2]['phase'] == 'build'
+        assert events[-1]['build_stats'] == {'file': 'a.docx', 'bst': 'unsrt'}
+
+        events = list(submit(
+            server.server_address, {'op': 'build', 'file': 'fail.docx'}
+        ))
+        assert events[-1]['event'] == 'error'
+        assert events[-1]['type'] == 'ValueError'
+
+        metrics, = submit(server.server_address, {'op': 'metrics'})
+        assert metrics['completed'] == 1
+        assert metrics['failed'] == 1
+        assert metrics['queue_depth'] == 0
+        assert metrics['latency']['count'] == 2
+
+    def test_workers_keep_state(self, server):
+        for f in ['a.docx', 'b.docx', 'c.docx']:
+            *_, done = submit(
+                server.server_address, {'op': 'build', 'file': f}
+            )
+        assert done['build_stats']['jobs'] == 3
+
+    def test_jobs_on_same_file_are_serialized(self):
+        running = {}
+        overlaps = []
+        lock = threading.Lock()
+
+        def build(request, progress, state):
+            with lock:
+                running[request['file']] = running.get(request['file'], 0) + 1
+                overlaps.append(running[request['file']])
+            time.sleep(0.05)
+            with lock:
+                running[request['file']] -= 1
+            return {}
+
+        with Server(('127.0.0.1', 0), workers=3, build=build) as server:
+            jobs = [
+                server.submit({'file': f})
+                for f in ['a.docx', 'a.docx', './a.docx', 'b.docx']
+            ]
+            for events in jobs:
+                while events.get()['event'] not in ('done', 'error'):
+                    pass
+        assert max(overlaps) == 1
+
+    @pytest.mark.skipif(
+        sys.platform == 'win32', reason='uses Unix domain socket'
+    )
+    def test_unix_socket(self, tmp_path):
+        address = str(tmp_path / 'wdbibtex.sock')
+        with Server(address, build=self.build) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                assert list(submit(address, {'op': 'ping'})) == [
+                    {'event': 'pong'}
+                ]
+            finally:
+                server.shutdown()
+                thread.join()
+        assert not os.path.exists(address)
+
+    @pytest.fixture(scope='function')
+    def server(self):
+        server = Server(('127.0.0.1', 0), build=self.build)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield server
+        server.shutdown()
+        thread.join()
+
+    @staticmethod
+    def build(request, progress, state):
+        if request['file'] == 'fail.docx':
+            raise ValueError('Unhandled locale')
+        state['jobs'] = state.get('jobs', 0) + 1
+        progress('build', 0.0)
+        if state['jobs'] > 1:
+            return {'jobs': state['jobs']}
+        return {'file': request['file'], 'bst': request['bst']}
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses fake commands')
+class TestBuildDocument:
+
+    def test_jobs_share_latex_and_bibitem_cache(self, tmp_path, monkeypatch):
+        docdir = fake_office(tmp_path, monkeypatch)
+        write_document(docdir / 'a.docx', [
+            (1, 'A \\cite{k1}, \\cite{k2}.\r\\thebibliography\r', []),
+        ])
+        request = {'file': str(docdir / 'a.docx'), 'bst': 'unsrt'}
+        phases = []
+        state = {}
+        try:
+            _build_document(request, lambda p, s: phases.append(p), state)
+            latex = state['latex']
+            cache = state['bibitem_cache']
+            assert cache.stats == {'hits': 0, 'misses': 2, 'size': 2}
+            _build_document(request, lambda p, s: phases.append(p), state)
+            assert state['latex'] is latex
+            assert cache.stats == {'hits': 2, 'misses': 2, 'size': 2}
+            # Other options make another LaTeX object sharing the cache.
+            _build_document(
+                dict(request, timeout=60), lambda p, s: None, state
+            )
+            assert state['latex'] is not latex
+            assert state['latex'].bibitem_cache is cache
+            assert cache.stats['hits'] == 4
+        finally:
+            state['pool'].shutdown()
+        assert phases == ['build', 'close'] * 2
+        assert stories(docdir / 'a_bib.docx') == [
+            'A [1], [2].\r[1]\tEntry k1.\n[2]\tEntry k2.\n\r'
+        ]
+        assert not list(docdir.glob('.tmp*'))
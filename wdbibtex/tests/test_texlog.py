@@ -0,0 +1,196 @@
+import os
+import pytest
+import sys
+import warnings
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+from wdbibtex.texlog import (  # noqa E402
+    check_blg,
+    check_latex_log,
+    format_summary,
+    parse_latex_log,
+)
+
+
+class TestLogParser:
+
+    def test_wrapped_undefined_citation(self):
+        key = 'k' * 60
+        line = "LaTeX Warning: Citation `" + key + "' on page 1 undefined"
+        report = parse_latex_log(
+            line[:79] + '\n' + line[79:] + ' on input line 3.\n'
+        )
+        assert report.missing == [key]
+        assert report.warnings == []
+
+    def test_capacity(self, tmp_path):
+        log = tmp_path / 'wdbib.log'
+        log.write_text(
+            "! TeX capacity exceeded, sorry [main memory size=5000000].\n"
+        )
+        with pytest.raises(wdbibtex.TeXCapacityError):
+            check_latex_log(log, step='latex pass 1')
+
+    def test_undefined_citation_only_fails_final_pass(self, tmp_path):
+        log = tmp_path / 'wdbib.log'
+        log.write_text(
+            "LaTeX Warning: Citation `key1' on page 1 undefined"
+            " on input line 5.\n"
+            "LaTeX Warning: There were undefined references.\n"
+        )
+        check_latex_log(log, step='latex pass 1')
+        with pytest.raises(wdbibtex.MissingCitationError) as e:
+            check_latex_log(log, step='latex pass 3', final=True)
+        assert e.value.keys == ['key1']
+        assert e.value.step == 'latex pass 3'
+
+    def test_blg(self, tmp_path):
+        blg = tmp_path / 'wdbib.blg'
+        blg.write_text(
+            "Warning--I didn't find a database entry for \"key1\"\n"
+            "(There was 1 warning)\n"
+        )
+        with pytest.raises(wdbibtex.MissingCitationError):
+            check_blg(blg, returncode=1)
+        blg.write_text("Warning--empty journal in key2\n")
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            check_blg(blg, returncode=1)
+        assert [str(x.message) for x in w] == [
+            'bibtex: empty journal in key2'
+        ]
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses shell scripts')
+class TestFailFast:
+
+    def test_missing_bst_stops_after_bibtex(self, tmp_path):
+        tex = tmp_path / 'fakelatex'
+        tex.write_text(
+            '#!/bin/sh\n'
+            'echo latex >> runs.log\n'
+            'echo "This is a fake TeX." > wdbib.log\n'
+        )
+        bibtex = tmp_path / 'fakebibtex'
+        bibtex.write_text(
+            '#!/bin/sh\n'
+            'echo bibtex >> runs.log\n'
+            'echo "I couldn\'t open style file nostyle.bst" > wdbib.blg\n'
+            'exit 2\n'
+        )
+        tex.chmod(0o755)
+        bibtex.chmod(0o755)
+        tx = wdbibtex.LaTeX(
+            bibtexcmd=str(bibtex),
+            texcmd=str(tex),
+            workdir=str(tmp_path),
+        )
+        tx.set_bibliographystyle('nostyle')
+        tx.write('\\cite{a}', bib='library')
+        with pytest.raises(wdbibtex.BibTeXError) as e:
+            tx.build()
+        assert e.value.step == 'bibtex'
+        assert "nostyle.bst" in str(e.value)
+        assert (tmp_path / 'runs.log').read_text().split() == [
+            'latex', 'bibtex'
+        ]
+
+    def test_timed_out_step_is_in_summary(self, tmp_path):
+        tex = tmp_path / 'fakelatex'
+        tex.write_text('#!/bin/sh\n: > wdbib.log\n')
+        bibtex = tmp_path / 'fakebibtex'
+        bibtex.write_text('#!/bin/sh\nsleep 10\n')
+        tex.chmod(0o755)
+        bibtex.chmod(0o755)
+        tx = wdbibtex.LaTeX(
+            bibtexcmd=str(bibtex),
+            texcmd=str(tex),
+            workdir=str(tmp_path),
+            runner=wdbibtex.Runner(timeout=0.5),
+        )
+        tx.set_bibliographystyle('unsrt')
+        tx.write('\\cite{a}', bib='library')
+        with pytest.raises(wdbibtex.TeXTimeoutError):
+            tx.build()
+        summary = tx.build_summary
+        assert [(r['step'], r['returncode']) for r in summary] == [
+            ('latex pass 1', 0), ('bibtex', None)
+        ]
+        assert summary[1]['output'] == tmp_path / 'bibtex.out'
+        assert format_summary(summary).splitlines()[1].endswith(
+            '(not finished)'
+        )
+
+    def test_no_citations(self, tmp_path):
+        tex = tmp_path / 'fakelatex'
+        tex.write_text('#!/bin/sh\n: > wdbib.log\n')
+        bibtex = tmp_path / 'fakebibtex'
+        bibtex.write_text(
+            '#!/bin/sh\n'
+            "printf '%s\\n' 'The top-level auxiliary file: wdbib.aux'"
+            " 'I found no \\citation commands---while reading file"
+            " wdbib.aux' '(There was 1 error message)' > wdbib.blg\n"
+            "printf '%s\\n' '\\begin{thebibliography}{}'"
+            " '\\end{thebibliography}' > wdbib.bbl\n"
+            'exit 2\n'
+        )
+        tex.chmod(0o755)
+        bibtex.chmod(0o755)
+        tx = wdbibtex.LaTeX(
+            bibtexcmd=str(bibtex),
+            texcmd=str(tex),
+            workdir=str(tmp_path),
+        )
+        tx.set_bibliographystyle('unsrt')
+        tx.write('Test contents', bib='library')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            tx.build()
+        assert tx.build_summary[1]['returncode'] == 2
+        assert tx.build_summary[1]['warnings'] == [
+            'I found no \\citation commands'
+        ]
+        tx.read_bbl()
+        assert tx.thebibliography == ''
+
+    def test_summary(self, tmp_path):
+        tex = tmp_path / 'fakelatex'
+        tex.write_text(
+            '#!/bin/sh\n'
+            'echo "LaTeX Font Warning: Some font shapes were not available"\n'
+            'echo "LaTeX Warning: Citation \\`key1\' undefined." > wdbib.log\n'
+        )
+        bibtex = tmp_path / 'fakebibtex'
+        bibtex.write_text(
+            '#!/bin/sh\n'
+            'echo "Warning--empty journal in key1" > wdbib.blg\n'
+            'exit 1\n'
+        )
+        tex.chmod(0o755)
+        bibtex.chmod(0o755)
+        tx = wdbibtex.LaTeX(
+            bibtexcmd=str(bibtex),
+            texcmd=str(tex),
+            workdir=str(tmp_path),
+        )
+        tx.set_bibliographystyle('unsrt')
+        tx.write('\\cite{key1}', bib='library')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with pytest.raises(wdbibtex.MissingCitationError):
+                tx.build()
+        summary = tx.build_summary
+        assert [r['step'] for r in summary] == [
+            'latex pass 1', 'bibtex', 'latex pass 2', 'latex pass 3'
+        ]
+        assert summary[1]['returncode'] == 1
+        assert summary[1]['warnings'] == ['empty journal in key1']
+        assert summary[-1]['missing'] == ['key1']
+        assert summary[0]['output'] == tmp_path / 'latex-pass-1.out'
+        assert 'Font Warning' in summary[0]['output'].read_text()
+        assert format_summary(summary).splitlines()[-2:] == [
+            'warning: bibtex: empty journal in key1',
+            'undefined citation: key1',
+        ]
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import pytest
+import stat
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+from wdbibtex.text import _segments  # noqa E402
+
+
+class TestSegments:
+
+    def test_preamble_is_removed_with_its_line_ending(self):
+        segments = list(_segments([
+            'Head \\begin{preamble}\\usepackage{cite}\n',
+            '\\end{preamble}\r\n',
+            'Body\n',
+        ]))
+        assert segments == [
+            ('text', 'Head '),
+            ('preamble', '\\usepackage{cite}\n'),
+            ('text', 'Body\n'),
+        ]
+
+    def test_fenced_code_is_verbatim(self):
+        segments = list(_segments([
+            '```latex\n',
+            '\\cite{a}\n',
+            '~~~\n',
+            '````\n',
+            '\\cite{b}\n',
+        ], markdown=True))
+        assert [k for k, _ in segments] == [
+            'verbatim', 'verbatim', 'verbatim', 'verbatim', 'text'
+        ]
+
+    @pytest.mark.parametrize('lines', [
+        ['\\begin{preamble}\n'],
+        ['\\end{preamble}\n'],
+        ['\\begin{preamble}\\end{preamble}\n', '\\begin{preamble}\n'],
+    ])
+    def test_unpaired_preamble(self, lines):
+        with pytest.raises(ValueError):
+            list(_segments(lines))
+
+
+class TestTextBibTeX:
+
+    def test_warm_build(self, tmp_path):
+        (tmp_path / 'report.md').write_text(
+            '\\begin{preamble}\n'
+            '\\bibliographystyle{unsrt}\n'
+            '\\end{preamble}\n'
+            '# Report\n'
+            'See \\cite{a} and \\cite{b,a}.\n'
+            '```\n'
+            '\\cite{c}\n'
+            '```\n'
+            '## References\n'
+            '\\thebibliography\n'
+        )
+        (tmp_path / 'report.md').chmod(0o644)
+        sources = {}
+        for name, text in [
+            ('library.bib', '@misc{a}\n@misc{b}\n'),
+            ('unsrt.bst', 'ENTRY {} {} {}\n'),
+        ]:
+            (tmp_path / name).write_text(text)
+            sources[name] = hashlib.sha1(text.encode()).hexdigest()
+        tb = wdbibtex.TextBibTeX(tmp_path / 'report.md')
+        preamble = tb.read_preamble()
+        assert preamble == '\n\\bibliographystyle{unsrt}\n'
+        tx = wdbibtex.LaTeX(workdir=str(tmp_path))
+        tx.preamble = preamble
+        result = wdbibtex.BuildResult(
+            {'a': 1, 'b': 2},
+            [('a', '1', 'A. Name.\n'), ('b', '2', 'B. Name.\n')],
+            bibliographystyle='unsrt',
+            preamble=tx.preamble,
+            citations=['\\cite{a}', '\\cite{b,a}'],
+            sources=sources,
+        )
+        tb.build(result=result)
+        assert tb.target_file == tmp_path / 'report_bib.md'
+        assert tb.target_file.read_text() == (
+            '# Report\n'
+            'See [1] and [2,1].\n'
+            '```\n'
+            '\\cite{c}\n'
+            '```\n'
+            '## References\n'
+            '[1] A. Name.\n'
+            '\n'
+            '[2] B. Name.\n'
+        )
+        if os.name == 'posix':
+            assert stat.S_IMODE(tb.target_file.stat().st_mode) == 0o644
+        assert set(tb.build_stats) == {'scan', 'tex', 'replace', 'total'}
+        assert tb.build_summary == []
+        assert [p.name for p in tmp_path.iterdir() if p.name[0] == '.'] == [
+            '.tmp'
+        ]
+
+    def test_two_styles_are_rejected(self, tmp_path):
+        (tmp_path / 'report.txt').write_text('See \\cite{a}.\n')
+        result = wdbibtex.BuildResult({'a': 1}, [])
+        tb = wdbibtex.TextBibTeX(tmp_path / 'report.txt')
+        with pytest.raises(ValueError):
+            tb.build(bst='unsrt,ieeetr', result=result)
+        assert not tb.target_file.exists()
+
+    def test_textual_citation_is_rejected_before_build(self, tmp_path):
+        (tmp_path / 'report.txt').write_text(
+            'See \\cite{a}.\r\nAs \\citet{b} shows,\r\n\\citet{c}.\r\n'
+        )
+        tb = wdbibtex.TextBibTeX(tmp_path / 'report.txt')
+        with pytest.raises(ValueError, match=r'\\citet\{b\} on line 2\.'):
+            tb.build()
+        assert not (tmp_path / '.tmp').exists()
+        assert not tb.target_file.exists()
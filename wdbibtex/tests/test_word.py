@@ -0,0 +1,681 @@
+import atexit
+import json
+import locale
+import os
+import pathlib
+import pytest
+import re
+import sys
+import types
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import wdbibtex  # noqa E402
+from wdbibtex.word import _source_id  # noqa E402
+
+
+class TestWdBibTeX:
+
+    def test_close_clears_unopened(self, tmp_path):
+        wb = wdbibtex.WdBibTeX(tmp_path / 'a.docx')
+        (wb.workdir / 'sub').mkdir(parents=True)
+        wb.close(clear=True)
+        assert not wb.workdir.exists()
+        wb.close(clear=True)
+
+    def test_close_emits_trace_on_failure(self, tmp_path):
+        class Document:
+            def Save(self):
+                raise OSError('Disk full')
+
+            def Close(self, SaveChanges=0):
+                pass
+
+        emitted = []
+        trace = types.SimpleNamespace(emit=lambda: emitted.append(True))
+        wb = wdbibtex.WdBibTeX(tmp_path / 'a.docx', trace=trace)
+        wb._WdBibTeX__ap = FakeApp()
+        wb._WdBibTeX__dc = Document()
+        with pytest.raises(OSError):
+            wb.close()
+        assert emitted == [True]
+
+    def test_style_files_are_exported(self, tmp_path):
+        class Document:
+            def __init__(self, calls):
+                self.calls = calls
+                self.TablesOfContents = []
+
+            def SaveAs2(self, fn, fmt):
+                self.calls.append(('pdf', os.path.basename(fn)))
+
+            def Close(self, SaveChanges=0):
+                self.calls.append(('close', SaveChanges))
+
+        calls = []
+        app = types.SimpleNamespace(Documents=types.SimpleNamespace(
+            Open=lambda fn: Document(calls)
+        ))
+        wb = wdbibtex.WdBibTeX(tmp_path / 'a.docx')
+        wb._WdBibTeX__ap = app
+        wb._WdBibTeX__dc = Document(calls)
+        wb._WdBibTeX__target_files = [
+            wb.style_file('unsrt'), wb.style_file('ieeetr')
+        ]
+        wb._WdBibTeX__target_file = wb.style_file('unsrt')
+        wb.updatetoc()
+        wb.exportpdf()
+        assert calls == [
+            ('close', -1),
+            ('pdf', 'a_bib_unsrt.pdf'),
+            ('pdf', 'a_bib_ieeetr.pdf'),
+            ('close', 0),
+        ]
+        wb._WdBibTeX__ap = None
+
+
+class FakeWdBibTeX:
+
+    def __init__(self, tmp_path, fail=False):
+        self.result_file = tmp_path / 'a.wdbib.json'
+        self.calls = []
+        self.fail = fail
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.calls.append(('exit', exc_type is None))
+
+    def build(self, **kwargs):
+        self.calls.append(('build', kwargs['bst'], kwargs['result']))
+        if self.fail:
+            raise ValueError('Build failed.')
+
+    def updatetoc(self):
+        self.calls.append(('updatetoc',))
+
+    def close(self, clear=False, save=True):
+        self.calls.append(('close', clear))
+
+
+class TestRunBuild:
+
+    def test_phases(self, tmp_path):
+        wb = FakeWdBibTeX(tmp_path)
+        phases = []
+        wdbibtex.word._run_build(
+            wb,
+            {'bst': 'unsrt', 'updatetoc': True, 'warm_start': True},
+            lambda phase, seconds: phases.append(phase),
+        )
+        assert wb.calls == [
+            ('build', 'unsrt', None),
+            ('updatetoc',),
+            ('close', True),
+            ('exit', True),
+        ]
+        assert phases == ['build', 'updatetoc', 'close']
+
+    def test_failed_build_is_not_saved(self, tmp_path):
+        wb = FakeWdBibTeX(tmp_path, fail=True)
+        with pytest.raises(ValueError):
+            wdbibtex.word._run_build(wb, {'keeptexdir': True})
+        assert wb.calls == [('build', None, None), ('exit', False)]
+
+
+class FakeApp:
+
+    class Documents:
+        Count = 0
+
+    def Quit(self, SaveChanges=0):
+        pass
+
+
+class TestWordPool:
+
+    @pytest.fixture(autouse=True)
+    def win32com(self, monkeypatch):
+        client = types.SimpleNamespace(DispatchEx=lambda name: FakeApp())
+        monkeypatch.setitem(
+            sys.modules, 'win32com', types.SimpleNamespace(client=client)
+        )
+        monkeypatch.setitem(sys.modules, 'win32com.client', client)
+
+    def test_exhausted_pool_raises(self):
+        with wdbibtex.WordPool(size=1) as pool:
+            ap = pool.acquire()
+            with pytest.raises(RuntimeError):
+                pool.acquire()
+            with pytest.raises(TimeoutError):
+                pool.acquire(timeout=0.01)
+            pool.release(ap)
+            assert pool.acquire() is ap
+
+    def test_shutdown_unregisters(self, monkeypatch):
+        unregistered = []
+        monkeypatch.setattr(atexit, 'unregister', unregistered.append)
+        pool = wdbibtex.WordPool()
+        pool.shutdown()
+        assert unregistered == [pool.shutdown]
+
+
+class FakeRange:
+    """Range of a story of FakeDocument, as Word.Range."""
+
+    def __init__(self, story, start, end):
+        self.story = story
+        self._start = start
+        self._end = end
+
+    @property
+    def Start(self):
+        return self._start
+
+    @property
+    def End(self):
+        return self._end
+
+    @property
+    def Text(self):
+        return self.story.text[self.Start:self.End]
+
+    @Text.setter
+    def Text(self, text):
+        start = self.Start
+        self.story.edit(start, self.End, text)
+        self._start, self._end = start, start + len(text)
+
+    @property
+    def Duplicate(self):
+        return FakeRange(self.story, self.Start, self.End)
+
+    @property
+    def Find(self):
+        return FakeFind(self)
+
+    @property
+    def Font(self):
+        return FakeFont(self)
+
+    @property
+    def ContentControls(self):
+        return FakeContentControls(self)
+
+    def SetRange(self, start, end):
+        self._start, self._end = start, end
+
+    def Collapse(self, direction):
+        self._start = self._end
+
+    def Delete(self):
+        self.Text = ''
+
+    def InsertAfter(self, text):
+        end = self.End
+        self.story.edit(end, end, text)
+        self._end = end + len(text)
+
+    def InsertXML(self, xml):
+        self.Text = xml
+
+
+class FakeStory(FakeRange):
+    """Story range whose end follows the text."""
+
+    def __init__(self, story_type, text):
+        super().__init__(self, 0, None)
+        self.StoryType = story_type
+        self.NextStoryRange = None
+        self.text = text
+        self.controls = []
+        self.superscripts = []
+
+    @property
+    def End(self):
+        return len(self.text)
+
+    def edit(self, start, end, text):
+        """Replace text, moving content controls after the place."""
+        self.text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - (end - start)
+        for cc in self.controls:
+            if cc.start >= end and cc.start > start:
+                cc.start += delta
+                cc.end += delta
+            elif cc.start <= start and cc.end >= end:
+                cc.end += delta
+
+
+class FakeFont:
+
+    def __init__(self, rng):
+        self.__dict__['rng'] = rng
+
+    def __setattr__(self, name, value):
+        if name == 'Superscript' and value:
+            self.rng.story.superscripts.append(self.rng.Text)
+
+
+class FakeFind:
+    """Range.Find with a subset of Word wildcards."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.MatchFuzzy = True
+
+    def ClearFormatting(self):
+        pass
+
+    def Execute(
+            self, text, case, whole, wildcards, sounds, forms, forward, wrap,
+            fmt=False, replace_with='', replace=0,
+    ):
+        pattern = _wildcard(text) if wildcards else re.escape(text)
+        regex = re.compile(pattern, re.DOTALL | (0 if case else re.I))
+        rng = self.rng
+        story = rng.story
+        end = story.End if rng.Start == rng.End else rng.End
+        if replace == 2:  # wdReplaceAll
+            found = list(regex.finditer(story.text, rng.Start, end))
+            for m in reversed(found):
+                story.edit(m.start(), m.end(), replace_with)
+            return bool(found)
+        m = regex.search(story.text, rng.Start, end)
+        if m is None:
+            return False
+        rng.SetRange(m.start(), m.end())
+        return True
+
+
+def _wildcard(text):
+    """Regular expression of Word wildcards used by WdBibTeX."""
+    pattern = ''
+    i = 0
+    while i < len(text):
+        if text[i] == '\\':
+            pattern += re.escape(text[i + 1])
+            i += 2
+        elif text.startswith('^13', i):
+            pattern += '\r'
+            i += 3
+        elif text[i] == '*':
+            pattern += '.*?'
+            i += 1
+        else:
+            pattern += re.escape(text[i])
+            i += 1
+    return pattern
+
+
+class FakeContentControl:
+
+    def __init__(self, story, start, end, tag=''):
+        self.story = story
+        self.start = start
+        self.end = end
+        self.Tag = tag
+
+    @property
+    def Range(self):
+        return FakeControlRange(self)
+
+
+class FakeControlRange(FakeRange):
+    """Range of a content control, which follows the control."""
+
+    def __init__(self, cc):
+        super().__init__(cc.story, cc.start, cc.end)
+        self.cc = cc
+
+    @property
+    def Start(self):
+        return self.cc.start
+
+    @property
+    def End(self):
+        return self.cc.end
+
+    @FakeRange.Text.setter
+    def Text(self, text):
+        self.story.edit(self.Start, self.End, text)
+
+
+class FakeContentControls:
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def __iter__(self):
+        return iter(list(self.rng.story.controls))
+
+    def Add(self, kind):
+        cc = FakeContentControl(self.rng.story, self.rng.Start, self.rng.End)
+        self.rng.story.controls.append(cc)
+        return cc
+
+
+class FakeVariables:
+
+    def __init__(self, values):
+        self.values = dict(values)
+
+    def __iter__(self):
+        return iter([
+            FakeVariable(self.values, name) for name in list(self.values)
+        ])
+
+    def Add(self, name, value):
+        self.values[name] = value
+
+
+class FakeVariable:
+
+    def __init__(self, values, name):
+        self.__dict__.update(values=values, Name=name)
+
+    @property
+    def Value(self):
+        return self.values[self.Name]
+
+    def __setattr__(self, name, value):
+        self.values[self.Name] = value
+
+
+class FakeDocument:
+    """Word document stored as JSON of its stories and variables."""
+
+    def __init__(self, app, path):
+        self.app = app
+        self.path = pathlib.Path(path)
+        self.Path = str(self.path.parent)
+        self.Name = self.path.name
+        self.TablesOfContents = []
+        data = json.loads(self.path.read_text())
+        self.StoryRanges = []
+        for story_type, text, controls in data['stories']:
+            story = FakeStory(story_type, text)
+            story.controls = [
+                FakeContentControl(story, *c) for c in controls
+            ]
+            self.StoryRanges.append(story)
+        self.Variables = FakeVariables(data['variables'])
+
+    def Sections(self, i):
+        header = types.SimpleNamespace(
+            Range=types.SimpleNamespace(StoryType=7)
+        )
+        return types.SimpleNamespace(Headers=lambda i: header)
+
+    def Save(self):
+        write_document(
+            self.path,
+            [
+                (
+                    s.StoryType,
+                    s.text,
+                    [(c.start, c.end, c.Tag) for c in s.controls],
+                )
+                for s in self.StoryRanges
+            ],
+            self.Variables.values,
+        )
+
+    def Close(self, SaveChanges=0):
+        if SaveChanges == -1:
+            self.Save()
+        self.app.documents.remove(self)
+
+
+class FakeWord:
+    """Word application opening FakeDocument files."""
+
+    def __init__(self):
+        self.documents = []
+        self.Documents = self
+        self.Visible = False
+
+    def Open(self, path):
+        dc = FakeDocument(self, path)
+        self.documents.append(dc)
+        return dc
+
+    def __iter__(self):
+        return iter(list(self.documents))
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def Count(self):
+        return len(self.documents)
+
+    def Quit(self, SaveChanges=0):
+        pass
+
+
+def write_document(path, stories, variables=None):
+    """Write a FakeDocument file of (type, text, controls) stories."""
+    pathlib.Path(path).write_text(json.dumps(
+        {'stories': stories, 'variables': variables or {}}
+    ))
+
+
+def read_document(path):
+    """Returns stories of a FakeDocument file."""
+    return json.loads(pathlib.Path(path).read_text())
+
+
+# Fake LaTeX writing .aux of the \cite lines of wdbib.tex and
+# \bibcite of the entries of wdbib.bbl in order.
+FAKE_LATEX = r'''
+import re
+with open('runs.log', 'a') as f:
+    f.write('latex\n')
+tex = open('wdbib.tex').read()
+aux = ['\\citation{%s}' % k for k in re.findall(
+    r'^\\cite\{(.*)\}$', tex, re.M)]
+aux += ['\\bibstyle{%s}' % s for s in re.findall(
+    r'^\\bibliographystyle\{(.*)\}$', tex, re.M)]
+aux += ['\\bibdata{%s}' % s for s in re.findall(
+    r'^\\bibliography\{(.*)\}$', tex, re.M)]
+try:
+    bbl = open('wdbib.bbl').read()
+except FileNotFoundError:
+    bbl = ''
+for i, k in enumerate(re.findall(r'^\\bibitem\{(.*)\}$', bbl, re.M)):
+    aux.append('\\bibcite{%s}{%d}' % (k, i + 1))
+open('wdbib.aux', 'w').write('\n'.join(aux) + '\n')
+open('wdbib.log', 'w').close()
+'''
+
+# Fake BibTeX writing an entry per cited key in order of citation,
+# or in reverse order for ieeetr to tell styles apart.
+FAKE_BIBTEX = r'''
+import re
+import sys
+with open('runs.log', 'a') as f:
+    f.write('bibtex\n')
+base = sys.argv[-1]
+aux = open(base + '.aux').read()
+keys = []
+for c in re.findall(r'^\\citation\{(.*)\}$', aux, re.M):
+    keys.extend(k for k in c.split(',') if k not in keys)
+if '\\bibstyle{ieeetr}' in aux:
+    keys.reverse()
+bbl = '\\begin{thebibliography}{9}\n'
+for k in keys:
+    bbl += '\n\\bibitem{%s}\nEntry %s.\n' % (k, k)
+open(base + '.bbl', 'w').write(bbl + '\n\\end{thebibliography}\n')
+with open(base + '.blg', 'w') as f:
+    if not keys:
+        f.write('I found no \\citation commands---while reading file '
+                + base + '.aux\n(There was 1 error message)\n')
+        sys.exit(2)
+'''
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses fake commands')
+class TestBuild:
+    """Builds of FakeDocument files by fake Word, LaTeX and BibTeX."""
+
+    def test_only_footnote_citations(self, docdir):
+        write_document(docdir / 'a.docx', [
+            (1, 'Body.\r\\thebibliography\r', []),
+            (2, 'Note \\cite{k1}.\r', []),  # 2: wdFootnotesStory
+        ])
+        wb = wdbibtex.WdBibTeX(docdir / 'a.docx')
+        with wb:
+            wb.build(bst='unsrt')
+        # No speculative build of the main text without citations.
+        assert runs(wb) == ['latex', 'bibtex', 'latex', 'latex']
+        assert wb.build_stats['tex_reruns'] == 0
+        assert stories(wb.target_file) == [
+            'Body.\r[1]\tEntry k1.\n\r', 'Note [1].\r'
+        ]
+
+    def test_citations_in_all_stories(self, docdir):
+        write_document(docdir / 'a.docx', [
+            (1, 'A \\cite{k1}, \\citep[p.~2]{k2}.\r\\thebibliography\r', []),
+            (2, 'Note \\cite{k2,k3}.\r', []),  # 2: wdFootnotesStory
+            (5, 'Frame \\cite{k1}.\r', []),  # 5: wdTextFrameStory
+        ])
+        wb = wdbibtex.WdBibTeX(docdir / 'a.docx')
+        with wb:
+            wb.build(bst='unsrt')
+        # The footnote cites k3 not built from the main text.
+        assert runs(wb).count('bibtex') == 2
+        assert wb.build_stats['tex_reruns'] == 1
+        assert stories(wb.target_file) == [
+            'A [1], [2, p. 2].\r'
+            '[1]\tEntry k1.\n[2]\tEntry k2.\n[3]\tEntry k3.\n\r',
+            'Note [2,3].\r',
+            'Frame [1].\r',
+        ]
+        # The original document is not changed.
+        assert stories(docdir / 'a.docx')[2] == 'Frame \\cite{k1}.\r'
+
+    @pytest.mark.parametrize('story_type, text, location', [
+        (1, 'As \\citet{k1} shows.\r', 'character 3 of the main text'),
+        (2, 'See \\textcite{k1}.\r', 'character 4 of the footnotes'),
+    ])
+    def test_textual_citation_is_rejected_at_scan(
+            self, docdir, story_type, text, location,
+    ):
+        if story_type == 1:
+            write_document(docdir / 'a.docx', [(1, text, [])])
+        else:
+            write_document(docdir / 'a.docx', [
+                (1, 'A \\cite{k1}.\r', []), (story_type, text, []),
+            ])
+        wb = wdbibtex.WdBibTeX(docdir / 'a.docx')
+        with pytest.raises(ValueError, match=location):
+            with wb:
+                wb.build(bst='unsrt')
+        if story_type == 1:
+            # Rejected before LaTeX runs.
+            assert not (wb.workdir / 'runs.log').exists()
+        assert stories(wb.target_file) == stories(docdir / 'a.docx')
+
+    def test_tracked_incremental_build(self, docdir):
+        write_document(docdir / 'a.docx', [
+            (1, 'A \\cite{k1}, \\cite{k2}.\r\\thebibliography\r', []),
+            (2, 'Note \\cite{k2}.\r', []),
+        ])
+        wb = wdbibtex.WdBibTeX(docdir / 'a.docx', track=True)
+        with wb:
+            wb.build(bst='unsrt')
+        doc = read_document(wb.target_file)
+        main, note = [sorted(controls) for _, _, controls in doc['stories']]
+        assert [tag for *_, tag in main] == [
+            'wdbibtex:' + _source_id('\\cite{k1}'),
+            'wdbibtex:' + _source_id('\\cite{k2}'),
+            'wdbibtex:\\thebibliography',
+        ]
+        assert doc['variables']['wdbibtex-source-' + _source_id(
+            '\\cite{k2}'
+        )] == '\\cite{k2}'
+        assert [tag for *_, tag in note] == [main[1][2]]
+
+        # Cite k3 before the tracked citations and rebuild the target.
+        doc['stories'][0][1] = '\\cite{k3} ' + doc['stories'][0][1]
+        for c in main:
+            c[0] += 10
+            c[1] += 10
+        write_document(wb.target_file, doc['stories'], doc['variables'])
+        with wb:
+            wb.build(bst='unsrt', incremental=True)
+        assert stories(wb.target_file) == [
+            '[1] A [2], [3].\r'
+            '[1]\tEntry k3.\n[2]\tEntry k1.\n[3]\tEntry k2.\n\r',
+            'Note [3].\r',
+        ]
+        doc = read_document(wb.target_file)
+        assert len(doc['stories'][0][2]) == 4
+
+    def test_two_styles(self, docdir):
+        write_document(docdir / 'a.docx', [
+            (
+                1,
+                '\\begin{preamble}\r\\usepackage{cite}\r'
+                '\\end{preamble}\rA \\cite{k1,k2}.\r\\thebibliography\r',
+                [],
+            ),
+            (2, 'Note \\cite{k2}.\r', []),
+        ])
+        wb = wdbibtex.WdBibTeX(docdir / 'a.docx')
+        with wb:
+            wb.build(bst='unsrt,ieeetr')
+        assert [runs(wb, s).count('bibtex') for s in ['unsrt', 'ieeetr']] \
+            == [1, 1]
+        assert stories(wb.style_file('unsrt')) == [
+            'A [1,2].\r[1]\tEntry k1.\n[2]\tEntry k2.\n\r',
+            'Note [2].\r',
+        ]
+        # The fake ieeetr style reverses the order of entries.
+        assert stories(wb.style_file('ieeetr')) == [
+            'A [1,2].\r[1]\tEntry k2.\n[2]\tEntry k1.\n\r',
+            'Note [1].\r',
+        ]
+
+    @pytest.fixture(scope='function')
+    def docdir(self, tmp_path, monkeypatch):
+        return fake_office(tmp_path, monkeypatch)
+
+
+def fake_office(tmp_path, monkeypatch):
+    """Install fake Word, LaTeX and BibTeX, and returns document directory.
+
+    The directory has library.bib citing k1. LaTeX and BibTeX commands
+    log their runs to runs.log in the working directory.
+    """
+    word = FakeWord()
+    client = types.SimpleNamespace(
+        Dispatch=lambda name: word, DispatchEx=lambda name: word
+    )
+    monkeypatch.setitem(
+        sys.modules, 'win32com', types.SimpleNamespace(client=client)
+    )
+    monkeypatch.setitem(sys.modules, 'win32com.client', client)
+    monkeypatch.setattr(locale, 'getlocale', lambda: ('en_US', 'UTF-8'))
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    for name, script in [('latex', FAKE_LATEX), ('bibtex', FAKE_BIBTEX)]:
+        (bindir / name).write_text('#!%s\n%s' % (sys.executable, script))
+        (bindir / name).chmod(0o755)
+    monkeypatch.setenv('PATH', str(bindir) + os.pathsep + os.environ['PATH'])
+    docdir = tmp_path / 'doc'
+    docdir.mkdir()
+    (docdir / 'library.bib').write_text('@misc{k1}\n')
+    return docdir
+
+
+def runs(wb, style=''):
+    """Returns commands run in the working directory of a build."""
+    return (wb.workdir / style / 'runs.log').read_text().split()
+
+
+def stories(path):
+    """Returns texts of the stories of a FakeDocument file."""
+    return [text for _, text, _ in read_document(path)['stories']]
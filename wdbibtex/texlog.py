@@ -0,0 +1,392 @@
+import codecs
+import collections
+import re
+import warnings
+
+
+class TeXError(RuntimeError):
+    """Error of a LaTeX or BibTeX step.
+
+    Parameters
+    ----------
+    message : str
+        Error message.
+    step : str or None, default None
+        Failed step such as 'latex pass 1' or 'bibtex'.
+    log : str, path object or None, default None
+        Log file of the step.
+    messages : list of str or None, default None
+        Error messages found in the log.
+
+    Attributes
+    ----------
+    step : str or None
+        Failed step.
+    log : str, path object or None
+        Log file of the step.
+    messages : list of str
+        Error messages found in the log.
+    """
+
+    def __init__(self, message, step=None, log=None, messages=None):
+        if step is not None:
+            message = '%s: %s' % (step, message)
+        super().__init__(message)
+        self.step = step
+        self.log = log
+        self.messages = list(messages or [])
+
+
+class LaTeXError(TeXError):
+    """Error reported by LaTeX, e.g. undefined control sequence."""
+
+
+class BibTeXError(TeXError):
+    """Error reported by BibTeX, e.g. missing style or database file."""
+
+
+class TeXCapacityError(TeXError):
+    """LaTeX or BibTeX exceeded its capacity."""
+
+
+class TeXTimeoutError(TeXError):
+    """LaTeX or BibTeX step did not finish within the timeout."""
+
+
+class MissingCitationError(TeXError):
+    """Cited keys are not found in the bibliography database.
+
+    Attributes
+    ----------
+    keys : list of str
+        Missing citation keys in order of appearance.
+    """
+
+    def __init__(self, keys, step=None, log=None):
+        self.keys = list(keys)
+        super().__init__(
+            'Citation keys not found: %s' % ', '.join(self.keys),
+            step=step,
+            log=log,
+            messages=[],
+        )
+
+
+class TeXWarning(UserWarning):
+    """Warning reported by LaTeX or BibTeX."""
+
+
+# Result of parsing a log file.
+LogReport = collections.namedtuple(
+    'LogReport', ['errors', 'warnings', 'missing', 'capacity']
+)
+
+# TeX wraps log lines at this length.
+_MAX_PRINT_LINE = 79
+
+_TEX_ERROR = re.compile(
+    r'^(?:! (?P<msg>.+)'
+    r'|(?:[A-Za-z]:)?[^:\n]+:\d+: (?P<filemsg>.+))$',
+    re.MULTILINE,
+)
+_TEX_UNDEFINED = re.compile(
+    r"Citation [`'](?P<key>[^']+)' (?:on page \d+ )?undefined"
+)
+_TEX_WARNING = re.compile(
+    r'^(?:LaTeX|Package \S+) Warning: (?P<msg>.+)$', re.MULTILINE
+)
+# Warnings which only mean another pass is needed.
+_TEX_RERUN = re.compile(
+    r'Citation .* undefined|There were undefined|Rerun|may have changed'
+)
+
+_BLG_MISSING = re.compile(
+    r'^Warning--I didn\'t find a database entry for "(?P<key>[^"]+)"',
+    re.MULTILINE,
+)
+_BLG_CAPACITY = re.compile(
+    r"^Sorry---you've exceeded BibTeX's (?P<msg>.+)$", re.MULTILINE
+)
+_BLG_ERROR = re.compile(
+    r"^(?P<msg>I couldn't open .+|I found no \\(?:bibstyle|bibdata) .+"
+    r"|.+---line \d+ of file .+|.+---this can't happen.*)$",
+    re.MULTILINE,
+)
+_BLG_WARNING = re.compile(r'^Warning--(?P<msg>.+)$', re.MULTILINE)
+# BibTeX counts an .aux file without citations as an error.
+_BLG_NO_CITATION = re.compile(
+    r'^(?P<msg>I found no \\citation commands)---', re.MULTILINE
+)
+_BLG_ERROR_COUNT = re.compile(
+    r'^\(There (?:was|were) (?P<count>\d+) error messages?\)$',
+    re.MULTILINE,
+)
+
+
+def _unwrap(text):
+    """Join log lines wrapped by TeX at max_print_line."""
+    lines = text.split('\n')
+    joined = []
+    buf = ''
+    for ln in lines:
+        buf += ln
+        if len(ln) != _MAX_PRINT_LINE:
+            joined.append(buf)
+            buf = ''
+    if buf:
+        joined.append(buf)
+    return '\n'.join(joined)
+
+
+def parse_latex_log(text):
+    r"""Parse LaTeX .log text.
+
+    Parameters
+    ----------
+    text : str
+        Contents of .log file.
+
+    Returns
+    -------
+    LogReport
+        Errors, warnings other than rerun requests, undefined citation
+        keys and whether capacity was exceeded.
+
+    Examples
+    --------
+    >>> from wdbibtex.texlog import parse_latex_log
+    >>> parse_latex_log(
+    ...     "LaTeX Warning: Citation `key1' on page 1 undefined on input line 5.\n"
+    ...     "./wdbib.tex:7: Undefined control sequence.\n"
+    ... )
+    LogReport(errors=['Undefined control sequence.'], warnings=[], missing=['key1'], capacity=False)
+    """  # noqa E501
+    text = _unwrap(text)
+    errors = [
+        m.group('msg') or m.group('filemsg')
+        for m in _TEX_ERROR.finditer(text)
+    ]
+    found = []
+    for m in _TEX_UNDEFINED.finditer(text):
+        if m.group('key') not in found:
+            found.append(m.group('key'))
+    tex_warnings = [
+        m.group('msg') for m in _TEX_WARNING.finditer(text)
+        if not _TEX_RERUN.search(m.group('msg'))
+    ]
+    return LogReport(
+        errors,
+        tex_warnings,
+        found,
+        any('TeX capacity exceeded' in e for e in errors),
+    )
+
+
+def parse_blg(text):
+    r"""Parse BibTeX .blg text.
+
+    Parameters
+    ----------
+    text : str
+        Contents of .blg file.
+
+    Returns
+    -------
+    LogReport
+        Errors, warnings, citation keys not found in the database
+        and whether capacity was exceeded.
+
+    Examples
+    --------
+    >>> from wdbibtex.texlog import parse_blg
+    >>> parse_blg(
+    ...     "I couldn't open style file nostyle.bst\n"
+    ...     "Warning--I didn't find a database entry for \"key1\"\n"
+    ...     "Warning--empty journal in key2\n"
+    ... )
+    LogReport(errors=["I couldn't open style file nostyle.bst"], warnings=['empty journal in key2'], missing=['key1'], capacity=False)
+    """  # noqa E501
+    found = []
+    for m in _BLG_MISSING.finditer(text):
+        if m.group('key') not in found:
+            found.append(m.group('key'))
+    capacity = [m.group('msg') for m in _BLG_CAPACITY.finditer(text)]
+    errors = capacity + [m.group('msg') for m in _BLG_ERROR.finditer(text)]
+    blg_warnings = [
+        m.group('msg') for m in _BLG_WARNING.finditer(text)
+        if not _BLG_MISSING.match(m.group(0))
+    ] + [m.group('msg') for m in _BLG_NO_CITATION.finditer(text)]
+    return LogReport(errors, blg_warnings, found, bool(capacity))
+
+
+def check_latex_log(log, step='latex', returncode=0, final=False):
+    """Raise on fatal errors in LaTeX .log file.
+
+    Undefined citations are expected before BibTeX runs,
+    so they are errors only in the final pass.
+    Warnings are issued as TeXWarning in the final pass.
+
+    Parameters
+    ----------
+    log : path object
+        LaTeX .log file.
+    step : str, default 'latex'
+        Name of the step for messages.
+    returncode : int, default 0
+        Exit status of LaTeX command.
+    final : bool, default False
+        If True, the log is of the final pass.
+
+    Returns
+    -------
+    LogReport
+        Parsed log. Empty if the log does not exist.
+
+    Raises
+    ------
+    TeXCapacityError
+        If TeX capacity is exceeded.
+    LaTeXError
+        If LaTeX reported errors or exited with non-zero status.
+    MissingCitationError
+        If citations are undefined in the final pass.
+    """
+    if not log.exists():
+        if returncode != 0:
+            raise LaTeXError(
+                'exited with status %d without log' % returncode, step=step
+            )
+        return LogReport([], [], [], False)
+    with codecs.open(log, 'r', 'utf-8', errors='replace') as f:
+        report = parse_latex_log(f.read())
+    if report.capacity:
+        raise TeXCapacityError(
+            report.errors[0], step=step, log=log, messages=report.errors
+        )
+    if report.errors:
+        raise LaTeXError(
+            report.errors[0], step=step, log=log, messages=report.errors
+        )
+    if returncode != 0:
+        raise LaTeXError(
+            'exited with status %d' % returncode, step=step, log=log
+        )
+    if final:
+        if report.missing:
+            raise MissingCitationError(report.missing, step=step, log=log)
+        for w in report.warnings:
+            warnings.warn('%s: %s' % (step, w), TeXWarning)
+    return report
+
+
+def check_blg(blg, step='bibtex', returncode=0):
+    """Raise on fatal errors in BibTeX .blg file.
+
+    Parameters
+    ----------
+    blg : path object
+        BibTeX .blg file.
+    step : str, default 'bibtex'
+        Name of the step for messages.
+    returncode : int, default 0
+        Exit status of BibTeX command.
+        Status 1 only means warnings. Status 2 of a document
+        without citations is a warning too.
+
+    Returns
+    -------
+    LogReport
+        Parsed log. Empty if the log does not exist.
+
+    Raises
+    ------
+    TeXCapacityError
+        If BibTeX capacity is exceeded.
+    BibTeXError
+        If BibTeX reported errors or exited with error status.
+    MissingCitationError
+        If cited keys are not found in the database.
+    """
+    if not blg.exists():
+        if returncode != 0:
+            raise BibTeXError(
+                'exited with status %d without log' % returncode, step=step
+            )
+        return LogReport([], [], [], False)
+    with codecs.open(blg, 'r', 'utf-8', errors='replace') as f:
+        text = f.read()
+    report = parse_blg(text)
+    count = _BLG_ERROR_COUNT.search(text)
+    if (
+        returncode == 2
+        and _BLG_NO_CITATION.search(text)
+        and count is not None
+        and count.group('count') == '1'
+    ):
+        # The only error is that nothing is cited.
+        returncode = 1
+    if report.capacity:
+        raise TeXCapacityError(
+            report.errors[0], step=step, log=blg, messages=report.errors
+        )
+    if report.errors:
+        raise BibTeXError(
+            report.errors[0], step=step, log=blg, messages=report.errors
+        )
+    if returncode > 1:
+        raise BibTeXError(
+            'exited with status %d' % returncode, step=step, log=blg
+        )
+    if report.missing:
+        raise MissingCitationError(report.missing, step=step, log=blg)
+    for w in report.warnings:
+        warnings.warn('%s: %s' % (step, w), TeXWarning)
+    return report
+
+
+def format_summary(summary):
+    """Format build summary as text lines.
+
+    Parameters
+    ----------
+    summary : list of dict
+        LaTeX.build_summary.
+
+    Returns
+    -------
+    str
+        One line of run time per step, followed by warnings
+        and undefined citations, each reported once.
+
+    Examples
+    --------
+    >>> from wdbibtex.texlog import format_summary
+    >>> print(format_summary([
+    ...     {'step': 'latex pass 1', 'seconds': 0.25, 'returncode': 0,
+    ...      'warnings': [], 'missing': ['key1'], 'output': None},
+    ...     {'step': 'bibtex', 'seconds': 0.05, 'returncode': 1,
+    ...      'warnings': ['empty journal in key2'], 'missing': [],
+    ...      'output': None},
+    ... ]), end='')
+    latex pass 1    0.250 s
+    bibtex          0.050 s  (status 1)
+    warning: bibtex: empty journal in key2
+    """
+    lines = []
+    seen = set()
+    messages = []
+    for r in summary:
+        line = '%-14s %6.3f s' % (r['step'], r['seconds'])
+        if r['returncode'] is None:
+            line += '  (not finished)'
+        elif r['returncode']:
+            line += '  (status %d)' % r['returncode']
+        lines.append(line)
+        for w in r['warnings']:
+            if w not in seen:
+                seen.add(w)
+                messages.append('warning: %s: %s' % (r['step'], w))
+    if summary:
+        for key in summary[-1]['missing']:
+            messages.append('undefined citation: %s' % key)
+    return ''.join(x + '\n' for x in lines + messages)
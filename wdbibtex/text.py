@@ -0,0 +1,468 @@
+import codecs
+import glob
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import time
+
+from .latex import LaTeX, parse_citations
+
+_PREAMBLE_BEGIN = '\\begin{preamble}'
+_PREAMBLE_END = '\\end{preamble}'
+_THEBIBLIOGRAPHY = '\\thebibliography'
+
+# Opening and closing lines of fenced code blocks of Markdown.
+_FENCE = re.compile(r' {0,3}(?P<fence>`{3,}|~{3,})')
+
+# Suffixes of files built by TextBibTeX instead of WdBibTeX.
+TEXT_SUFFIXES = ('.md', '.markdown', '.txt', '.text')
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+
+
+class TextBibTeX:
+    r"""BibTeX toolkit for plain text and Markdown files.
+
+    TextBibTeX is the counterpart of WdBibTeX for text files.
+    The file is read line by line twice, so that files much larger
+    than memory can be built. The first pass reads the preamble and
+    collects distinct citations, LaTeX and BibTeX run once,
+    and the second pass writes the target file, replacing citation
+    commands with citation labels and \thebibliography with
+    the bibliography text. The preamble is removed.
+
+    A citation command must be written in one line.
+    In Markdown files, fenced code blocks are copied as is.
+    Markdown bibliography entries are separated by blank lines,
+    so that each entry is a paragraph.
+
+    Parameters
+    ----------
+    file : str or path object
+        Target text file, e.g. report.md.
+    copy_suffix : str, default '_bib'
+        Appended text to the written file.
+        The original file is never modified.
+    workdir : str or path object, default '.tmp'
+        Working directory of latex process.
+        The working directory will be removed by TextBibTeX.clear().
+    encoding : str, default 'utf-8'
+        Encoding of the original and target files.
+    markdown : bool or None, default None
+        If True, the file is Markdown. If None,
+        files with .md or .markdown suffix are Markdown.
+
+    Examples
+    --------
+    >>> from wdbibtex import TextBibTeX
+    >>> tb = TextBibTeX('report.md')  # doctest: +SKIP
+    >>> tb.build(bst='unsrt')  # doctest: +SKIP
+    >>> tb.target_file  # doctest: +SKIP
+    PosixPath('.../report_bib.md')
+    """
+
+    def __init__(
+            self,
+            file,
+            copy_suffix='_bib',
+            workdir='.tmp',
+            encoding='utf-8',
+            markdown=None,
+    ):
+        """Constructor of TextBibTeX.
+        """
+        self.__origin_file = (pathlib.Path.cwd() / file).resolve()
+        self.__docdir = self.__origin_file.parent
+        self.__target_file = self.__docdir / (
+            str(self.__origin_file.stem)
+            + copy_suffix
+            + str(self.__origin_file.suffix)
+        )
+        self.__result_file = self.__docdir / (
+            str(self.__origin_file.stem) + '.wdbib.json'
+        )
+        self.__workdir = self.__docdir / workdir
+        self.__encoding = encoding
+        if markdown is None:
+            markdown = self.__origin_file.suffix.lower() in MARKDOWN_SUFFIXES
+        self.__markdown = markdown
+        self.__build_stats = {}
+        self.__latex = None
+
+    @property
+    def original_file(self):
+        """[Read only] Returns original text file.
+        """
+        return self.__origin_file
+
+    @property
+    def target_file(self):
+        """[Read only] Returns written text file.
+        """
+        return self.__target_file
+
+    @property
+    def result_file(self):
+        """[Read only] Returns build result file next to original file.
+
+        See TextBibTeX.build and BuildResult.
+        """
+        return self.__result_file
+
+    @property
+    def workdir(self):
+        """[Read only] Returns LaTeX working directory.
+        """
+        return self.__workdir
+
+    @property
+    def markdown(self):
+        """[Read only] Returns if the file is Markdown.
+        """
+        return self.__markdown
+
+    def clear(self):
+        """Clear auxiliary files on working directory.
+        """
+        shutil.rmtree(self.workdir)
+
+    def read_preamble(self):
+        r"""Read preamble contents if exists.
+
+        Contents between \begin{preamble} and \end{preamble}
+        are returned as WdBibTeX.read_preamble does.
+
+        Returns
+        -------
+        None or str
+            None if no preamble texts exists, str if preamble exists.
+
+        Raises
+        ------
+        ValueError
+            If only one of \begin{preamble} or \end{preamble} found in file.
+            Or, if two or more \begin{preamble} or \end{preamble} found.
+        """
+        preamble = None
+        with self.__open() as f:
+            for kind, text in _segments(f, self.__markdown):
+                if kind == 'preamble':
+                    preamble = (preamble or '') + text
+        if preamble is None:
+            return None
+        return preamble.replace('\r\n', '\n').replace('\r', '\n')
+
+    def build(
+            self,
+            bib=None,
+            bst=None,
+            precompile=False,
+            draftmode=False,
+            runner=None,
+            result=None,
+            save_result=False,
+            bibtex_shards=None,
+    ):
+        r"""Build text file with latex citations.
+
+        The original file is read twice. The first pass reads the
+        preamble and distinct citations, which are built by LaTeX and
+        BibTeX. The second pass writes the target file
+        with formatted citations and thebibliography.
+        Memory use does not depend on the size of the file,
+        but on the number of distinct citations.
+        The target file is replaced only after it is completely written.
+
+        A BuildResult of a previous build, e.g. loaded from result_file,
+        is used instead of running LaTeX if its preamble, bibliography
+        style, distinct citations in order and .bib and .bst files
+        are the same as the file's. See BuildResult.is_current.
+        With save_result, the result of the build is saved to result_file.
+
+        Parameters
+        ----------
+        bib : str or None, default None
+            Bibliography file to be used. If None, all .bib files placed in the same directory of target file will be used.
+        bst : str or None, default None
+            Bibliography style. If None, .bst file placed in the same directory of target file is used.
+        precompile : bool, default False
+            If True, load the preamble from a format file dumped once in workdir. See LaTeX.
+        draftmode : bool, default False
+            If True, run LaTeX passes without writing output files where supported. See LaTeX.
+        runner : Runner or None, default None
+            Runner of LaTeX and BibTeX commands with timeouts and resource limits.
+        result : BuildResult or None, default None
+            Result of a previous build to format citations without LaTeX.
+        save_result : bool, default False
+            If True, save the result of the build to result_file.
+        bibtex_shards : int or None, default None
+            If given, run BibTeX on this number of shards of cited keys in parallel. See LaTeX.
+
+        Raises
+        ------
+        ValueError
+            If two or more bibliography styles are given,
+            or the preamble is not paired,
+            or a textual citation such as \\citet is found.
+            Textual citations are rejected before LaTeX runs.
+        """  # noqa E501
+        if bst is not None and ',' in bst:
+            raise ValueError(
+                'Two or more bibliography styles are not supported '
+                'for text files.'
+            )
+        stats = {}
+        t_start = time.perf_counter()
+        preamble = None
+        # Distinct citations as (nocite, keys), in order of appearance.
+        citations = {}
+        lineno = 0
+
+        def numbered(lines):
+            # Segments do not span lines, so a segment is on the last line.
+            nonlocal lineno
+            for lineno, line in enumerate(lines, 1):
+                yield line
+
+        with self.__open() as f:
+            for kind, text in _segments(numbered(f), self.__markdown):
+                if kind == 'preamble':
+                    preamble = (preamble or '') + text
+                elif kind == 'text':
+                    for c in parse_citations(text):
+                        if c.textual:
+                            raise ValueError(
+                                'Textual citation \\%s cannot be formatted '
+                                'as a numeric label: %s on line %d.' % (
+                                    c.command, c.source, lineno
+                                )
+                            )
+                        if c.keys:
+                            citations[(c.command == 'nocite', c.keys)] = None
+        if preamble is not None:
+            preamble = preamble.replace('\r\n', '\n').replace('\r', '\n')
+        t_scanned = time.perf_counter()
+        stats['scan'] = t_scanned - t_start
+
+        os.makedirs(self.__workdir, exist_ok=True)
+        for b in glob.glob(os.path.join(self.__docdir, '*.bst')):
+            shutil.copy(b, self.__workdir)
+        for b in glob.glob(os.path.join(self.__docdir, '*.bib')):
+            shutil.copy(b, self.__workdir)
+        tx = LaTeX(
+            workdir=self.__workdir,
+            precompile=precompile,
+            draftmode=draftmode,
+            runner=runner,
+            bibtex_shards=bibtex_shards,
+        )
+        self.__latex = tx
+        tx.preamble = preamble
+        if bst:
+            # Overwrite preamble in the file with given argument.
+            tx.bibliographystyle = bst
+        else:
+            tx.bibliographystyle = tx.bibliographystyle
+
+        if bib is None:
+            # LaTeX.write looks for .bib files in cwd.
+            bib = ','.join(sorted(
+                os.path.splitext(os.path.basename(b))[0]
+                for b in glob.glob(os.path.join(self.__docdir, '*.bib'))
+            ))
+        cites = [
+            '\\%s{%s}' % ('nocite' if nocite else 'cite', ','.join(ks))
+            for nocite, ks in citations
+        ]
+        if result is not None and result.is_current(tx, cites, bib):
+            fmt = result
+        else:
+            tx.write(cites, bib=bib)
+            tx.build()
+            tx.read_aux()
+            tx.read_bbl()
+            fmt = tx
+            if save_result:
+                tx.result().save(self.result_file)
+        t_replace = time.perf_counter()
+        stats['tex'] = t_replace - t_scanned
+
+        bibliography = self.__format_bibliography(fmt.thebibliography)
+        fd, tmp = tempfile.mkstemp(
+            prefix='.' + self.__target_file.name + '.',
+            dir=self.__docdir,
+        )
+        try:
+            with codecs.open(tmp, 'w', self.__encoding) as out:
+                os.close(fd)
+                fd = None
+                with self.__open() as f:
+                    for kind, text in _segments(f, self.__markdown):
+                        if kind == 'text':
+                            out.write(self.__replace(text, fmt, bibliography))
+                        elif kind == 'verbatim':
+                            out.write(text)
+            # mkstemp creates the file readable only by the owner.
+            shutil.copymode(self.__origin_file, tmp)
+            os.replace(tmp, self.__target_file)
+        except BaseException:
+            if fd is not None:
+                os.close(fd)
+            os.remove(tmp)
+            raise
+        t_end = time.perf_counter()
+        stats['replace'] = t_end - t_replace
+        stats['total'] = t_end - t_start
+        self.__build_stats = stats
+
+    @property
+    def build_stats(self):
+        """[Read only] Returns timings of the last build in seconds.
+
+        Returns
+        -------
+        dict
+            Timings of the last build with the following keys.
+
+            - scan: first pass reading preamble and citations.
+            - tex: LaTeX and BibTeX runs including parsing.
+            - replace: second pass writing the target file.
+            - total: whole build.
+        """
+        return dict(self.__build_stats)
+
+    @property
+    def build_summary(self):
+        """[Read only] Returns summary of LaTeX and BibTeX steps.
+
+        See LaTeX.build_summary.
+
+        Returns
+        -------
+        list of dict
+            One dict per run step. Empty if LaTeX did not run.
+        """
+        if self.__latex is None:
+            return []
+        return self.__latex.build_summary
+
+    def __open(self):
+        """Open original file keeping its line endings.
+        """
+        return open(
+            self.__origin_file, 'r', encoding=self.__encoding, newline=''
+        )
+
+    def __format_bibliography(self, text):
+        """Returns thebibliography text written to the target file.
+        """
+        text = text.rstrip('\n')
+        if self.__markdown:
+            # One paragraph per entry.
+            text = '\n\n'.join(
+                line.replace('\t', ' ', 1) for line in text.split('\n')
+            )
+        return text
+
+    def __replace(self, text, fmt, bibliography):
+        """Returns text with formatted citations and thebibliography.
+        """
+        parts = []
+        last = 0
+        for c in parse_citations(text):
+            parts.append(text[last:c.start])
+            parts.append(fmt.cite(c))
+            last = c.end
+        parts.append(text[last:])
+        return ''.join(parts).replace(_THEBIBLIOGRAPHY, bibliography)
+
+
+def _segments(lines, markdown=False):
+    r"""Split lines into text, verbatim and preamble segments.
+
+    Parameters
+    ----------
+    lines : iterable of str
+        Lines with line endings.
+    markdown : bool, default False
+        If True, fenced code blocks are verbatim.
+
+    Yields
+    ------
+    tuple of str
+        (kind, text) where kind is 'text', 'verbatim' or 'preamble'.
+        Concatenated text of text and verbatim segments is the file
+        without the preamble, \begin{preamble}, \end{preamble} and
+        the line ending following \end{preamble}.
+
+    Raises
+    ------
+    ValueError
+        If the preamble is not paired or two or more preambles are found.
+
+    Examples
+    --------
+    >>> from wdbibtex.text import _segments
+    >>> list(_segments([
+    ...     '\\begin{preamble}\n',
+    ...     '\\documentclass{article}\n',
+    ...     '\\end{preamble}\n',
+    ...     'See \\cite{a}.\n',
+    ... ]))
+    [('preamble', '\n'), ('preamble', '\\documentclass{article}\n'), ('text', 'See \\cite{a}.\n')]
+    """  # noqa E501
+    fence = None
+    preambles = 0
+    in_preamble = False
+    for line in lines:
+        if markdown and not in_preamble:
+            m = _FENCE.match(line)
+            if fence is not None:
+                if (
+                    m is not None
+                    and m.group('fence')[0] == fence[0]
+                    and len(m.group('fence')) >= len(fence)
+                    and not line[m.end():].strip()
+                ):
+                    fence = None
+                yield 'verbatim', line
+                continue
+            if m is not None:
+                fence = m.group('fence')
+                yield 'verbatim', line
+                continue
+        while line:
+            if in_preamble:
+                i = line.find(_PREAMBLE_END)
+                if i < 0:
+                    yield 'preamble', line
+                    break
+                if i:
+                    yield 'preamble', line[:i]
+                in_preamble = False
+                line = line[i + len(_PREAMBLE_END):]
+                if line in ('\n', '\r\n', '\r'):
+                    break
+                continue
+            i = line.find(_PREAMBLE_BEGIN)
+            if _PREAMBLE_END in (line if i < 0 else line[:i]):
+                raise ValueError(
+                    '\\end{preamble} found before \\begin{preamble}.'
+                )
+            if i < 0:
+                yield 'text', line
+                break
+            preambles += 1
+            if preambles > 1:
+                raise ValueError(
+                    'Two or more \\begin{preamble} or \\end{preamble} found.'
+                )
+            if i:
+                yield 'text', line[:i]
+            in_preamble = True
+            line = line[i + len(_PREAMBLE_BEGIN):]
+    if in_preamble:
+        raise ValueError(
+            'One of \\begin{preamble} or \\end{preamble} not found.'
+        )
@@ -1,11 +1,238 @@
+import atexit
+import concurrent.futures
+import contextlib
 import glob
+import hashlib
 import os
 import pathlib
 import shutil
-import win32com.client as client
+import threading
+import time
 
 import wdbibtex
 
+# Names of WdStoryType values, used in messages.
+_STORY_NAMES = {
+    1: 'main text',
+    2: 'footnotes',
+    3: 'endnotes',
+    4: 'comments',
+    5: 'text frame',
+    6: 'even pages header',
+    7: 'primary header',
+    8: 'even pages footer',
+    9: 'primary footer',
+    10: 'first page header',
+    11: 'first page footer',
+}
+
+
+class WordPool:
+    """Pool of warm Word applications shared by WdBibTeX objects.
+
+    Starting Word takes several seconds.
+    WordPool keeps started Word applications alive between documents
+    and hands them out to WdBibTeX objects.
+    An application is health-checked before it is handed out,
+    and recycled after it processed max_documents documents
+    or after a WdBibTeX object reports a failure on it.
+    All applications are quit by shutdown(),
+    which is also called at interpreter exit.
+
+    Note that Word applications are COM objects bound to the thread
+    which started them. Use a pool in one thread.
+
+    Parameters
+    ----------
+    size : int, default 1
+        Maximum number of Word applications started by the pool.
+    max_documents : int or None, default 50
+        Number of documents after which an application is recycled.
+        If None, applications are never recycled.
+
+    Examples
+    --------
+    >>> from wdbibtex import WdBibTeX, WordPool
+    >>> with WordPool() as pool:  # doctest: +SKIP
+    ...     for f in ['a.docx', 'b.docx']:
+    ...         wd = WdBibTeX(f, pool=pool)
+    ...         wd.build()
+    ...         wd.close()
+    """
+
+    def __init__(self, size=1, max_documents=50):
+        """Constructor of WordPool.
+        """
+        if size < 1:
+            raise ValueError('Pool size must be one or more.')
+        self.__size = size
+        self.__max_documents = max_documents
+        self.__idle = []
+        self.__busy = {}
+        self.__closed = False
+        self.__condition = threading.Condition()
+        atexit.register(self.shutdown)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    @property
+    def size(self):
+        """[Read only] Returns maximum number of Word applications.
+        """
+        return self.__size
+
+    @property
+    def max_documents(self):
+        """[Read only] Returns number of documents before recycling.
+        """
+        return self.__max_documents
+
+    def acquire(self, timeout=None):
+        """Hand out a Word application.
+
+        An idle application is reused if it is still alive.
+        Otherwise a new application is started
+        unless the pool size is reached, in which case
+        wait for another thread to release one within timeout.
+
+        Parameters
+        ----------
+        timeout : float or None, default None
+            Seconds to wait for a released application.
+            If None, do not wait, since no other thread
+            can release an application of a pool used in one thread.
+
+        Returns
+        -------
+        Word.Application
+            Word application COM object.
+
+        Raises
+        ------
+        RuntimeError
+            If the pool is already shut down, or all applications
+            are in use and timeout is None.
+        TimeoutError
+            If no application is released within timeout.
+
+        See also
+        --------
+        release : Return the application to the pool.
+        """
+        with self.__condition:
+            while True:
+                if self.__closed:
+                    raise RuntimeError('WordPool is already shut down.')
+                while self.__idle:
+                    ap, used = self.__idle.pop()
+                    if self.__is_alive(ap):
+                        self.__busy[id(ap)] = (ap, used)
+                        return ap
+                    self.__quit(ap)
+                if len(self.__busy) < self.__size:
+                    import win32com.client as client
+                    ap = client.DispatchEx('Word.Application')
+                    ap.Visible = False
+                    ap.DisplayAlerts = 0  # 0: wdAlertsNone
+                    self.__busy[id(ap)] = (ap, 0)
+                    return ap
+                if timeout is None:
+                    raise RuntimeError(
+                        'All Word applications of the pool are in use.'
+                    )
+                if not self.__condition.wait(timeout):
+                    raise TimeoutError(
+                        'No Word application released in %s seconds.'
+                        % timeout
+                    )
+
+    def release(self, ap, crashed=False):
+        """Return a Word application to the pool.
+
+        Parameters
+        ----------
+        ap : Word.Application
+            Word application handed out by acquire().
+        crashed : bool, default False
+            If True, the application is quit instead of reused.
+
+        See also
+        --------
+        acquire : Hand out a Word application.
+        """
+        with self.__condition:
+            ap, used = self.__busy.pop(id(ap))
+            used += 1
+            if (
+                crashed
+                or self.__closed
+                or (
+                    self.__max_documents is not None
+                    and used >= self.__max_documents
+                )
+                or not self.__is_alive(ap)
+            ):
+                self.__quit(ap)
+            else:
+                self.__idle.append((ap, used))
+            self.__condition.notify()
+
+    @contextlib.contextmanager
+    def application(self, timeout=None):
+        """Context manager version of acquire() and release().
+
+        Parameters
+        ----------
+        timeout : float or None, default None
+            Seconds to wait for a released application. See acquire.
+
+        Yields
+        ------
+        Word.Application
+            Word application COM object.
+        """
+        ap = self.acquire(timeout)
+        crashed = True
+        try:
+            yield ap
+            crashed = False
+        finally:
+            self.release(ap, crashed=crashed)
+
+    def shutdown(self):
+        """Quit all idle Word applications and close the pool.
+
+        Applications in use are quit when they are released.
+        """
+        atexit.unregister(self.shutdown)
+        with self.__condition:
+            self.__closed = True
+            while self.__idle:
+                ap, _ = self.__idle.pop()
+                self.__quit(ap)
+            self.__condition.notify_all()
+
+    def __is_alive(self, ap):
+        """Returns if the Word application responds to COM calls.
+        """
+        try:
+            ap.Documents.Count
+        except Exception:
+            return False
+        return True
+
+    def __quit(self, ap):
+        """Quit Word application, ignoring an already dead one.
+        """
+        try:
+            ap.Quit(SaveChanges=0)  # 0: wdDoNotSaveChanges
+        except Exception:
+            pass
+
 
 class WdBibTeX:
     """BibTeX toolkit for MS Word.
@@ -30,6 +257,24 @@ class WdBibTeX:
     workdir : str or path object, default '.tmp'
         Working directory of latex process.
         The working directory will be removed by WdBibTeX.clear().
+    performance_mode : bool, default False
+        If True, run Word invisibly with screen updating,
+        background repagination and spelling/grammar checking disabled,
+        and group all edits into a single undo record.
+        The original Word settings are restored by WdBibTeX.close().
+    pool : WordPool or None, default None
+        Pool to borrow a Word application from.
+        If None, a Word application is dispatched by open()
+        and quit by close() if no other document is opened.
+    track : bool, default False
+        If True, each rendered citation and bibliography is written
+        as a content control tagged with an id of its LaTeX source,
+        and the sources and preamble are kept in document variables.
+        A tracked target file can be rebuilt by
+        WdBibTeX.build(incremental=True).
+    trace : ComTracer or None, default None
+        If given, COM calls on Word objects are counted and timed,
+        and reported by ComTracer.emit() at close().
 
     Examples
     --------
@@ -37,6 +282,13 @@ class WdBibTeX:
     >>> wd = WdBibTeX('sample.docx')  # doctest: +SKIP
     >>> wd.build()  # doctest: +SKIP
     >>> wd.close()  # doctest: +SKIP
+
+    WdBibTeX can be used as a context manager.
+    The document is closed (without saving on exception)
+    and Word settings are restored when leaving the block.
+
+    >>> with WdBibTeX('sample.docx', performance_mode=True) as wd:
+    ...     wd.build()  # doctest: +SKIP
     """
 
     def __init__(
@@ -44,24 +296,65 @@ class WdBibTeX:
             file,
             copy_suffix='_bib',
             workdir='.tmp',
+            performance_mode=False,
+            pool=None,
+            track=False,
+            trace=None,
     ):
         """Costructor of WdBibTeX.
         """
         self.__origin_file = file
         self.__origin_file = (pathlib.Path.cwd() / file).resolve()
         self.__docxdir = self.__origin_file.parent
-        self.__target_file = self.__docxdir / (
+        self.__copy_file = self.__docxdir / (
             str(self.__origin_file.stem)
             + copy_suffix
             + str(self.__origin_file.suffix)
         )
+        self.__target_file = self.__copy_file
+        self.__copy_suffix = copy_suffix
+        self.__result_file = self.__docxdir / (
+            str(self.__origin_file.stem) + '.wdbib.json'
+        )
         self.__workdir = self.__docxdir / workdir
+        self.__performance_mode = performance_mode
+        self.__pool = pool
+        self.__track = track
+        self.__trace = trace
+        self.__tag_prefix = 'wdbibtex:'
+        self.__preamble_variable = 'wdbibtex-preamble'
+        self.__source_prefix = 'wdbibtex-source-'
+        self.__sources = set()
+        self.__ap = None
+        self.__dc = None
+        self.__saved_settings = []
+        self.__build_stats = {}
+        self.__latex = None
+        self.__target_files = [self.__target_file]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(save=exc_type is None)
 
     @property
     def original_file(self):
         """[Read only] Returns original word file.
         """
-        return self.__target_file
+        return self.__origin_file
+
+    @property
+    def performance_mode(self):
+        """[Read only] Returns if Word runs in performance mode.
+        """
+        return self.__performance_mode
+
+    @property
+    def track(self):
+        """[Read only] Returns if rendered citations are tracked.
+        """
+        return self.__track
 
     @property
     def target_file(self):
@@ -69,6 +362,44 @@ class WdBibTeX:
         """
         return self.__target_file
 
+    @property
+    def target_files(self):
+        """[Read only] Returns word files written by the last build.
+
+        One file per bibliography style of the last build.
+        The first one is target_file.
+        """
+        return list(self.__target_files)
+
+    def style_file(self, style):
+        """Returns word file written for a bibliography style.
+
+        Parameters
+        ----------
+        style : str
+            Bibliography style, e.g. 'unsrt'.
+
+        Returns
+        -------
+        path object
+            File named after the original file, copy_suffix and style,
+            e.g. sample_bib_unsrt.docx.
+        """
+        return self.__docxdir / (
+            str(self.__origin_file.stem)
+            + self.__copy_suffix
+            + '_' + style
+            + str(self.__origin_file.suffix)
+        )
+
+    @property
+    def result_file(self):
+        """[Read only] Returns build result file next to original file.
+
+        See WdBibTeX.build and BuildResult.
+        """
+        return self.__result_file
+
     @property
     def workdir(self):
         """[Read only] Returns LaTeX working directory.
@@ -80,31 +411,64 @@ class WdBibTeX:
         """
         shutil.rmtree(self.workdir)
 
-    def close(self, clear=False):
+    def close(self, clear=False, save=True):
         """Close word file and word application.
 
         Close word file after saving.
-        If no other file opened, quit Word application too.
+        Word settings changed by performance mode are restored,
+        even if saving or closing the document fails.
+        If the Word application is borrowed from a pool, return it
+        to the pool. Otherwise, if no other file opened,
+        quit Word application too.
 
         Parameters
         ----------
         clear : bool, default False
             If True, remove working directory of latex process.
+        save : bool, default True
+            If False, close word file without saving.
 
         See also
         --------
         open : Open word file.
         """
+        if self.__ap is None:
+            if clear and self.workdir.exists():
+                self.clear()
+            return
 
-        # Save document
-        self.__dc.Save()
-
-        # Close document
-        self.__dc.Close()
+        ap = self.__ap
+        try:
+            try:
+                try:
+                    if self.__performance_mode:
+                        if ap.UndoRecord.IsRecordingCustomRecord:
+                            ap.UndoRecord.EndCustomRecord()
+                    if self.__dc is not None:
+                        if save:
+                            self.__dc.Save()
+                        self.__dc.Close(SaveChanges=-1 if save else 0)
+                finally:
+                    self.__dc = None
+                    self.__restore_settings()
+            except Exception:
+                if self.__pool is not None:
+                    self.__ap = None
+                    self.__pool.release(
+                        wdbibtex.comtrace.unwrap(ap), crashed=True
+                    )
+                raise
 
-        #  Quit Word application if no other opened document
-        if len(self.__ap.Documents) == 0:
-            self.__ap.Quit()
+            if self.__pool is not None:
+                self.__pool.release(wdbibtex.comtrace.unwrap(ap))
+            elif len(ap.Documents) == 0:
+                #  Quit Word application if no other opened document
+                ap.Quit()
+            self.__ap = None
+        finally:
+            # COM calls are reported even if closing failed.
+            if self.__trace is not None:
+                self.__trace.emit()
 
         # Clean working directory
         if clear:
@@ -112,17 +476,57 @@ class WdBibTeX:
 
     def updatetoc(self):
         """Update all table of contents in the document.
+
+        The other target files, written for other bibliography styles,
+        are opened, updated and saved too.
         """
-        for toc in self.__dc.TablesOfContents:
-            toc.Update()
+        def update(dc, fn):
+            for toc in dc.TablesOfContents:
+                toc.Update()
+
+        self.__each_target(update, save=True)
 
     def exportpdf(self):
         """Export current docx file to pdf.
+
+        The other target files, written for other bibliography styles,
+        are exported too.
+        """
+        def export(dc, fn):
+            dc.SaveAs2(os.path.splitext(fn)[0] + '.pdf', 17)  # 17: wdFormatPDF
+
+        self.__each_target(export, save=False)
+
+    def __each_target(self, func, save):
+        """Call func with every target document and its file.
+
+        The opened target_file is passed first. The other target files
+        are opened and closed one by one, and saved if save is True.
         """
-        fn = os.path.splitext(self.__target_file)[0] + '.pdf'
-        self.__dc.SaveAs2(fn, 17)  # 17: wdFormatPDF
+        func(self.__dc, self.__target_file)
+        for fn in self.__target_files[1:]:
+            dc = self.__ap.Documents.Open(str(fn))
+            try:
+                func(dc, fn)
+            except BaseException:
+                dc.Close(SaveChanges=0)  # 0: wdDoNotSaveChanges
+                raise
+            dc.Close(SaveChanges=-1 if save else 0)  # -1: wdSaveChanges
 
-    def build(self, bib=None, bst=None):
+    def build(
+            self,
+            bib=None,
+            bst=None,
+            incremental=False,
+            rich_bibliography=False,
+            precompile=False,
+            draftmode=False,
+            runner=None,
+            result=None,
+            save_result=False,
+            bibtex_shards=None,
+            latex=None,
+    ):
         r"""Build word file with latex citations.
 
         Build word file with latex citation key of \\cite{} and \\thebibliography.
@@ -134,22 +538,124 @@ class WdBibTeX:
         4. Parse LaTeX artifacts of aux and bbl.
         5. Replace LaTeX keys in word file.
 
+        Steps 2 to 4 for the citations in the main text start in background
+        as soon as the main text is scanned, and run while the other stories
+        are scanned. LaTeX is built again only if the other stories cite
+        keys which do not appear in the main text, or the background build
+        failed. If the main text cites nothing, LaTeX is built once after
+        all stories are scanned. Timings of the steps
+        are available in build_stats.
+
+        If the citations are tracked, rendered citations and bibliography
+        are content controls tagged with their LaTeX source.
+        Incremental build reopens such a target file as is,
+        collects both tagged and newly written citations,
+        and rewrites only the content controls whose text changed.
+
+        With rich_bibliography, thebibliography is inserted as
+        WordprocessingML by a single Range.InsertXML call.
+        Each entry is a paragraph with a hanging indent,
+        italic text is kept and URLs are hyperlinks.
+
+        A BuildResult of a previous build, e.g. loaded from result_file,
+        is used instead of running LaTeX if its preamble, bibliography
+        style, distinct citations in order and .bib and .bst files
+        are the same as the document's. See BuildResult.is_current.
+        With save_result, the result of the build is saved to result_file.
+
+        If two or more bibliography styles are given, one word file is
+        written per style, see style_file. The document is scanned and
+        its preamble is read once, LaTeX and BibTeX run for all styles
+        in parallel in subdirectories of workdir named after the styles,
+        and then the citations are replaced in each file.
+        The file of the first style stays open as target_file,
+        and the other files are saved and closed by build.
+        updatetoc and exportpdf apply to all the files.
+
         Parameters
         ----------
         bib : str or None, default None
             Bibliography file to be used. If None, all .bib files placed in the same directory of target .docx file will be used.
-        bst : str or None, default None
-            Bibliography style. If None, .bst file placed in the same directory of target .docx file is used.
+        bst : str, list of str or None, default None
+            Bibliography style. If None, .bst file placed in the same directory of target .docx file is used. Two or more styles are given as a list or separated by commas.
+        incremental : bool, default False
+            If True, rebuild the existing target file instead of a fresh copy of the original file. Requires track=True.
+        rich_bibliography : bool, default False
+            If True, insert formatted thebibliography instead of plain text.
+        precompile : bool, default False
+            If True, load the preamble from a format file dumped once in workdir. See LaTeX.
+        draftmode : bool, default False
+            If True, run LaTeX passes without writing output files where supported. See LaTeX.
+        runner : Runner or None, default None
+            Runner of LaTeX and BibTeX commands with timeouts and resource limits.
+        result : BuildResult or None, default None
+            Result of a previous build to format citations without LaTeX. Not used with rich_bibliography.
+        save_result : bool, default False
+            If True, save the result of the build to result_file.
+        bibtex_shards : int or None, default None
+            If given, run BibTeX on this number of shards of cited keys in parallel. See LaTeX.
+        latex : LaTeX or None, default None
+            LaTeX object kept between documents, e.g. by a server worker. It is reset and built in workdir with its own options instead of precompile, draftmode, runner and bibtex_shards. With two or more styles, its bibitem_cache is shared by the LaTeX objects of the styles.
+
+        Raises
+        ------
+        ValueError
+            If incremental build is requested without tracking,
+            or two or more styles are given with tracking or result,
+            or a textual citation such as \citet is found.
+            Textual citations are rejected when the stories are scanned,
+            before the document is changed.
         """  # noqa E501
+        if incremental and not self.__track:
+            raise ValueError('Incremental build requires track=True.')
+        styles = _styles(bst)
+        if len(styles) > 1:
+            if self.__track or result is not None or save_result:
+                raise ValueError(
+                    'Two or more bibliography styles cannot be built '
+                    'with tracking or build results.'
+                )
+            self.__build_styles(
+                styles,
+                bib=bib,
+                rich_bibliography=rich_bibliography,
+                precompile=precompile,
+                draftmode=draftmode,
+                runner=runner,
+                bibtex_shards=bibtex_shards,
+                bibitem_cache=None if latex is None else latex.bibitem_cache,
+            )
+            return
+        bst = styles[0] if styles else None
 
-        self.open()
+        self.__target_file = self.__copy_file
+        self.__target_files = [self.__target_file]
+        self.open(incremental=incremental)
         os.makedirs(self.__workdir, exist_ok=True)
         for b in glob.glob(os.path.join(self.__docxdir, '*.bst')):
             shutil.copy(b, self.__workdir)
         for b in glob.glob(os.path.join(self.__docxdir, '*.bib')):
             shutil.copy(b, self.__workdir)
-        tx = wdbibtex.LaTeX(workdir=self.__workdir)
-        tx.preamble = self.read_preamble()
+        if latex is None:
+            tx = wdbibtex.LaTeX(
+                workdir=self.__workdir,
+                precompile=precompile,
+                draftmode=draftmode,
+                runner=runner,
+                bibtex_shards=bibtex_shards,
+            )
+        else:
+            tx = latex
+            tx.reset()
+            tx.workdir = self.__workdir
+        self.__latex = tx
+        preamble = self.read_preamble()
+        if self.__track:
+            if preamble is None:
+                preamble = self.__get_variable(self.__preamble_variable)
+            else:
+                self.__set_variable(self.__preamble_variable, preamble)
+        tx.preamble = preamble
 
         if bst:
             # Overwrite preamble in docx with given command line artument.
@@ -159,24 +665,73 @@ class WdBibTeX:
             # Try find .bst in th project directory.
             tx.bibliographystyle = tx.bibliographystyle
 
-        self.__cites = self.find_all('\\\\cite\\{*\\}')
-        self.__thebibliographies = self.find_all('\\\\thebibliography')
-
-        # Build latex document
-        context = '\n'.join([cite for cite, _, _ in self.__cites])
-        tx.write(context, bib=bib)
-        tx.build()
-        tx.read_aux()
-        tx.read_bbl()
+        # Scan the main text story, then scan the other stories
+        # while a speculative LaTeX build of the main text runs.
+        # A previous result is usable only for the same preamble and style.
+        warm = (
+            result is not None
+            and not rich_bibliography
+            and result.preamble == tx.preamble
+            and result.bibliographystyle == tx.bibliographystyle
+        )
+        stats = {}
+        t_start = time.perf_counter()
+        self.__cites = self.__scan(None, main=True)
+        t_main = time.perf_counter()
+        stats['scan_main'] = t_main - t_start
+        stats['tex'] = 0.0
+        stats['overlap'] = 0.0
+        stats['tex_reruns'] = 0
+        built_keys = self.__citation_keys(self.__cites)
+        # Nothing is built speculatively if the main text cites nothing,
+        # e.g. all citations are in footnotes.
+        speculative = not warm and bool(built_keys)
+        built = False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
+            if speculative:
+                future = ex.submit(self.__run_latex, tx, self.__cites, bib)
+            self.__cites = self.__cites + self.__scan(None, main=False)
+            self.__thebibliographies = self.__scan(
+                '\\\\thebibliography', bibliography=True
+            )
+            t_scanned = time.perf_counter()
+            if speculative:
+                try:
+                    tex_start, tex_end = future.result()
+                except Exception:
+                    # Built again below with the citations of all stories.
+                    pass
+                else:
+                    built = True
+                    stats['tex'] = tex_end - tex_start
+                    stats['overlap'] = max(
+                        0.0, min(tex_end, t_scanned) - max(tex_start, t_main)
+                    )
+        stats['scan_rest'] = t_scanned - t_main
 
-        # Replace \thebibliography
-        for _, start, end in self.__thebibliographies[::-1]:
-            rng = self.__dc.Range(Start=start, End=end)
-            rng.Delete()
-            rng.InsertAfter(tx.thebibliography)
+        keys = self.__citation_keys(self.__cites)
+        cites = [cite for cite, *_ in self.__cites]
+        if warm and result.is_current(tx, cites, bib):
+            fmt = result
+        elif warm:
+            # Citations or sources changed. Build from scratch.
+            tex_start, tex_end = self.__run_latex(tx, self.__cites, bib)
+            stats['tex'] = tex_end - tex_start
+            fmt = tx
+        else:
+            # Rebuild only if the other stories cite keys not built yet,
+            # or the speculative build was skipped or failed.
+            if not built or not keys <= built_keys:
+                tex_start, tex_end = self.__run_latex(tx, self.__cites, bib)
+                stats['tex'] += tex_end - tex_start
+                if speculative:
+                    stats['tex_reruns'] += 1
+            fmt = tx
+        if save_result and fmt is tx:
+            # Labels built from the main text are valid for all citations.
+            tx.result(citations=cites).save(self.result_file)
+        t_replace = time.perf_counter()
 
-        # Replace \cite{*}
-        # for key, val in ct.cnd.items():
         superscript = (
             isinstance(tx.is_package_used('cite'), list)
             and (
@@ -184,28 +739,257 @@ class WdBibTeX:
                 or 'super' in tx.is_package_used('cite')
             )
         )
-        for key, start, end in self.__cites[::-1]:
-            if superscript:
-                rng = self.__dc.Range(Start=start, End=end)
-                rng.Font.Superscript = True
-            key_escaped = key.replace('\\', '\\\\')
-            key_escaped = key_escaped.replace('{', '\\{')
-            key_escaped = key_escaped.replace('}', '\\}')
-            self.replace_all(key_escaped, tx.cite(key))
+        xml = tx.thebibliography_xml if rich_bibliography else None
+        if self.__track:
+            for found, bibliography in self.__reversed_places():
+                if bibliography:
+                    self.__put_tracked(found, fmt.thebibliography, xml=xml)
+                else:
+                    self.__put_tracked(
+                        found, fmt.cite(found[0]), superscript
+                    )
+        else:
+            self.__replace(fmt, superscript, xml)
+        self.__remove_preamble(self.__dc)
+        t_end = time.perf_counter()
+        stats['replace'] = t_end - t_replace
+        stats['total'] = t_end - t_start
+        self.__build_stats = stats
+
+    def __build_styles(
+            self,
+            styles,
+            bib,
+            rich_bibliography,
+            precompile,
+            draftmode,
+            runner,
+            bibtex_shards,
+            bibitem_cache=None,
+    ):
+        """Build one word file per bibliography style.
+
+        See build for parameters. If bibitem_cache is given,
+        it is shared by the LaTeX objects of all styles.
+        """
+        self.__target_files = [self.style_file(s) for s in styles]
+        self.__target_file = self.__target_files[0]
+        self.open()
+        preamble = self.read_preamble()
+        texs = []
+        for style in styles:
+            workdir = self.__workdir / style
+            os.makedirs(workdir, exist_ok=True)
+            for b in glob.glob(os.path.join(self.__docxdir, '*.bst')):
+                shutil.copy(b, workdir)
+            for b in glob.glob(os.path.join(self.__docxdir, '*.bib')):
+                shutil.copy(b, workdir)
+            tx = wdbibtex.LaTeX(
+                workdir=workdir,
+                precompile=precompile,
+                draftmode=draftmode,
+                # Runners keep outputs by step, which all styles share.
+                runner=runner.copy() if runner is not None else None,
+                bibtex_shards=bibtex_shards,
+                bibitem_cache=bibitem_cache,
+            )
+            tx.preamble = preamble
+            tx.bibliographystyle = style
+            texs.append(tx)
+        self.__latex = texs[0]
+
+        stats = {}
+        t_start = time.perf_counter()
+        self.__cites = self.__scan(None)
+        self.__thebibliographies = self.__scan(
+            '\\\\thebibliography', bibliography=True
+        )
+        t_scanned = time.perf_counter()
+        stats['scan_main'] = t_scanned - t_start
+        stats['scan_rest'] = 0.0
+        stats['overlap'] = 0.0
+        stats['tex_reruns'] = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(texs)
+        ) as ex:
+            futures = [
+                ex.submit(self.__run_latex, tx, self.__cites, bib)
+                for tx in texs
+            ]
+            for f in futures:
+                f.result()
+        t_replace = time.perf_counter()
+        stats['tex'] = t_replace - t_scanned
+
+        for i, tx in enumerate(texs):
+            superscript = (
+                isinstance(tx.is_package_used('cite'), list)
+                and (
+                    'superscript' in tx.is_package_used('cite')
+                    or 'super' in tx.is_package_used('cite')
+                )
+            )
+            xml = tx.thebibliography_xml if rich_bibliography else None
+            if i == 0:
+                self.__replace(tx, superscript, xml)
+                self.__remove_preamble(self.__dc)
+                continue
+            # Stories of a copy are found by their places in the document.
+            shutil.copy2(self.__origin_file, self.__target_files[i])
+            dc = self.__ap.Documents.Open(str(self.__target_files[i]))
+            try:
+                stories = dict(self.__iter_keyed_story_ranges(dc=dc))
+                self.__replace(tx, superscript, xml, stories)
+                self.__remove_preamble(dc)
+                dc.Save()
+            except BaseException:
+                dc.Close(SaveChanges=0)  # 0: wdDoNotSaveChanges
+                raise
+            dc.Close(SaveChanges=-1)  # -1: wdSaveChanges
+        t_end = time.perf_counter()
+        stats['replace'] = t_end - t_replace
+        stats['total'] = t_end - t_start
+        self.__build_stats = stats
 
+    def __replace(self, fmt, superscript, xml, stories=None):
+        """Replace found citations and bibliographies with rendered text.
+
+        Parameters
+        ----------
+        fmt : LaTeX or BuildResult
+            Formatter of citations and thebibliography.
+        superscript : bool
+            If True, citations are superscripted.
+        xml : str or None
+            Flat OPC package inserted instead of thebibliography text.
+        stories : dict or None, default None
+            If given, replace in a copy of the scanned document,
+            whose stories are mapped by keys of
+            __iter_keyed_story_ranges.
+        """
+        for found, bibliography in self.__reversed_places():
+            source, start, end, story, story_key, _ = found
+            if stories is not None:
+                story = stories[story_key]
+            rng = self.__range(story, start, end)
+            if not bibliography:
+                rng.Text = fmt.cite(source)
+                if superscript:
+                    rng.Font.Superscript = True
+            elif xml is None:
+                rng.Delete()
+                rng.InsertAfter(fmt.thebibliography)
+            else:
+                rng.Delete()
+                rng.InsertXML(xml)
+
+    def __reversed_places(self):
+        """Returns found bibliographies and citations from the last place.
+
+        Replacing text shifts the places of the following text
+        in the same story, so that the found places are replaced
+        from the last one. Places in different stories are independent.
+
+        Returns
+        -------
+        list of tuple
+            (found, bibliography) where found is an element of
+            the lists returned by __scan, and bibliography is True
+            for \\thebibliography.
+        """
+        places = (
+            [(f, True) for f in self.__thebibliographies]
+            + [(f, False) for f in self.__cites]
+        )
+        return sorted(places, key=lambda p: p[0][1], reverse=True)
+
+    def __remove_preamble(self, dc):
+        """Remove preamble from a document.
+        """
         # Replace from \begin{preamble} to \end{preamble}^13
         # Note ^13 corresponds carriage return.
-        self.replace_all(
+        self.__replace_all(
             '\\\\begin\\{preamble\\}*\\\\end\\{preamble\\}^13',
-            ''
+            '',
+            dc,
         )
 
+    @property
+    def build_stats(self):
+        """[Read only] Returns timings of the last build in seconds.
+
+        Returns
+        -------
+        dict
+            Timings of the last build with the following keys.
+
+            - scan_main: scanning citations in the main text story.
+            - scan_rest: scanning the other stories and bibliography.
+            - tex: LaTeX and BibTeX runs including parsing.
+            - overlap: LaTeX runs overlapped with scan_rest.
+            - tex_reruns: number of LaTeX reruns for late found keys.
+            - replace: replacing LaTeX commands in the document.
+            - total: whole scanning, LaTeX and replacing steps.
+        """
+        return dict(self.__build_stats)
+
+    @property
+    def build_summary(self):
+        """[Read only] Returns summary of LaTeX and BibTeX steps.
+
+        Summary of the last LaTeX build of the last WdBibTeX.build,
+        also after a failed step. See LaTeX.build_summary.
+
+        Returns
+        -------
+        list of dict
+            One dict per run step. Empty if LaTeX did not run.
+        """
+        if self.__latex is None:
+            return []
+        return self.__latex.build_summary
+
+    def __run_latex(self, tx, cites, bib):
+        """Write, build and parse LaTeX project of citations.
+
+        Parameters
+        ----------
+        tx : LaTeX
+            LaTeX object to build.
+        cites : list
+            Found citations as returned by __scan.
+        bib : str or None
+            Bibliography file to be used.
+
+        Returns
+        -------
+        tuple of float
+            Start and end time of the build.
+        """
+        t_start = time.perf_counter()
+        tx.write((cite for cite, *_ in cites), bib=bib)
+        tx.build()
+        tx.read_aux()
+        tx.read_bbl()
+        return t_start, time.perf_counter()
+
+    def __citation_keys(self, cites):
+        """Returns set of citation keys in found citations.
+        """
+        keys = set()
+        for cite, *_ in cites:
+            for citation in wdbibtex.parse_citations(cite):
+                keys.update(citation.keys)
+        return keys
+
     def find_all(self, key):
         """Find all keys from word file.
 
-        Find all keys in word document.
-        Searching starts from current selection and wrapped
-        if reach document end.
+        Find all keys in every story of the word document,
+        i.e. main text, headers, footers, footnotes, endnotes,
+        comments and text frames of shapes.
+        Each story is searched with a standalone Range.Find object,
+        so the UI selection is never moved.
         MatchFuzzy search is disabled.
 
         Parameters
@@ -217,102 +1001,352 @@ class WdBibTeX:
         -------
         list
             A list of list. Each list element is
-            [found text in str, start place in int, end place in int].
-            The list is sorted by second key (i.e. start place).
+            [found text in str, start place in int, end place in int,
+            story range in which the text is found].
+            Start and end places are relative to the story range.
+            The list is sorted by story, then by start place.
+            Empty list if the key is not found.
 
         See Also
         --------
         replace_all : Replace found keys.
         """
 
-        self.__fi = self.__sl.Find
-        self.__fi.ClearFormatting()
-        self.__fi.MatchFuzzy = False
         found = []
-        while True:
-            self.__fi.Execute(
-                key,  # FindText
-                False,  # MatchCase
-                False,  # MatchWholeWord
-                True,  # MatchWildcards
-                False,  # MatchSoundsLike
-                False,  # MatchAllWordForms
-                True,  # Forward
-                1,  # Wrap
-                False,  # Format
-                '',  # ReplaceWith
-                0,  # Replace, 0: wdReplaceNone
-            )
-            line = [
-                str(self.__sl.Range),
-                self.__sl.Range.Start,
-                self.__sl.Range.End
-            ]
-            if line in found:
+        for story in self.__iter_story_ranges():
+            found.extend(self.__find_in_story(story, key))
+        return found
+
+    def __find_in_story(self, story, key):
+        """Find all keys in one story range.
+
+        Parameters
+        ----------
+        story : Range
+            Story range to search.
+        key : str
+            A text to search in the story.
+
+        Returns
+        -------
+        list
+            A list of [found text, start place, end place, story].
+        """
+        found = []
+        last = None
+        rng = story.Duplicate
+        fi = rng.Find
+        fi.ClearFormatting()
+        fi.MatchFuzzy = False
+        while fi.Execute(
+            key,  # FindText
+            False,  # MatchCase
+            False,  # MatchWholeWord
+            True,  # MatchWildcards
+            False,  # MatchSoundsLike
+            False,  # MatchAllWordForms
+            True,  # Forward
+            0,  # Wrap, 0: wdFindStop
+            False,  # Format
+            '',  # ReplaceWith
+            0,  # Replace, 0: wdReplaceNone
+        ):
+            if last == (rng.Start, rng.End):
                 break
-            found.append(line)
-
-        for i in range(self.__dc.Shapes.Count):
-            self.__dc.Shapes(i+1).Select()
-            wholeshpe = self.__sl.Range
-            self.__fi = self.__sl.Find
-            self.__fi.ClearFormatting()
-            self.__fi.MatchFuzzy = False
-            searched = []
-            while True:
-                self.__fi.Execute(
-                    key,  # FindText
-                    False,  # MatchCase
+            last = (rng.Start, rng.End)
+            found.append([str(rng.Text), rng.Start, rng.End, story])
+            rng.Collapse(0)  # 0: wdCollapseEnd
+        return found
+
+    def __find_citations_in_story(self, story):
+        """Find all citation commands in one story range.
+
+        The story text is read once and tokenized by
+        wdbibtex.parse_citations, so that every citation command form
+        is found without searching the story for each command.
+        If a found place does not hold the citation text,
+        e.g. shifted by fields, the text is searched from the place.
+
+        Parameters
+        ----------
+        story : Range
+            Story range to search.
+
+        Returns
+        -------
+        list
+            A list of [citation command, start place, end place, story].
+
+        Raises
+        ------
+        ValueError
+            If a textual citation such as \\citet is found,
+            which cannot be replaced by a numeric label.
+        """
+        found = []
+        offset = story.Start
+        last = story.Start
+        for citation in wdbibtex.parse_citations(str(story.Text)):
+            start = offset + citation.start
+            end = offset + citation.end
+            if citation.textual:
+                raise ValueError(
+                    'Textual citation \\%s cannot be formatted as a numeric '
+                    'label: %s at character %d of the %s story.' % (
+                        citation.command,
+                        citation.source,
+                        start,
+                        _STORY_NAMES.get(
+                            story.StoryType, 'type %d' % story.StoryType
+                        ),
+                    )
+                )
+            rng = self.__range(story, start, end)
+            if str(rng.Text) != citation.source:
+                rng = self.__range(story, last, story.End)
+                fi = rng.Find
+                fi.ClearFormatting()
+                if not fi.Execute(
+                    citation.source,  # FindText
+                    True,  # MatchCase
                     False,  # MatchWholeWord
-                    True,  # MatchWildcards
+                    False,  # MatchWildcards
                     False,  # MatchSoundsLike
                     False,  # MatchAllWordForms
                     True,  # Forward
-                    1,  # Wrap
-                    False,  # Format
-                    '',  # ReplaceWith
-                    0,  # Replace, 0: wdReplaceNone
-                )
-                line = [
-                    str(self.__sl.Range),
-                    self.__sl.Range.Start,
-                    self.__sl.Range.End
-                ]
-                if line in searched:
-                    break
-                else:
-                    searched.append(line)
-                if line in found:
-                    break
-                if line[0] == '':
-                    continue
-                if line[0] == str(wholeshpe):
+                    0,  # Wrap, 0: wdFindStop
+                ):
                     continue
-                found.append(line)
+                start, end = rng.Start, rng.End
+                offset = start - citation.start
+            found.append([citation.source, start, end, story])
+            last = end
+        return found
 
-        self.__sl.HomeKey(6)
-        if len(found) >= 2:
-            try:
-                found.remove(['', 0, 0])
-            except ValueError:
-                pass
+    def __scan(self, key, bibliography=False, main=None):
+        """Find keys and tracked content controls rendered from the keys.
+
+        Parameters
+        ----------
+        key : str or None
+            A text to search in word document.
+            If None, citation commands are searched.
+        bibliography : bool, default False
+            If True, collect content controls rendered from
+            \\thebibliography. Otherwise, collect those from citations.
+            Content controls are collected only if tracking is enabled.
+        main : bool or None, default None
+            If True, scan only the main text story.
+            If False, scan all stories except the main text story.
+            If None, scan all stories.
+
+        Returns
+        -------
+        list
+            A list of [LaTeX source, start place, end place, story,
+            key of the story as __iter_keyed_story_ranges,
+            content control or None for newly found text],
+            sorted by story, then by start place.
+        """
+        bibtag = self.__tag_prefix + '\\thebibliography'
+        found = []
+        if self.__track:
+            # Sources of tracked citations are kept in document variables
+            # named after the ids in the tags.
+            sources = {}
+            for v in self.__dc.Variables:
+                name = str(v.Name)
+                if name.startswith(self.__source_prefix):
+                    sources[name[len(self.__source_prefix):]] = str(v.Value)
+            self.__sources = set(sources)
+        for story_key, story in self.__iter_keyed_story_ranges(main):
+            if key is None:
+                in_story = self.__find_citations_in_story(story)
+            else:
+                in_story = self.__find_in_story(story, key)
+            in_story = [f + [story_key, None] for f in in_story]
+            if not self.__track:
+                found.extend(in_story)
+                continue
+            for cc in story.ContentControls:
+                tag = str(cc.Tag)
+                if not tag.startswith(self.__tag_prefix):
+                    continue
+                if (tag == bibtag) != bibliography:
+                    continue
+                source = tag[len(self.__tag_prefix):]
+                in_story.append([
+                    sources.get(source, source),
+                    cc.Range.Start,
+                    cc.Range.End,
+                    story,
+                    story_key,
+                    cc,
+                ])
+            found.extend(sorted(in_story, key=lambda f: f[1]))
         return found
 
-    def open(self):
+    def __put_tracked(self, found, text, superscript=False, xml=None):
+        """Write text to a tracked content control.
+
+        Newly found text is replaced and wrapped in a content control
+        tagged with a short id of the LaTeX source, because tags are
+        limited in length. The source is kept in a document variable
+        named after the id. Already tracked content control
+        is rewritten only if its text differs.
+
+        Parameters
+        ----------
+        found : list
+            An element of the list returned by __scan.
+        text : str
+            Rendered text.
+        superscript : bool, default False
+            If True, newly rendered text is superscripted.
+        xml : str or None, default None
+            Flat OPC package inserted instead of text.
+            The text is still used to detect changes.
+        """
+        source, start, end, story, _, cc = found
+        if cc is None:
+            rng = self.__range(story, start, end)
+            rng.Text = text
+            cc = rng.ContentControls.Add(0)  # 0: wdContentControlRichText
+            if source == '\\thebibliography':
+                cc.Tag = self.__tag_prefix + source
+            else:
+                source_id = _source_id(source)
+                if source_id not in self.__sources:
+                    # Same id means same source, so it is never updated.
+                    self.__dc.Variables.Add(
+                        self.__source_prefix + source_id, source
+                    )
+                    self.__sources.add(source_id)
+                cc.Tag = self.__tag_prefix + source_id
+            if xml is not None:
+                cc.Range.InsertXML(xml)
+            if superscript:
+                cc.Range.Font.Superscript = True
+        elif str(cc.Range.Text).replace('\r', '\n') != text:
+            if xml is None:
+                cc.Range.Text = text
+            else:
+                cc.Range.InsertXML(xml)
+
+    def __get_variable(self, name):
+        """Returns value of a document variable, or None if not exists.
+        """
+        for v in self.__dc.Variables:
+            if v.Name == name:
+                return str(v.Value)
+        return None
+
+    def __set_variable(self, name, value):
+        """Set value of a document variable, adding it if not exists.
+        """
+        for v in self.__dc.Variables:
+            if v.Name == name:
+                v.Value = value
+                return
+        self.__dc.Variables.Add(name, value)
+
+    def __iter_story_ranges(self, main=None, dc=None):
+        """Yield every story range of the document.
+
+        Stories of the same type (e.g. headers of each section)
+        are linked by NextStoryRange and yielded in order.
+
+        Parameters
+        ----------
+        main : bool or None, default None
+            If True, yield only the main text story.
+            If False, yield all stories except the main text story.
+            If None, yield all stories.
+        dc : Document or None, default None
+            Document to iterate. If None, the opened document.
+        """
+        for _, story in self.__iter_keyed_story_ranges(main, dc):
+            yield story
+
+    def __iter_keyed_story_ranges(self, main=None, dc=None):
+        """Yield every story range of the document with its key.
+
+        The key is a tuple of the index in StoryRanges and
+        the index in the NextStoryRange chain,
+        which is the same for copies of a document.
+        See __iter_story_ranges for parameters.
+        """
+        if dc is None:
+            dc = self.__dc
+        # Touching a header story makes Word list all header and footer
+        # stories in StoryRanges, which otherwise may be missing.
+        dc.Sections(1).Headers(1).Range.StoryType
+        for i, story in enumerate(dc.StoryRanges):
+            if main is not None and (story.StoryType == 1) != main:
+                continue  # 1: wdMainTextStory
+            j = 0
+            while story is not None:
+                yield (i, j), story
+                story = story.NextStoryRange
+                j += 1
+
+    def __range(self, story, start, end):
+        """Returns a range of the story from start to end.
+        """
+        rng = story.Duplicate
+        rng.SetRange(start, end)
+        return rng
+
+    def open(self, incremental=False):
         """Open copied word document.
 
         Firstly copy word file with appending suffix.
         Then open the file.
 
+        Parameters
+        ----------
+        incremental : bool, default False
+            If True and the copied word file already exists,
+            open it as is without copying the original file again.
+
         See also
         --------
         close : Close document and application.
         """
 
-        self.__ap = client.Dispatch('Word.Application')
-        self.__ap.Visible = True
+        if self.__pool is not None:
+            self.__ap = self.__pool.acquire()
+        else:
+            import win32com.client as client
+            self.__ap = client.Dispatch('Word.Application')
+        if self.__trace is not None:
+            self.__ap = self.__trace.wrap(self.__ap, 'Application')
+        if self.__performance_mode:
+            self.__apply_settings([
+                (self.__ap, 'Visible', False),
+                (self.__ap, 'ScreenUpdating', False),
+                (self.__ap.Options, 'Pagination', False),
+                (self.__ap.Options, 'CheckSpellingAsYouType', False),
+                (self.__ap.Options, 'CheckGrammarAsYouType', False),
+            ])
+        elif self.__pool is None:
+            self.__ap.Visible = True
 
         # Copy original file to operating file for safety.
+        if not (incremental and self.__target_file.exists()):
+            self.__copy_original()
+
+        self.__dc = self.__ap.Documents.Open(str(self.__target_file))
+
+        if self.__performance_mode:
+            # Group all edits in one undo record instead of one per edit.
+            self.__ap.UndoRecord.StartCustomRecord('WdBibTeX')
+
+    def __copy_original(self):
+        """Copy original file to operating file.
+
+        If the operating file is locked by Word, close it and retry.
+        """
         try:
             shutil.copy2(self.__origin_file, self.__target_file)
         except PermissionError:
@@ -323,8 +1357,28 @@ class WdBibTeX:
                     break
             shutil.copy2(self.__origin_file, self.__target_file)
 
-        self.__dc = self.__ap.Documents.Open(str(self.__target_file))
-        self.__sl = self.__ap.Selection
+    def __apply_settings(self, settings):
+        """Change COM object settings, remembering the original values.
+
+        Parameters
+        ----------
+        settings : list of tuple
+            List of (object, attribute name, new value).
+
+        See also
+        --------
+        __restore_settings : Restore the remembered values.
+        """
+        for obj, name, value in settings:
+            self.__saved_settings.append((obj, name, getattr(obj, name)))
+            setattr(obj, name, value)
+
+    def __restore_settings(self):
+        """Restore settings changed by __apply_settings in reverse order.
+        """
+        while self.__saved_settings:
+            obj, name, value = self.__saved_settings.pop()
+            setattr(obj, name, value)
 
     def read_preamble(self):
         r"""Read preamble contents if exists.
@@ -352,9 +1406,9 @@ class WdBibTeX:
         """
         bgn_pa = self.find_all("\\\\begin\\{preamble\\}")
         end_pa = self.find_all("\\\\end\\{preamble\\}")
-        if bgn_pa == [['', 0, 0]] and end_pa == [['', 0, 0]]:
+        if not bgn_pa and not end_pa:
             return None
-        elif bgn_pa == [['', 0, 0]] or end_pa == [['', 0, 0]]:
+        elif not bgn_pa or not end_pa:
             raise ValueError(
                 'One of \\begin{preamble} or \\end{preamble} not found.'
             )
@@ -362,18 +1416,22 @@ class WdBibTeX:
             raise ValueError(
                 'Two or more \\begin{preamble} or \\end{preamble} found.'
             )
-        pa = self.__dc.Range(
-            Start=bgn_pa[0][2],
-            End=end_pa[0][1]
-        )
-        return str(pa).replace('\r', '\n')
+        _, _, start, story = bgn_pa[0]
+        _, end, _, end_story = end_pa[0]
+        if end_story.StoryType != story.StoryType or end < start:
+            raise ValueError(
+                '\\begin{preamble} and \\end{preamble} '
+                'must be placed in the same story.'
+            )
+        pa = self.__range(story, start, end)
+        return str(pa.Text).replace('\r', '\n')
 
     def replace_all(self, key, val):
         """Replace all keys in document with value.
 
-        Replace all keys in word document with value.
-        Searching starts from current selection and wrapped
-        if reach document end.
+        Replace all keys in every story of the word document with value.
+        Each story is searched with a standalone Range.Find object,
+        so the UI selection is never moved.
         MatchFuzzy search is disabled.
 
         Parameters
@@ -387,29 +1445,16 @@ class WdBibTeX:
         --------
         find_all : Find all keys in the document.
         """
-        self.__fi = self.__sl.Find
-        self.__fi.ClearFormatting()
-        self.__fi.MatchFuzzy = False
-        self.__fi.Execute(
-            key,  # FindText
-            False,  # MatchCase
-            False,  # MatchWholeWord
-            True,  # MatchWildcards
-            False,  # MatchSoundsLike
-            False,  # MatchAllWordForms
-            True,  # Forward
-            1,  # Wrap, 1: wdFindContinue
-            False,  # Format
-            val,  # ReplaceWith
-            2,  # Replace, 2: wdReplaceAll
-        )
-        self.__sl.HomeKey(6)
-        for i in range(self.__dc.Shapes.Count):
-            self.__dc.Shapes(i+1).Select()
-            self.__fi = self.__sl.Find
-            self.__fi.ClearFormatting()
-            self.__fi.MatchFuzzy = False
-            self.__fi.Execute(
+        self.__replace_all(key, val, self.__dc)
+
+    def __replace_all(self, key, val, dc):
+        """Replace all keys in a document with value.
+        """
+        for story in self.__iter_story_ranges(dc=dc):
+            fi = story.Duplicate.Find
+            fi.ClearFormatting()
+            fi.MatchFuzzy = False
+            fi.Execute(
                 key,  # FindText
                 False,  # MatchCase
                 False,  # MatchWholeWord
@@ -417,9 +1462,106 @@ class WdBibTeX:
                 False,  # MatchSoundsLike
                 False,  # MatchAllWordForms
                 True,  # Forward
-                1,  # Wrap, 1: wdFindContinue
+                0,  # Wrap, 0: wdFindStop
                 False,  # Format
                 val,  # ReplaceWith
                 2,  # Replace, 2: wdReplaceAll
             )
-        self.__sl.HomeKey(6)
+
+
+def _source_id(source):
+    """Returns short id of a LaTeX source used in content control tags.
+
+    Examples
+    --------
+    >>> from wdbibtex.word import _source_id
+    >>> _source_id('\\\\cite{key1}')
+    '40a704c340b91f0f'
+    """
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def _styles(bst):
+    """Returns list of bibliography styles given to WdBibTeX.build.
+
+    Examples
+    --------
+    >>> from wdbibtex.word import _styles
+    >>> _styles('unsrt, ieeetr')
+    ['unsrt', 'ieeetr']
+    >>> _styles(None)
+    []
+    """
+    if bst is None:
+        return []
+    if isinstance(bst, str):
+        bst = bst.split(',')
+    return [s.strip() for s in bst if s.strip()]
+
+
+def _run_build(wb, options, progress=None, latex=None):
+    """Build, update and close a document as python -m wdbibtex does.
+
+    A result of a previous build is loaded from result_file with
+    warm_start. The document is closed without saving on exception.
+
+    Parameters
+    ----------
+    wb : WdBibTeX
+        Document to build.
+    options : dict
+        Options named after the command line options in snake case,
+        e.g. bst, updatetoc and keeptexdir. Missing options are default.
+    progress : callable or None, default None
+        Called with the name and seconds of each finished phase,
+        i.e. build, updatetoc, exportpdf and close.
+    latex : LaTeX or None, default None
+        LaTeX object reused for the build, see WdBibTeX.build.
+    """
+    result = None
+    if options.get('warm_start') and wb.result_file.exists():
+        try:
+            result = wdbibtex.BuildResult.load(wb.result_file)
+        except ValueError:
+            # Saved by another version. Build from scratch.
+            result = None
+    t = time.perf_counter()
+
+    def finished(phase):
+        nonlocal t
+        t, t_prev = time.perf_counter(), t
+        if progress is not None:
+            progress(phase, t - t_prev)
+
+    with wb:
+        wb.build(
+            bib=options.get('bib'),
+            bst=options.get('bst'),
+            incremental=options.get('incremental', False),
+            rich_bibliography=options.get('rich_bibliography', False),
+            precompile=options.get('precompile', False),
+            draftmode=options.get('draftmode', False),
+            runner=_runner(options),
+            result=result,
+            save_result=options.get('save_result', False),
+            bibtex_shards=options.get('bibtex_shards'),
+            latex=latex,
+        )
+        finished('build')
+        if options.get('updatetoc'):
+            wb.updatetoc()
+            finished('updatetoc')
+        if options.get('exportpdf'):
+            wb.exportpdf()
+            finished('exportpdf')
+        wb.close(clear=not options.get('keeptexdir', False))
+        finished('close')
+
+
+def _runner(options):
+    """Returns Runner of LaTeX and BibTeX for options of _run_build.
+    """
+    return wdbibtex.Runner(
+        timeout=options.get('timeout'),
+        output='console' if options.get('verbose') else 'file',
+    )